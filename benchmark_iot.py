@@ -0,0 +1,721 @@
+# benchmark_iot.py
+"""
+Benchmarks offline (sem câmera, sem Arduino, sem banco) dos caminhos quentes do projeto.
+
+  python benchmark_iot.py all [--rapido] [--json resultados.json]
+  python benchmark_iot.py pipeline [--video video.mp4] [--frames 600]
+  python benchmark_iot.py gallery [--tamanhos 10,100,1000,10000,100000]
+  python benchmark_iot.py matcher [--tamanhos 10000,100000,300000] [--nprobe 1,4,8,16]
+  python benchmark_iot.py sink [--eventos 20000]
+  python benchmark_iot.py serial [--comandos 20000]
+  python benchmark_iot.py log [--linhas 200000]
+  python benchmark_iot.py import [--linhas 200000] [--dsn postgresql://...]
+  python benchmark_iot.py parse [--linhas 200000]
+  python benchmark_iot.py compare antes.json depois.json [--limite 10]
+
+pipeline: o loop por frame do run_program sem janelas (decodifica, gate de movimento,
+          RecognitionWorker.process_frame com relógio do vídeo, overlay e dashboard).
+gallery:  get_or_create_face_id com galerias de 10 a 100k encodings x busca linear antiga.
+matcher:  busca exata x IVF aproximado: latência, recall (mesmo vizinho que a exata) por nprobe.
+sink:     save_event_csv via EventSink (produtor e escrita) x gravação direta antiga.
+serial:   SerialActor num pseudo-terminal (sem Arduino): send, escrita, reconexão (só POSIX).
+log:      read_all_events_csv x índice do visualizador (CSV e log binário).
+import:   CsvRowReader + codificação das linhas no formato texto do COPY; com --dsn, também
+          COPY + merge x executemany + merge de verdade, num schema descartável do banco.
+parse:    read_rows x read_rows_fast x CsvRowReader, conferindo resultados idênticos.
+
+Com --json os resultados (e metadados: commit, Python, CPU) vão para um arquivo; `compare`
+mostra a variação de cada métrica entre dois arquivos e sai com código 1 se alguma piorou
+mais que --limite por cento. Métricas terminadas em _s/_ms/_us: menor é melhor;
+_por_s/_fps/speedup: maior é melhor; o resto é informativo.
+"""
+import os, io, sys, json, time, random, argparse, platform, tempfile, datetime, threading, \
+    contextlib, subprocess, select
+
+import import_registros_supabase as imp
+
+QUICK = {"frames": 150, "tamanhos": "10,100,1000,10000", "eventos": 5000, "linhas": 50000,
+         "tamanhos_ivf": "8000,30000", "comandos": 2000}
+
+
+# ===================== UTILITARIOS =====================
+def percentiles(samples, scale=1000.0, unit="ms"):
+    """p50/p95/p99 (e média) de uma lista de durações em segundos."""
+    if not samples:
+        return {}
+    s = sorted(samples)
+    pick = lambda q: s[min(len(s) - 1, int(q * len(s)))] * scale
+    return {f"p50_{unit}": pick(0.50), f"p95_{unit}": pick(0.95), f"p99_{unit}": pick(0.99),
+            f"media_{unit}": sum(s) / len(s) * scale}
+
+
+def timed(fn):
+    out = io.StringIO()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(out):
+        rows = list(fn())
+    return rows, time.perf_counter() - t0, out.getvalue()
+
+
+@contextlib.contextmanager
+def scratch_dir():
+    with tempfile.TemporaryDirectory(prefix="bench_iot_") as d:
+        yield d
+
+
+def load_pythonm(tmp):
+    """Importa o pythonm apontando CSV/log binário para `tmp` e com galeria/eventos zerados."""
+    import pythonm as pm
+    pm.CSV_PATH = os.path.join(tmp, "registro.csv")
+    pm.EVENTS_BIN_PATH = os.path.join(tmp, "registro.bin")
+    pm.gallery = pm.FaceGallery()
+    pm.events.clear()
+    pm.event_sink = None
+    pm._log_index = None
+    return pm
+
+
+def fake_encodings(n, rnd):
+    # mesma ordem de grandeza do face_recognition: norma ~1, pessoas diferentes a ~1.4
+    import numpy as np
+    return rnd.normal(0.0, 0.09, (n, 128)).astype(np.float32)
+
+
+def make_event(i, now):
+    from registro_bin import epoch_to_strings
+    data, hora = epoch_to_strings(int(now))   # mesmo fuso do pythonm/registro.bin
+    return {"ts": int(now), "data": data, "hora": hora,
+            "id": f"Rosto {i % 300 + 1}", "status": "Aprovado" if i % 3 else "Negado",
+            "primeira_vez": i < 300, "n": i // 300 + 1}
+
+
+def make_csv(path: str, n: int, seed: int = 7):
+    """CSV no formato do registro.csv, com ~2% de linhas legadas/estranhas."""
+    rnd = random.Random(seed)
+    t = datetime.datetime(2024, 3, 1, 8, 0, 0)
+    status = ["Aprovado", "Negado", "aprovado", "NEGADO", " Aprovado ", "negado pelo sistema"]
+    odd = [
+        "",                                              # linha em branco
+        "01/03/2024,08:00,Rosto 1",                      # colunas insuficientes
+        "31/02/2024,08:00:00,Rosto 2,Aprovado,nao,1",    # data inválida
+        "1/3/2024,8:5:3,Rosto 3,Aprovado,sim,1",         # sem zeros (strptime aceita)
+        "01/03/2024,25:00,Rosto 4,Negado,nao,1",         # hora inválida
+        '01/03/2024,08:00:00,"Rosto, 5",Aprovado,sim,1', # campo com aspas
+        "Data,Hora,Pessoa,Status,PrimeiraVez,N",         # cabeçalho perdido no meio
+        " 01/03/2024 , 08:00 ,Rosto 6,???,s,1",
+        "01/03/2024,08:00:00,Rosto 7,Aprovado,nao,2,cam1,saida,12.5,40",   # sessão
+        "01/03/2024,08:00:00,Rosto 8,Negado,nao,1,cam2,entrada,,",
+        "01/03/2024,08:00:00,Rosto 9,Aprovado,nao,1,cam1,saida,x,3",       # duração inválida
+    ]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("\ufeff")
+        for i in range(n):
+            if rnd.random() < 0.02:
+                f.write(rnd.choice(odd) + "\n")
+                continue
+            t += datetime.timedelta(seconds=rnd.randint(0, 40))
+            hora = t.strftime("%H:%M") if rnd.random() < 0.1 else t.strftime("%H:%M:%S")
+            f.write(f"{t:%d/%m/%Y},{hora},Rosto {rnd.randint(1, 300)},{rnd.choice(status)},"
+                    f"{rnd.choice(['sim', 'nao'])},{i}\n")
+
+
+# ===================== PIPELINE =====================
+def bench_pipeline(video: str, frames: int) -> dict:
+    import cv2
+    with scratch_dir() as tmp:
+        pm = load_pythonm(tmp)
+        pm.ensure_csv_header()
+        pm.event_sink = pm.EventSink(path=pm.CSV_PATH, bin_path=pm.EVENTS_BIN_PATH).start()
+        cap = cv2.VideoCapture(video)
+        if not cap.isOpened():
+            raise SystemExit(f"não foi possível abrir {video}")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        worker = pm.RecognitionWorker(None, None, threading.Event())
+        dash = pm.DashboardRenderer()
+        t_video0 = time.time()
+        decode, gate, tick, display = [], [], [], []
+        n = 0
+        t0 = time.perf_counter()
+        while n < frames:
+            a = time.perf_counter()
+            ok, frame = cap.read()
+            if not ok:
+                break
+            b = time.perf_counter()
+            decode.append(b - a)
+            now = t_video0 + cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            motion = worker.gate.update(frame)
+            c = time.perf_counter()
+            gate.append(c - b)
+            if worker.detection_due(now, motion):
+                worker.last_check_time = now
+                worker.process_frame(frame, now)
+                tick.append(time.perf_counter() - c)
+            else:
+                worker.gated += 1
+            d = time.perf_counter()
+            # o que a thread de exibição faz por frame, sem o imshow
+            shown = frame.copy()
+            texto, cor, rosto = worker.snapshot()
+            cv2.putText(shown, texto, (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, cor, 2)
+            dash.render(rosto)
+            display.append(time.perf_counter() - d)
+            n += 1
+        elapsed = time.perf_counter() - t0
+        cap.release()
+        pm.event_sink.close()
+        pm.event_sink = None
+    res = {"video": os.path.basename(video), "frames": n, "taxa_video": fps,
+           "processamento_fps": n / max(elapsed, 1e-9), "total_s": elapsed,
+           "ticks": len(tick), "sem_movimento": worker.gated,
+           "encodings": worker.tracker.encodings_done, "encodings_evitados": worker.tracker.encodings_avoided,
+           "eventos": pm.events_version, "rostos": len(pm.gallery)}
+    res.update({f"decode_{k}": v for k, v in percentiles(decode).items()})
+    res.update({f"gate_{k}": v for k, v in percentiles(gate).items()})
+    res.update({f"tick_{k}": v for k, v in percentiles(tick).items()})
+    res.update({f"exibicao_{k}": v for k, v in percentiles(display).items()})
+    if pm.metrics.enabled:
+        res["etapas"] = pm.metrics.snapshot()   # IOT_METRICS=1: tempos por etapa do proprio pythonm
+    print(f"[pipeline] {n} frames de {res['video']} em {elapsed:.2f} s ({res['processamento_fps']:.1f} fps;"
+          f" vídeo a {fps:.0f} fps) | ticks {len(tick)}, sem movimento {worker.gated},"
+          f" encodings {res['encodings']} (evitados {res['encodings_evitados']})")
+    for k in ("decode", "gate", "tick", "exibicao"):
+        if f"{k}_p50_ms" in res:
+            print(f"  {k:<9} p50 {res[f'{k}_p50_ms']:7.2f} ms  p95 {res[f'{k}_p95_ms']:7.2f} ms"
+                  f"  p99 {res[f'{k}_p99_ms']:7.2f} ms")
+    return res
+
+
+# ===================== GALERIA =====================
+def bench_gallery(sizes, queries: int = 200) -> dict:
+    import numpy as np
+    rnd = np.random.default_rng(11)
+    res = {}
+    with scratch_dir() as tmp:
+        pm = load_pythonm(tmp)
+        for n in sizes:
+            base = fake_encodings(n, rnd)
+            g = pm.FaceGallery()
+            t0 = time.perf_counter()
+            for e in base:
+                g.add(e)
+            build = time.perf_counter() - t0
+            pm.gallery = g
+            picks = rnd.integers(0, n, queries)
+            known = base[picks] + rnd.normal(0.0, 0.02, (queries, 128)).astype(np.float32)
+            lat = []
+            hits = 0
+            for q in known:
+                a = time.perf_counter()
+                label, novo = pm.get_or_create_face_id(q)
+                lat.append(time.perf_counter() - a)
+                hits += not novo
+            # cadastro: rostos novos (a galeria cresce, como no uso real)
+            fresh = fake_encodings(queries, rnd)
+            enroll = []
+            for q in fresh:
+                a = time.perf_counter()
+                pm.get_or_create_face_id(q)
+                enroll.append(time.perf_counter() - a)
+            # busca antiga: lista de encodings + face_distance (norma de todas as diferenças)
+            known_list = list(base)
+            legacy = []
+            for q in known[:max(5, queries // 10)]:
+                a = time.perf_counter()
+                d = np.linalg.norm(np.asarray(known_list) - q, axis=1)
+                int(np.argmin(d))
+                legacy.append(time.perf_counter() - a)
+            r = {"montagem_s": build, "acertos": hits, "consultas": queries}
+            r.update({f"busca_{k}": v for k, v in percentiles(lat, 1e6, "us").items()})
+            r.update({f"cadastro_{k}": v for k, v in percentiles(enroll, 1e6, "us").items()})
+            r.update({f"legado_{k}": v for k, v in percentiles(legacy, 1e6, "us").items()})
+            r["speedup"] = r["legado_p50_us"] / max(r["busca_p50_us"], 1e-9)
+            res[str(n)] = r
+            print(f"[gallery] {n:>6} rostos: busca p50 {r['busca_p50_us']:8.1f} us"
+                  f" p95 {r['busca_p95_us']:8.1f} us | cadastro p50 {r['cadastro_p50_us']:8.1f} us"
+                  f" | legado p50 {r['legado_p50_us']:9.1f} us ({r['speedup']:.0f}x) | acertos {hits}/{queries}")
+    return res
+
+
+def bench_matcher(sizes, nprobes, queries: int = 300) -> dict:
+    """Busca exata x IVF (vários nprobe): latência, recall e rostos conhecidos tratados como novos."""
+    import numpy as np
+    rnd = np.random.default_rng(13)
+    res = {}
+    with scratch_dir() as tmp:
+        pm = load_pythonm(tmp)
+        for n in sizes:
+            base = fake_encodings(n, rnd)
+            exact = pm.FaceGallery(capacity=n, matcher="exato")
+            ivf = pm.FaceGallery(capacity=n, matcher="ivf")
+            for g in (exact, ivf):
+                t0 = time.perf_counter()
+                for e in base:
+                    g.add(e)
+                if g is ivf:
+                    g.matcher.wait()    # o retreino roda em segundo plano
+                    build = time.perf_counter() - t0
+            picks = rnd.integers(0, n, queries)
+            known = base[picks] + rnd.normal(0.0, 0.02, (queries, 128)).astype(np.float32)
+            unknown = fake_encodings(queries // 3, rnd)
+
+            def run(g):
+                lat, found = [], []
+                for q in np.concatenate([known, unknown]):
+                    a = time.perf_counter()
+                    idx, _ = g.match([q], tol=pm.MATCH_TOL)
+                    lat.append(time.perf_counter() - a)
+                    found.append(int(idx[0]))
+                return lat, np.array(found)
+
+            lat, ref = run(exact)
+            r = {"ivf_montagem_s": build, "ivf_treino_s": ivf.matcher.train_s,
+                 "listas": 0 if ivf.matcher.centroids is None else len(ivf.matcher.centroids)}
+            r.update({f"exato_{k}": v for k, v in percentiles(lat, 1e6, "us").items()})
+            line = f"[matcher] {n:>7} rostos: exato p50 {r['exato_p50_us']:8.1f} us"
+            for p in nprobes:
+                ivf.matcher.nprobe = p
+                lat, got = run(ivf)
+                hit = ref[:queries] >= 0
+                recall = float((got[:queries][hit] == ref[:queries][hit]).mean()) if hit.any() else 1.0
+                # desconhecidos: o IVF nunca inventa um match (só compara com a galeria de verdade)
+                r.update({f"ivf{p}_{k}": v for k, v in percentiles(lat, 1e6, "us").items()})
+                r[f"recall_ivf{p}"] = recall
+                r[f"speedup_ivf{p}"] = r["exato_p50_us"] / max(r[f"ivf{p}_p50_us"], 1e-9)
+                line += (f" | nprobe {p}: p50 {r[f'ivf{p}_p50_us']:7.1f} us ({r[f'speedup_ivf{p}']:.1f}x),"
+                         f" recall {recall * 100:.1f}%")
+            res[str(n)] = r
+            print(line + f" | {r['listas']} listas, treino {r['ivf_treino_s']:.2f} s")
+    return res
+
+
+# ===================== REGISTRO (save_event_csv) =====================
+def bench_sink(n: int) -> dict:
+    res = {}
+    with scratch_dir() as tmp:
+        pm = load_pythonm(tmp)
+        now = time.time()
+        evs = [make_event(i, now + i) for i in range(n)]
+        for durability in ("flush", "fsync"):
+            for name in ("registro.csv", "registro.bin", "registro.bin.ids"):
+                if os.path.exists(os.path.join(tmp, name)):
+                    os.remove(os.path.join(tmp, name))
+            pm.ensure_csv_header()
+            pm.event_sink = pm.EventSink(path=pm.CSV_PATH, durability=durability,
+                                         bin_path=pm.EVENTS_BIN_PATH).start()
+            lat = []
+            t0 = time.perf_counter()
+            for e in evs:
+                a = time.perf_counter()
+                pm.save_event_csv(e)
+                lat.append(time.perf_counter() - a)
+            produced = time.perf_counter() - t0
+            pm.event_sink.close(timeout=120)
+            drained = time.perf_counter() - t0
+            sink, pm.event_sink = pm.event_sink, None
+            r = {"eventos": n, "lotes": sink.batches, "produtor_por_s": n / produced,
+                 "escrita_por_s": n / drained, "total_s": drained}
+            r.update({f"put_{k}": v for k, v in percentiles(lat, 1e6, "us").items()})
+            res[durability] = r
+            print(f"[sink] {durability:<5} {n} eventos: save_event_csv p50 {r['put_p50_us']:.1f} us"
+                  f" p99 {r['put_p99_us']:.1f} us | escrita {r['escrita_por_s']:.0f} eventos/s em {sink.batches} lotes")
+        # antigo: abre, escreve e fecha o CSV a cada evento
+        m = max(100, n // 10)
+        lat = []
+        t0 = time.perf_counter()
+        for e in evs[:m]:
+            a = time.perf_counter()
+            pm.save_event_csv(e)
+            lat.append(time.perf_counter() - a)
+        el = time.perf_counter() - t0
+        r = {"eventos": m, "escrita_por_s": m / el}
+        r.update({f"put_{k}": v for k, v in percentiles(lat, 1e6, "us").items()})
+        res["direto"] = r
+        print(f"[sink] direto {m} eventos: save_event_csv p50 {r['put_p50_us']:.1f} us | {r['escrita_por_s']:.0f} eventos/s")
+    return res
+
+
+# ===================== ARDUINO (SerialActor) =====================
+class PtyArduino:
+    """Pseudo-terminal no lugar do Arduino: o SerialActor abre `link` (symlink para o lado
+    escravo) e uma thread lê o lado mestre. `replug` derruba a porta e liga uma nova."""
+    def __init__(self, link):
+        self.link = link
+        self.master = self.slave = None
+        self.received = []          # (instante, byte)
+        self.plug()
+
+    def plug(self):
+        master, slave = os.openpty()
+        tmp = self.link + ".novo"
+        os.symlink(os.ttyname(slave), tmp)
+        os.replace(tmp, self.link)
+        # o escravo fica aberto aqui também: sem nenhum, ler o mestre dá EIO na hora
+        self.master, self.slave = master, slave
+        self.reader = threading.Thread(target=self._read, args=(master,), daemon=True)
+        self.reader.start()
+
+    def unplug(self):
+        # o leitor sai antes do close: um read bloqueado seguraria o pty aberto
+        master, self.master = self.master, None
+        self.reader.join()
+        os.close(master)
+        os.close(self.slave)
+        self.slave = None
+
+    def _read(self, fd):
+        while self.master == fd:
+            if not select.select([fd], [], [], 0.05)[0]:
+                continue
+            try:
+                data = os.read(fd, 4096)
+            except OSError:
+                return
+            if not data:
+                return
+            now = time.perf_counter()
+            self.received.extend((now, bytes([b])) for b in data)
+
+    def wait_for(self, byte, after, timeout=10.0):
+        """Instante em que `byte` chegou depois de `after` (None se não chegou)."""
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            for t, b in reversed(self.received):
+                if t < after:
+                    break
+                if b == byte:
+                    return t
+            time.sleep(0.001)
+        return None
+
+
+def bench_serial(n: int) -> dict:
+    """SerialActor contra um pty: abertura sem travar o start-up, custo do send no loop,
+    latência de escrita, coalescência de comandos e reconexão depois que a porta cai."""
+    if not hasattr(os, "openpty"):
+        print("[serial] pulado: sem pseudo-terminal nesta plataforma (Windows)")
+        return {}
+    with scratch_dir() as tmp:
+        pm = load_pythonm(tmp)
+        dev = PtyArduino(os.path.join(tmp, "arduino"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            actor = pm.SerialActor(dev.link, boot_s=0).start()
+            started = time.perf_counter() - t0
+            while not actor.connected() and time.perf_counter() - t0 < 10:
+                time.sleep(0.001)
+            opened = time.perf_counter() - t0
+
+            # rajada: o loop alterna liberado/negado mais rápido do que a porta consome
+            lat = []
+            t0 = time.perf_counter()
+            for i in range(n):
+                a = time.perf_counter()
+                actor.send(b"1" if i % 2 else b"0")
+                lat.append(time.perf_counter() - a)
+            actor.send(b"1")
+            burst = time.perf_counter() - t0
+            last = dev.wait_for(b"1", t0)
+            assert last is not None, "o último estado não chegou ao pty"
+            while actor.commands.depth() or actor.wanted != actor.sent:
+                time.sleep(0.001)
+            sent = len(dev.received)
+            writes = sorted(actor.latency)
+
+            # porta cai (cabo solto): o envio falha, o ator tenta de novo com backoff
+            dev.unplug()
+            actor.send(b"0")
+            while actor.connected():
+                time.sleep(0.001)
+            time.sleep(pm.SERIAL_RETRY_S)
+            t0 = time.perf_counter()
+            dev.plug()
+            back = dev.wait_for(b"0", t0)
+            assert back is not None, "o estado não foi reenviado depois da reconexão"
+            actor.close()
+    res = {"comandos": n, "bytes_na_porta": sent, "start_s": started, "abertura_s": opened,
+           "rajada_s": burst, "reconexao_s": back - t0, "reconexoes": actor.connects - 1,
+           "falhas": actor.errors, "escrita_p50_ms": writes[len(writes) // 2] * 1000}
+    res.update({f"send_{k}": v for k, v in percentiles(lat, 1e6, "us").items()})
+    print(f"[serial] start {started * 1000:.2f} ms (porta aberta em {opened * 1000:.1f} ms; antes: 2 s de sleep)"
+          f" | send p50 {res['send_p50_us']:.1f} us p99 {res['send_p99_us']:.1f} us"
+          f" | {n} comandos -> {sent} bytes na porta, escrita p50 {res['escrita_p50_ms']:.3f} ms"
+          f" | reconexão {res['reconexao_s']:.2f} s, {actor.errors} falhas")
+    return res
+
+
+# ===================== VISUALIZADOR (registro anterior) =====================
+def bench_log(n: int) -> dict:
+    import csv
+    import registro_bin
+    with scratch_dir() as tmp:
+        pm = load_pythonm(tmp)
+        pm.ensure_csv_header()
+        now = time.time()
+        with open(pm.CSV_PATH, "a", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            for i in range(n):
+                w.writerow(pm.event_row(make_event(i, now + i)))
+        size_mb = os.path.getsize(pm.CSV_PATH) / 1e6
+
+        t0 = time.perf_counter()
+        rows = pm.read_all_events_csv()
+        t_all = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        idx = pm.CsvLogIndex(pm.CSV_PATH)
+        idx.refresh()
+        page = idx.recent(0, 18)
+        t_idx = time.perf_counter() - t0
+        assert len(idx) == len(rows) and page == rows[::-1][:18], "índice divergiu do read_all_events_csv"
+
+        with open(pm.CSV_PATH, "a", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            for i in range(n, n + 100):
+                w.writerow(pm.event_row(make_event(i, now + i)))
+        t0 = time.perf_counter()
+        novas = idx.refresh()
+        t_tail = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        registro_bin.csv_to_bin(pm.CSV_PATH, pm.EVENTS_BIN_PATH)
+        t_conv = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        reader = registro_bin.EventLogReader(pm.EVENTS_BIN_PATH)
+        bpage = reader.recent(0, 18)
+        t_bin = time.perf_counter() - t0
+        reader.close()
+        assert bpage == idx.recent(0, 18), "log binário divergiu do CSV"
+    res = {"linhas": n, "csv_mb": size_mb, "read_all_s": t_all, "indice_csv_s": t_idx,
+           "tail_100_ms": t_tail * 1000, "csv_para_bin_s": t_conv, "abrir_bin_ms": t_bin * 1000,
+           "speedup_indice": t_all / max(t_idx, 1e-9)}
+    print(f"[log] {n} linhas ({size_mb:.1f} MB): read_all_events_csv {t_all:.3f} s | índice CSV + 1a página"
+          f" {t_idx:.3f} s | +{novas} linhas {t_tail * 1000:.2f} ms | log binário 1a página {t_bin * 1000:.2f} ms")
+    return res
+
+
+# ===================== IMPORTADOR =====================
+def copy_text(rows) -> int:
+    """Codifica as linhas como o COPY ... FROM STDIN (formato texto) e devolve os bytes."""
+    out = io.StringIO()
+    esc = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+    nul = lambda v: "\\N" if v is None else str(v)
+    for pessoa, status, primvez, dt, origem, tipo, dur, amostras in rows:
+        pv = "\\N" if primvez is None else ("t" if primvez else "f")
+        og = "\\N" if origem is None else origem.translate(esc)
+        out.write(f"{pessoa.translate(esc)}\t{status}\t{pv}\t{dt.isoformat()}\t{og}"
+                  f"\t{tipo}\t{nul(dur)}\t{nul(amostras)}\n")
+    return len(out.getvalue().encode("utf-8"))
+
+
+def bench_import_db(dsn: str, path: str) -> dict:
+    """COPY x executemany (ambos pela staging + merge) num schema temporário, tabela vazia a cada modo."""
+    if imp.psycopg is None:
+        print("[import] --dsn precisa do psycopg: pip install 'psycopg[binary]'")
+        return {}
+    schema = f"bench_iot_{os.getpid()}"
+    res = {}
+    with imp.psycopg.connect(dsn) as con:
+        with con.cursor() as cur:
+            cur.execute(f"CREATE SCHEMA {schema}")
+            cur.execute(f"SET search_path TO {schema}")
+            imp.ensure_schema(cur, "plain")
+        con.commit()
+        try:
+            for modo, fn in (("copy", imp.copy_import), ("executemany", imp.executemany_import)):
+                with con.cursor() as cur:
+                    cur.execute("TRUNCATE access_events, access_rollup_hour, access_rollup_day")
+                con.commit()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    t0 = time.perf_counter()
+                    # o make_csv tem status inválidos de propósito; o CHECK da tabela os recusaria
+                    rows = (r for r in imp.CsvRowReader(path, 0) if r[1] in ("Aprovado", "Negado"))
+                    sent, inserted = fn(con, rows)
+                    con.commit()
+                    t = time.perf_counter() - t0
+                res[f"banco_{modo}_s"] = t
+                res[f"banco_{modo}_por_s"] = sent / max(t, 1e-9)
+                res[f"banco_{modo}_novas"] = inserted
+        finally:
+            con.rollback()
+            with con.cursor() as cur:
+                cur.execute(f"DROP SCHEMA {schema} CASCADE")
+            con.commit()
+    assert res["banco_copy_novas"] == res["banco_executemany_novas"], "COPY e executemany divergiram"
+    res["speedup_banco_copy"] = res["banco_executemany_s"] / max(res["banco_copy_s"], 1e-9)
+    print(f"[import] banco: COPY + merge {res['banco_copy_por_s']:.0f} linhas/s | executemany + merge"
+          f" {res['banco_executemany_por_s']:.0f} linhas/s ({res['speedup_banco_copy']:.1f}x)")
+    return res
+
+
+def bench_import(n: int, dsn: str = None) -> dict:
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    try:
+        make_csv(path, n)
+        ref, t_ref, _ = timed(lambda: imp.read_rows(path))
+        t0 = time.perf_counter()
+        nbytes = copy_text(ref)
+        t_enc = time.perf_counter() - t0
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            sent = 0
+            for chunk in imp.chunked(imp.CsvRowReader(path, 0), imp.CHUNK_ROWS):
+                copy_text(chunk)
+                sent += len(chunk)
+            t_pipe = time.perf_counter() - t0
+        res = {"linhas": n, "validas": sent, "read_rows_s": t_ref, "copy_texto_s": t_enc,
+               "copy_mb": nbytes / 1e6, "leitura_mais_copy_s": t_pipe,
+               "leitura_mais_copy_por_s": sent / max(t_pipe, 1e-9),
+               "legado_por_s": sent / max(t_ref + t_enc, 1e-9)}
+        print(f"[import] {n} linhas: CsvRowReader + COPY texto {res['leitura_mais_copy_por_s']:.0f} linhas/s"
+              f" (read_rows + COPY {res['legado_por_s']:.0f} linhas/s, {nbytes / 1e6:.1f} MB de COPY)")
+        if dsn:
+            res.update(bench_import_db(dsn, path))
+    finally:
+        os.remove(path)
+    return res
+
+
+# ===================== PARSER DO CSV =====================
+def bench_parse(n: int) -> dict:
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    try:
+        make_csv(path, n)
+        ref, t_ref, log_ref = timed(lambda: imp.read_rows(path))
+        fast, t_fast, log_fast = timed(lambda: imp.read_rows_fast(path))
+        tail, t_tail, _ = timed(lambda: imp.CsvRowReader(path, 0))
+    finally:
+        os.remove(path)
+    assert fast == ref, "read_rows_fast divergiu do read_rows"
+    assert log_fast == log_ref, "avisos do read_rows_fast divergiram do read_rows"
+    assert tail == ref, "CsvRowReader divergiu do read_rows"
+    res = {
+        "linhas": n, "validas": len(ref),
+        "read_rows_s": t_ref, "read_rows_fast_s": t_fast, "csv_row_reader_s": t_tail,
+        "speedup_fast": t_ref / t_fast, "speedup_reader": t_ref / t_tail,
+    }
+    print(f"[parse] {n} linhas ({len(ref)} válidas), resultados idênticos")
+    for name, t in (("read_rows", t_ref), ("read_rows_fast", t_fast), ("CsvRowReader", t_tail)):
+        print(f"  {name:<15} {t:7.3f} s  {n / t:10.0f} linhas/s  ({t_ref / t:.1f}x)")
+    return res
+
+
+# ===================== RESULTADOS =====================
+def metadata() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"commit": commit, "quando": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "plataforma": platform.platform(),
+            "cpus": os.cpu_count()}
+
+
+def direction(key: str) -> int:
+    """+1 maior é melhor, -1 menor é melhor, 0 informativo."""
+    if key.endswith(("_por_s", "_fps", "fps")) or key.startswith(("speedup", "recall")):
+        return 1
+    if key.endswith(("_s", "_ms", "_us")):
+        return -1
+    return 0
+
+
+def flatten(d, prefix=""):
+    for k, v in d.items():
+        if isinstance(v, dict):
+            yield from flatten(v, f"{prefix}{k}.")
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            yield f"{prefix}{k}", v
+
+
+def compare(old_path: str, new_path: str, limit: float) -> int:
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    a, b = dict(flatten(old["resultados"])), dict(flatten(new["resultados"]))
+    print(f"{old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    worse = 0
+    for key in sorted(a.keys() & b.keys()):
+        sign = direction(key.rsplit(".", 1)[-1])
+        if sign == 0 or a[key] == 0:
+            continue
+        change = (b[key] - a[key]) / abs(a[key]) * 100
+        bad = sign * change < -limit
+        worse += bad
+        print(f"  {'PIOROU' if bad else '      '} {key:<42} {a[key]:12.4g} -> {b[key]:12.4g}  ({change:+.1f}%)")
+    print(f"{worse} métrica(s) pioraram mais de {limit:.0f}%.")
+    return 1 if worse else 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmarks offline do IoT.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    def add(name, help_):
+        p = sub.add_parser(name, help=help_)
+        p.add_argument("--json", help="grava os resultados neste arquivo")
+        p.add_argument("--rapido", action="store_true", help="tamanhos menores (checagem rápida)")
+        return p
+    for name, help_ in (("all", "todos os benchmarks"), ("pipeline", "loop por frame do run_program"),
+                        ("gallery", "get_or_create_face_id"), ("matcher", "busca exata x IVF"),
+                        ("sink", "save_event_csv"), ("serial", "SerialActor num pty"),
+                        ("log", "registro anterior"), ("import", "leitura + COPY do importador"),
+                        ("parse", "parser do CSV do importador")):
+        p = add(name, help_)
+        if name in ("all", "pipeline"):
+            p.add_argument("--video", default="video.mp4")
+            p.add_argument("--frames", type=int, default=600)
+        if name in ("all", "gallery"):
+            p.add_argument("--tamanhos", default="10,100,1000,10000,100000")
+        if name in ("all", "matcher"):
+            p.add_argument("--tamanhos-ivf", dest="tamanhos_ivf", default="10000,100000,300000")
+            p.add_argument("--nprobe", default="1,4,8,16")
+        if name in ("all", "sink"):
+            p.add_argument("--eventos", type=int, default=20000)
+        if name in ("all", "serial"):
+            p.add_argument("--comandos", type=int, default=20000)
+        if name in ("all", "log", "import", "parse"):
+            p.add_argument("--linhas", type=int, default=200000)
+        if name in ("all", "import"):
+            p.add_argument("--dsn", help="banco para medir COPY x executemany de verdade"
+                                         " (num schema temporário, apagado no fim)")
+    p = sub.add_parser("compare", help="compara dois arquivos --json")
+    p.add_argument("antes")
+    p.add_argument("depois")
+    p.add_argument("--limite", type=float, default=10.0, help="piora tolerada, em %%")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "compare":
+        return compare(args.antes, args.depois, args.limite)
+    if args.rapido:
+        for k, v in QUICK.items():
+            if hasattr(args, k):
+                setattr(args, k, v)
+
+    wanted = (("pipeline", "gallery", "matcher", "sink", "serial", "log", "import", "parse")
+              if args.cmd == "all" else (args.cmd,))
+    runs = {
+        "pipeline": lambda: bench_pipeline(args.video, args.frames),
+        "gallery": lambda: bench_gallery([int(s) for s in args.tamanhos.split(",")]),
+        "matcher": lambda: bench_matcher([int(s) for s in args.tamanhos_ivf.split(",")],
+                                         [int(s) for s in args.nprobe.split(",")]),
+        "sink": lambda: bench_sink(args.eventos),
+        "serial": lambda: bench_serial(args.comandos),
+        "log": lambda: bench_log(args.linhas),
+        "import": lambda: bench_import(args.linhas, args.dsn),
+        "parse": lambda: bench_parse(args.linhas),
+    }
+    results = {name: runs[name]() for name in wanted}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"meta": metadata(), "resultados": results}, f, indent=2, ensure_ascii=False)
+        print(f"Resultados gravados em {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
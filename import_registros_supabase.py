@@ -1,5 +1,5 @@
 # import_registros_supabase.py
-import os, csv, sys, datetime
+import os, re, csv, sys, json, time, hashlib, argparse, datetime, itertools
 from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
 load_dotenv()  # carrega variáveis do arquivo .env da pasta atual
@@ -8,15 +8,14 @@ load_dotenv()  # carrega variáveis do arquivo .env da pasta atual
 try:
     import psycopg
 except ImportError:
-    print("Instale as dependências: pip install 'psycopg[binary]'")
-    sys.exit(1)
+    psycopg = None  # checado no main(); as funções de leitura funcionam sem ele
 
 PG_DSN = os.getenv("PG_DSN")
 CSV_PATH = os.getenv("CSV_PATH", "registro.csv")
-
-if not PG_DSN:
-    print("Defina a variável de ambiente PG_DSN com sua connection string do Supabase.")
-    sys.exit(1)
+EVENTS_BIN_PATH = os.getenv("EVENTS_BIN_PATH")  # se definido, importa do log binário (registro_bin)
+IMPORT_MODE = os.getenv("IMPORT_MODE", "copy")   # "copy" (streaming) ou "executemany" (antigo)
+CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "50000"))
+SCHEMA_MODE = os.getenv("SCHEMA_MODE", "plain")  # "plain" ou "partitioned" (partições mensais)
 
 TZ = ZoneInfo("America/Sao_Paulo")
 
@@ -49,87 +48,973 @@ CREATE TABLE IF NOT EXISTS access_events (
   status        text        NOT NULL CHECK (status IN ('Aprovado','Negado')),
   primeira_vez  boolean,
   event_time    timestamptz NOT NULL,
-  created_at    timestamptz NOT NULL DEFAULT now()
+  created_at    timestamptz NOT NULL DEFAULT now(),
+  origem        text,
+  tipo          text        NOT NULL DEFAULT 'tick',
+  duracao_s     real,
+  amostras      integer
 );
+ALTER TABLE access_events ADD COLUMN IF NOT EXISTS origem text;
+ALTER TABLE access_events ADD COLUMN IF NOT EXISTS tipo text NOT NULL DEFAULT 'tick';
+ALTER TABLE access_events ADD COLUMN IF NOT EXISTS duracao_s real;
+ALTER TABLE access_events ADD COLUMN IF NOT EXISTS amostras integer;
 CREATE INDEX IF NOT EXISTS idx_access_events_event_time ON access_events (event_time DESC);
 CREATE INDEX IF NOT EXISTS idx_access_events_pessoa_time ON access_events (pessoa, event_time DESC);
-CREATE UNIQUE INDEX IF NOT EXISTS uniq_access_key
-  ON access_events (pessoa, event_time, status, primeira_vez);
+CREATE UNIQUE INDEX IF NOT EXISTS uniq_access_key_tipo
+  ON access_events (pessoa, event_time, status, primeira_vez, tipo);
+DROP INDEX IF EXISTS uniq_access_key;
+"""
+
+# mesma tabela particionada por mês (horário de São Paulo) em event_time; a PK e a chave de
+# duplicata incluem event_time (exigência do particionamento), então o ON CONFLICT resolve
+# dentro de cada partição. BRIN no tempo: minúsculo e suficiente para faixas de datas.
+PARTITIONED_DDL = """
+CREATE TABLE IF NOT EXISTS access_events (
+  id            bigserial,
+  pessoa        text        NOT NULL,
+  status        text        NOT NULL CHECK (status IN ('Aprovado','Negado')),
+  primeira_vez  boolean,
+  event_time    timestamptz NOT NULL,
+  created_at    timestamptz NOT NULL DEFAULT now(),
+  origem        text,
+  tipo          text        NOT NULL DEFAULT 'tick',
+  duracao_s     real,
+  amostras      integer,
+  PRIMARY KEY (id, event_time)
+) PARTITION BY RANGE (event_time);
+ALTER TABLE access_events ADD COLUMN IF NOT EXISTS origem text;
+ALTER TABLE access_events ADD COLUMN IF NOT EXISTS tipo text NOT NULL DEFAULT 'tick';
+ALTER TABLE access_events ADD COLUMN IF NOT EXISTS duracao_s real;
+ALTER TABLE access_events ADD COLUMN IF NOT EXISTS amostras integer;
+CREATE INDEX IF NOT EXISTS idx_access_events_event_time_brin ON access_events USING brin (event_time);
+CREATE INDEX IF NOT EXISTS idx_access_events_pessoa_time ON access_events (pessoa, event_time DESC);
+CREATE UNIQUE INDEX IF NOT EXISTS uniq_access_key_tipo
+  ON access_events (pessoa, event_time, status, primeira_vez, tipo);
+DROP INDEX IF EXISTS uniq_access_key;
+"""
+
+# resumos por pessoa e hora/dia local (America/Sao_Paulo); consultas de painel leem
+# estas tabelas pequenas pela PK em vez de varrer access_events
+ROLLUP_DDL = """
+CREATE TABLE IF NOT EXISTS access_rollup_hour (
+  pessoa      text        NOT NULL,
+  bucket      timestamp   NOT NULL,
+  aprovado    integer     NOT NULL DEFAULT 0,
+  negado      integer     NOT NULL DEFAULT 0,
+  first_seen  timestamptz NOT NULL,
+  last_seen   timestamptz NOT NULL,
+  PRIMARY KEY (pessoa, bucket)
+);
+CREATE INDEX IF NOT EXISTS idx_access_rollup_hour_bucket ON access_rollup_hour (bucket);
+CREATE TABLE IF NOT EXISTS access_rollup_day (
+  pessoa      text        NOT NULL,
+  bucket      date        NOT NULL,
+  aprovado    integer     NOT NULL DEFAULT 0,
+  negado      integer     NOT NULL DEFAULT 0,
+  first_seen  timestamptz NOT NULL,
+  last_seen   timestamptz NOT NULL,
+  PRIMARY KEY (pessoa, bucket)
+);
+CREATE INDEX IF NOT EXISTS idx_access_rollup_day_bucket ON access_rollup_day (bucket);
+"""
+
+# agrega um conjunto de eventos (`{src}`) e soma nos resumos; usado pelo merge e pelo rebuild.
+# Cada tick ou abertura de sessão (entrada/mudanca) conta um acesso; a saida só fecha a sessão
+# (não conta de novo), mas entra no min/max para o last_seen refletir a permanência.
+ROLLUP_UPSERT = """
+INSERT INTO access_rollup_{grain} AS r (pessoa, bucket, aprovado, negado, first_seen, last_seen)
+SELECT pessoa, date_trunc('{grain}', event_time AT TIME ZONE 'America/Sao_Paulo')::{type},
+       count(*) FILTER (WHERE status = 'Aprovado' AND tipo <> 'saida'),
+       count(*) FILTER (WHERE status = 'Negado' AND tipo <> 'saida'),
+       min(event_time), max(event_time)
+FROM {src}
+GROUP BY 1, 2
+ON CONFLICT (pessoa, bucket) DO UPDATE SET
+  aprovado   = r.aprovado + EXCLUDED.aprovado,
+  negado     = r.negado + EXCLUDED.negado,
+  first_seen = LEAST(r.first_seen, EXCLUDED.first_seen),
+  last_seen  = GREATEST(r.last_seen, EXCLUDED.last_seen)
+"""
+
+# limite do arquivamento (--arquivar-antes): eventos antes dele já estão nos resumos e a
+# partição deles saiu da access_events, então o merge não os veria como duplicatas
+ARCHIVE_DDL = """
+CREATE TABLE IF NOT EXISTS access_archive (
+  id          boolean     PRIMARY KEY DEFAULT true CHECK (id),
+  antes       timestamptz NOT NULL,
+  updated_at  timestamptz NOT NULL DEFAULT now()
+);
+"""
+
+SAVE_ARCHIVE_SQL = """
+INSERT INTO access_archive (antes) VALUES (%s)
+ON CONFLICT (id) DO UPDATE SET
+  antes = GREATEST(access_archive.antes, excluded.antes), updated_at = now()
+"""
+
+# linhas de meses já arquivados saem da staging antes das partições e do merge
+DROP_ARCHIVED_SQL = """
+DELETE FROM access_events_staging WHERE event_time < (SELECT antes FROM access_archive)
+"""
+
+def rollup_upsert(grain: str, src: str) -> str:
+    return ROLLUP_UPSERT.format(grain=grain, src=src,
+                                type="timestamp" if grain == "hour" else "date")
+
+# staging temporária: recebe o COPY sem índices nem checagem de duplicata
+STAGING_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS access_events_staging (
+  pessoa        text,
+  status        text,
+  primeira_vez  boolean,
+  event_time    timestamptz,
+  origem        text,
+  tipo          text,
+  duracao_s     real,
+  amostras      integer
+)
 """
 
-INSERT_SQL = """
-INSERT INTO access_events (pessoa, status, primeira_vez, event_time)
-VALUES (%s, %s, %s, %s)
-ON CONFLICT (pessoa, event_time, status, primeira_vez) DO NOTHING;
+STAGING_COLUMNS = "pessoa, status, primeira_vez, event_time, origem, tipo, duracao_s, amostras"
+COPY_SQL = f"COPY access_events_staging ({STAGING_COLUMNS}) FROM STDIN"
+STAGING_INSERT_SQL = f"""
+INSERT INTO access_events_staging ({STAGING_COLUMNS}) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
 """
 
+# um único INSERT ... SELECT resolve todas as duplicatas de uma vez; só o que entrou de
+# fato (RETURNING) é somado nos resumos, então reimportar o mesmo trecho não conta duas vezes.
+# A origem (câmera) não faz parte da chave: duas câmeras vendo a mesma pessoa no mesmo
+# segundo contam como um acesso, com a origem de quem chegou primeiro. O tipo faz parte da
+# chave: uma sessão de menos de 1 s tem entrada e saida no mesmo segundo.
+MERGE_SQL = f"""
+WITH ins AS (
+  INSERT INTO access_events ({STAGING_COLUMNS})
+  SELECT {STAGING_COLUMNS} FROM access_events_staging
+  ON CONFLICT (pessoa, event_time, status, primeira_vez, tipo) DO NOTHING
+  RETURNING pessoa, status, event_time, tipo
+), h AS ({rollup_upsert("hour", "ins")}
+), d AS ({rollup_upsert("day", "ins")}
+)
+SELECT count(*) FROM ins
+"""
+
+REBUILD_ROLLUPS_SQL = [
+    "TRUNCATE access_rollup_hour, access_rollup_day",
+    rollup_upsert("hour", "access_events"),
+    rollup_upsert("day", "access_events"),
+]
+
+def normalize_status(status: str) -> str:
+    status_norm = (status or "").strip().capitalize()
+    if status_norm not in ("Aprovado", "Negado"):
+        # tenta normalizar melhor (ex.: "negado", "NEGADO", "aprovado")
+        sn = status_norm.lower()
+        if "aprov" in sn:
+            status_norm = "Aprovado"
+        elif "neg" in sn:
+            status_norm = "Negado"
+        else:
+            # se vier algo diferente, mantém texto original sem travar
+            status_norm = (status or "").strip()
+    return status_norm
+
+NO_EXTRA = (None, "tick", None, None)   # origem, tipo, duracao_s, amostras de uma linha antiga
+
+def extra_columns(row: list) -> tuple:
+    """
+    Colunas opcionais do registro.csv: col6=origem, col7=tipo (entrada/mudanca/saida; vazio
+    ou ausente = tick), col8=duracao_s e col9=amostras (só na saida).
+    """
+    if len(row) <= 6:
+        return NO_EXTRA
+    origem = row[6].strip() or None
+    tipo = row[7].strip() if len(row) > 7 else ""
+    if not tipo:
+        return (origem, "tick", None, None)
+    dur = row[8].strip() if len(row) > 8 else ""
+    amostras = row[9].strip() if len(row) > 9 else ""
+    return (origem, tipo, float(dur) if dur else None, int(amostras) if amostras else None)
+
+def parse_row(row: list, where: str):
+    """
+    Converte uma linha do CSV em
+    (pessoa, status, primeira_vez, event_time, origem, tipo, duracao_s, amostras).
+    Devolve None (com aviso) para linhas inválidas; `where` identifica a linha nas mensagens.
+    """
+    # Ignora linhas vazias
+    if not row or all((c or "").strip() == "" for c in row):
+        return None
+
+    # tolera colunas a mais; usa as 6 primeiras se existirem
+    # estrutura esperada: 6 colunas
+    if len(row) < 5:
+        print(f"[{where}] ignorada: colunas insuficientes: {row}")
+        return None
+
+    # unpack tolerante
+    date_str = row[0]
+    time_str = row[1] if len(row) > 1 else ""
+    pessoa   = row[2] if len(row) > 2 else ""
+    status   = row[3] if len(row) > 3 else ""
+    primvez  = row[4] if len(row) > 4 else None
+    # id_csv   = row[5] if len(row) > 5 else None  # ignorado
+
+    pessoa = (pessoa or "").strip()
+    status_norm = normalize_status(status)
+
+    try:
+        dt = parse_dt(date_str, time_str)  # tz-aware America/Sao_Paulo
+    except Exception as e:
+        print(f"[{where}] erro em data/hora '{date_str} {time_str}': {e}")
+        return None
+
+    try:
+        extra = extra_columns(row)  # origem (câmera) e sessão; linhas antigas não têm
+    except ValueError as e:
+        print(f"[{where}] duração/amostras inválidas: {e}")
+        return None
+
+    return (pessoa, status_norm, parse_bool(primvez), dt) + extra
+
 def read_rows(csv_path: str):
     """
     Lê CSV sem cabeçalho:
-    col0=data, col1=hora, col2=pessoa, col3=status, col4=primeira_vez, col5=id(ignorar)
+    col0=data, col1=hora, col2=pessoa, col3=status, col4=primeira_vez, col5=id(ignorar),
+    col6=origem, col7=tipo, col8=duracao_s, col9=amostras (opcionais)
     Ignora linhas em branco.
     """
     with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
         r = csv.reader(f, delimiter=",")
         for i, row in enumerate(r, start=1):
-            # Ignora linhas vazias
-            if not row or all((c or "").strip() == "" for c in row):
-                continue
+            rec = parse_row(row, f"linha {i}")
+            if rec is not None:
+                yield rec
 
-            # tolera colunas a mais; usa as 6 primeiras se existirem
-            # estrutura esperada: 6 colunas
-            if len(row) < 5:
-                print(f"[linha {i}] ignorada: colunas insuficientes: {row}")
-                continue
+# ---- caminho rápido: caches por string em vez de strptime por linha ----
+# Só o formato canônico (dd/mm/yyyy + HH:MM[:SS], com zeros) vai pelo cache; qualquer outra
+# coisa (ou linha inválida) cai em parse_row, então o resultado é idêntico ao read_rows.
+_DATE_RE = re.compile(r"([0-9]{2})/([0-9]{2})/([0-9]{4})")
+FALLBACK = object()
+READ_LINES = 8192   # linhas lidas por vez pelo CsvRowReader
 
-            # unpack tolerante
-            date_str = row[0]
-            time_str = row[1] if len(row) > 1 else ""
-            pessoa   = row[2] if len(row) > 2 else ""
-            status   = row[3] if len(row) > 3 else ""
-            primvez  = row[4] if len(row) > 4 else None
-            # id_csv   = row[5] if len(row) > 5 else None  # ignorado
-
-            pessoa = (pessoa or "").strip()
-            status_norm = (status or "").strip().capitalize()
-            if status_norm not in ("Aprovado", "Negado"):
-                # tenta normalizar melhor (ex.: "negado", "NEGADO", "aprovado")
-                sn = status_norm.lower()
-                if "aprov" in sn:
-                    status_norm = "Aprovado"
-                elif "neg" in sn:
-                    status_norm = "Negado"
-                else:
-                    # se vier algo diferente, mantém texto original sem travar
-                    status_norm = (status or "").strip()
-
-            try:
-                dt = parse_dt(date_str, time_str)  # tz-aware America/Sao_Paulo
-            except Exception as e:
-                print(f"[linha {i}] erro em data/hora '{date_str} {time_str}': {e}")
+class RowParser:
+    """
+    parse_row com memória, um bloco de linhas por vez. Data, hora, status e primeira_vez
+    se repetem muito no log: cada texto distinto é interpretado uma única vez e o
+    event_time sai de meia-noite da data (em cache) + hora do dia (timedelta em cache).
+    """
+    def __init__(self):
+        self.dates = {}      # texto -> datetime 00:00 (tz) | None
+        self.times = {}      # texto -> timedelta | None
+        self.status = {}     # texto -> status normalizado
+        self.bools = {}      # texto -> bool
+        self.fallbacks = 0
+
+    def _date(self, s):
+        m = _DATE_RE.fullmatch(s.strip())
+        if not m:
+            return None
+        try:
+            return datetime.datetime(int(m[3]), int(m[2]), int(m[1]), tzinfo=TZ)
+        except ValueError:
+            return None  # 31/02 etc.: a mensagem de erro sai do parse_row
+
+    def _time(self, s):
+        s = s.strip()
+        if len(s) == 8 and s[2] == ":" and s[5] == ":":
+            h, mi, sec = s[:2], s[3:5], s[6:]
+        elif len(s) == 5 and s[2] == ":":
+            h, mi, sec = s[:2], s[3:], "00"
+        else:
+            return None
+        if not (s.isascii() and (h + mi + sec).isdigit()):
+            return None
+        h, mi, sec = int(h), int(mi), int(sec)
+        if h > 23 or mi > 59 or sec > 59:
+            return None
+        return datetime.timedelta(seconds=h * 3600 + mi * 60 + sec)
+
+    def parse_block(self, rows):
+        """Uma tupla igual à do parse_row por linha, ou FALLBACK onde precisa do caminho lento."""
+        dates, times, status, bools = self.dates, self.times, self.status, self.bools
+        out = []
+        append = out.append
+        for row in rows:
+            if len(row) < 5 or not row[2].strip():
+                append(FALLBACK)  # vazia/curta ou pessoa vazia: mensagens ficam com parse_row
                 continue
+            ds, ts, st, pv = row[0], row[1], row[3], row[4]
+            d = dates.get(ds, FALLBACK)
+            if d is FALLBACK:
+                d = dates[ds] = self._date(ds)
+            t = times.get(ts, FALLBACK)
+            if t is FALLBACK:
+                t = times[ts] = self._time(ts)
+            if d is None or t is None:
+                append(FALLBACK)
+                continue
+            s = status.get(st)
+            if s is None:
+                s = status[st] = normalize_status(st)
+            b = bools.get(pv)
+            if b is None:
+                b = bools[pv] = parse_bool(pv)
+            if len(row) > 6:
+                try:
+                    extra = extra_columns(row)
+                except ValueError:
+                    append(FALLBACK)
+                    continue
+            else:
+                extra = NO_EXTRA
+            append((row[2].strip(), s, b, d + t) + extra)
+        return out
+
+def read_rows_fast(csv_path: str, chunk_rows: int = CHUNK_ROWS, parser: RowParser = None):
+    """
+    Mesmo resultado (e mesmos avisos) do read_rows, em blocos de `chunk_rows` linhas
+    interpretados pelo RowParser, sem strptime por linha.
+    """
+    p = parser or RowParser()
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        r = csv.reader(f, delimiter=",")
+        i = 0
+        while True:
+            block = list(itertools.islice(r, chunk_rows))
+            if not block:
+                break
+            for row, rec in zip(block, p.parse_block(block)):
+                i += 1
+                if rec is FALLBACK:
+                    p.fallbacks += 1
+                    rec = parse_row(row, f"linha {i}")
+                if rec is not None:
+                    yield rec
+
+class CsvRowReader:
+    """
+    Lê o CSV a partir de um offset em bytes, só linhas completas (terminadas em \\n),
+    e mantém `offset` e `last_event_time` do que já foi consumido (para o checkpoint).
+    """
+    def __init__(self, csv_path: str, offset: int = 0, parser: RowParser = None):
+        self.path = csv_path
+        self.offset = offset
+        self.last_event_time = None
+        self.parser = parser or RowParser()
+
+    def __iter__(self):
+        p = self.parser
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            while True:
+                raws = list(itertools.islice(f, READ_LINES))
+                if not raws:
+                    break
+                partial = not raws[-1].endswith(b"\n")
+                if partial:
+                    raws.pop()  # linha ainda sendo escrita: fica para a próxima execução
+                rows = []
+                for raw in raws:
+                    line = raw.decode("utf-8-sig" if self.offset == 0 and not rows else "utf-8",
+                                      errors="replace")
+                    body = line[:-2] if line.endswith("\r\n") else line[:-1]
+                    if '"' in body or "\r" in body or "\0" in body:
+                        rows.append(next(csv.reader([line]), []))  # aspas etc.: módulo csv
+                    else:
+                        rows.append(body.split(",") if body else [])
+                for raw, row, rec in zip(raws, rows, p.parse_block(rows)):
+                    where_offset = self.offset
+                    self.offset += len(raw)
+                    if rec is FALLBACK:
+                        p.fallbacks += 1
+                        rec = parse_row(row, f"byte {where_offset}")
+                    if rec is None:
+                        continue
+                    if self.last_event_time is None or rec[3] > self.last_event_time:
+                        self.last_event_time = rec[3]
+                    yield rec
+                if partial:
+                    return
 
-            yield (pessoa, status_norm, parse_bool(primvez), dt)
+def read_rows_bin(bin_path: str, start: int = 0):
+    """
+    Lê o log binário gerado pelo pythonm.py a partir do registro `start`.
+    Registros de tamanho fixo: é só fatiar o mmap e converter o epoch, sem parse de texto.
+    """
+    from registro_bin import EventLogReader
+    r = EventLogReader(bin_path)
+    try:
+        step = 65536
+        for lo in range(start, len(r), step):
+            for ts, pessoa, aprovado, primvez, _n, origem, tipo, dur, amostras in r.records(lo, lo + step):
+                yield (pessoa, "Aprovado" if aprovado else "Negado", primvez,
+                       datetime.datetime.fromtimestamp(ts, TZ), origem or None,
+                       tipo or "tick", dur, amostras)
+    finally:
+        r.close()
 
-def main():
-    rows = list(read_rows(CSV_PATH))
-    if not rows:
-        print("Nenhuma linha válida encontrada no CSV.")
+class BinRowReader:
+    """Mesma interface do CsvRowReader para o log binário (offset em bytes no .bin)."""
+    def __init__(self, bin_path: str, offset: int = 0):
+        from registro_bin import HEADER_SIZE, RECORD_SIZE
+        self.path = bin_path
+        self.header_size, self.record_size = HEADER_SIZE, RECORD_SIZE
+        self.offset = max(offset, HEADER_SIZE)
+        self.last_event_time = None
+
+    def __iter__(self):
+        start = (self.offset - self.header_size) // self.record_size
+        for rec in read_rows_bin(self.path, start):
+            self.offset += self.record_size
+            if self.last_event_time is None or rec[3] > self.last_event_time:
+                self.last_event_time = rec[3]
+            yield rec
+
+# ===================== CHECKPOINT (high-water mark) =====================
+CHECKPOINT_PATH = os.getenv("IMPORT_CHECKPOINT_PATH", ".import_checkpoint.json")
+HEAD_BYTES = 4096   # identidade do arquivo: hash do começo (detecta rotação/troca)
+
+CHECKPOINT_DDL = """
+CREATE TABLE IF NOT EXISTS import_checkpoints (
+  source          text PRIMARY KEY,
+  file_head       text        NOT NULL,
+  head_len        integer     NOT NULL,
+  byte_offset     bigint      NOT NULL,
+  last_event_time timestamptz,
+  updated_at      timestamptz NOT NULL DEFAULT now()
+)
+"""
+
+SAVE_CHECKPOINT_SQL = """
+INSERT INTO import_checkpoints (source, file_head, head_len, byte_offset, last_event_time, updated_at)
+VALUES (%s, %s, %s, %s, %s, now())
+ON CONFLICT (source) DO UPDATE SET
+  file_head = excluded.file_head, head_len = excluded.head_len,
+  byte_offset = excluded.byte_offset,
+  last_event_time = COALESCE(excluded.last_event_time, import_checkpoints.last_event_time),
+  updated_at = now()
+"""
+
+def file_head(path: str, n: int) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read(n)).hexdigest()
+
+def read_checkpoint_local(source: str):
+    if not os.path.exists(CHECKPOINT_PATH):
+        return None
+    try:
+        with open(CHECKPOINT_PATH, "r", encoding="utf-8") as f:
+            return json.load(f).get(source)
+    except Exception:
+        return None
+
+def load_checkpoint(cur, source: str, path: str) -> int:
+    """
+    Offset seguro para retomar. O banco é a fonte da verdade (gravado na mesma transação
+    do merge); o JSON local é usado se a tabela ainda não tiver a linha (ou com cur=None).
+    Arquivo menor que o offset (truncado) ou com começo diferente (rotacionado) => 0.
+    """
+    cp = None
+    if cur is not None:
+        cur.execute("SELECT file_head, head_len, byte_offset, last_event_time FROM import_checkpoints"
+                    " WHERE source = %s", (source,))
+        r = cur.fetchone()
+        if r:
+            cp = {"file_head": r[0], "head_len": r[1], "byte_offset": r[2],
+                  "last_event_time": r[3].isoformat() if r[3] else None}
+    if cp is None:
+        cp = read_checkpoint_local(source)
+    if not cp:
+        return 0
+    return validate_checkpoint(cp, path)
+
+def validate_checkpoint(cp: dict, path: str) -> int:
+    if not os.path.exists(path):
+        return 0
+    size = os.path.getsize(path)
+    if cp["byte_offset"] > size:
+        print(f"Checkpoint: {path} ficou menor que o offset salvo (truncado?), reimportando do início.")
+        return 0
+    if file_head(path, cp["head_len"]) != cp["file_head"]:
+        print(f"Checkpoint: {path} não é o mesmo arquivo (rotacionado?), reimportando do início.")
+        return 0
+    print(f"Checkpoint: retomando do byte {cp['byte_offset']} (último evento {cp['last_event_time']}).")
+    return cp["byte_offset"]
+
+def make_checkpoint(path: str, reader) -> dict:
+    head_len = min(HEAD_BYTES, reader.offset)
+    return {"file_head": file_head(path, head_len), "head_len": head_len,
+            "byte_offset": reader.offset,
+            "last_event_time": reader.last_event_time.isoformat() if reader.last_event_time else None}
+
+def save_checkpoint(cur, source: str, path: str, reader) -> dict:
+    cp = make_checkpoint(path, reader)
+    cur.execute(SAVE_CHECKPOINT_SQL, (source, cp["file_head"], cp["head_len"], reader.offset,
+                                      reader.last_event_time))
+    return cp
+
+def save_checkpoint_local(source: str, cp: dict):
+    data = {}
+    if os.path.exists(CHECKPOINT_PATH):
+        try:
+            with open(CHECKPOINT_PATH, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            data = {}
+    data[source] = cp
+    tmp = CHECKPOINT_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, CHECKPOINT_PATH)
+
+def table_kind(cur, name: str):
+    """relkind do pg_class: 'r' tabela comum, 'p' particionada, None se não existe."""
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (name,))
+    r = cur.fetchone()
+    return r[0] if r else None
+
+def ensure_schema(cur, mode: str = None):
+    mode = mode or SCHEMA_MODE
+    kind = table_kind(cur, "access_events")
+    if mode == "partitioned" and kind == "r":
+        print("access_events já existe como tabela comum; converta com --migrar-particionado.")
+        sys.exit(1)
+    ddl = PARTITIONED_DDL if mode == "partitioned" or kind == "p" else DDL
+    for stmt in filter(None, (ddl + ROLLUP_DDL + ARCHIVE_DDL).split(";")):
+        s = stmt.strip()
+        if s:
+            cur.execute(s + ";")
+
+# ---- partições mensais ----
+# cache das partições já criadas nesta conexão; um rollback desfaz o CREATE, então quem
+# descarta a transação (ou a conexão) chama forget_partitions()
+_known_partitions = set()
+
+def forget_partitions():
+    _known_partitions.clear()
+
+def partition_name(month: datetime.datetime) -> str:
+    return f"access_events_{month:%Y%m}"
+
+def month_range(month: datetime.datetime) -> tuple:
+    """Início e fim (exclusivo) do mês no horário local."""
+    start = month.replace(day=1, hour=0, minute=0, second=0, microsecond=0, tzinfo=TZ)
+    return start, (start + datetime.timedelta(days=32)).replace(day=1)
+
+def create_partition(cur, month: datetime.datetime):
+    """Partição do mês (início do mês no horário local, sem tz) se ainda não existir."""
+    from psycopg import sql
+    name = partition_name(month)
+    if name in _known_partitions:
         return
+    start, end = month_range(month)
+    cur.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF access_events"
+                        " FOR VALUES FROM ({}) TO ({})").format(
+        sql.Identifier(name), sql.Literal(start.isoformat()), sql.Literal(end.isoformat())))
+    _known_partitions.add(name)
+
+def ensure_partitions(cur, src: str = "access_events_staging"):
+    """Cria as partições dos meses presentes em `src` (nada a fazer se não for particionada)."""
+    if table_kind(cur, "access_events") != "p":
+        return
+    cur.execute("SELECT DISTINCT date_trunc('month', event_time AT TIME ZONE 'America/Sao_Paulo')"
+                f" FROM {src}")
+    for (month,) in cur.fetchall():
+        create_partition(cur, month)
+
+def list_partitions(cur) -> list:
+    cur.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid"
+                " WHERE i.inhparent = 'access_events'::regclass ORDER BY 1")
+    return [r[0] for r in cur.fetchall()]
+
+def archive_partitions(con, before: str, export_dir: str = None):
+    """
+    Desanexa as partições de meses anteriores a `before` (AAAA-MM). Sem `export_dir` a
+    tabela fica no banco como <nome>_arquivo; com `export_dir` vira <nome>.csv.gz e é apagada.
+    Os resumos (access_rollup_*) não mudam; o fim do último mês arquivado fica em
+    access_archive e o importador passa a pular eventos anteriores a ele.
+    """
+    import gzip
+    from psycopg import sql
+    cutoff = partition_name(datetime.datetime.strptime(before, "%Y-%m"))
+    with con.cursor() as cur:
+        if table_kind(cur, "access_events") != "p":
+            print("access_events não é particionada; nada a arquivar.")
+            return
+        old = [n for n in list_partitions(cur) if n < cutoff]
+        for name in old:
+            ident = sql.Identifier(name)
+            cur.execute(sql.SQL("ALTER TABLE access_events DETACH PARTITION {}").format(ident))
+            if export_dir:
+                os.makedirs(export_dir, exist_ok=True)
+                out = os.path.join(export_dir, name + ".csv.gz")
+                with gzip.open(out, "wb") as f, \
+                        cur.copy(sql.SQL("COPY {} TO STDOUT WITH (FORMAT csv, HEADER)").format(ident)) as cp:
+                    for data in cp:
+                        f.write(data)
+                cur.execute(sql.SQL("DROP TABLE {}").format(ident))
+                print(f"  {name}: exportada para {out} e removida")
+            else:
+                cur.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+                    ident, sql.Identifier(name + "_arquivo")))
+                print(f"  {name}: desanexada como {name}_arquivo")
+            _known_partitions.discard(name)
+        if old:
+            month = datetime.datetime.strptime(old[-1].rsplit("_", 1)[1], "%Y%m")
+            cur.execute(SAVE_ARCHIVE_SQL, (month_range(month)[1],))
+    con.commit()
+    print(f"{len(old)} partição(ões) anteriores a {before} arquivada(s).")
+
+def migrate_to_partitioned(con):
+    """Converte uma access_events comum na versão particionada (mesmos ids), numa transação."""
+    with con.cursor() as cur:
+        if table_kind(cur, "access_events") != "r":
+            print("access_events não existe ou já é particionada.")
+            return
+        t0 = time.perf_counter()
+        cur.execute("ALTER TABLE access_events RENAME TO access_events_antiga")
+        for idx in ("access_events_pkey", "idx_access_events_event_time",
+                    "idx_access_events_pessoa_time", "uniq_access_key", "uniq_access_key_tipo"):
+            cur.execute(f"ALTER INDEX IF EXISTS {idx} RENAME TO {idx}_antiga")
+        cur.execute("ALTER TABLE access_events_antiga ADD COLUMN IF NOT EXISTS origem text,"
+                    " ADD COLUMN IF NOT EXISTS tipo text NOT NULL DEFAULT 'tick',"
+                    " ADD COLUMN IF NOT EXISTS duracao_s real, ADD COLUMN IF NOT EXISTS amostras integer")
+        ensure_schema(cur, "partitioned")
+        ensure_partitions(cur, "access_events_antiga")
+        cols = f"id, created_at, {STAGING_COLUMNS}"
+        cur.execute(f"INSERT INTO access_events ({cols}) SELECT {cols} FROM access_events_antiga")
+        moved = cur.rowcount
+        cur.execute("SELECT setval(pg_get_serial_sequence('access_events', 'id'),"
+                    " (SELECT coalesce(max(id), 0) + 1 FROM access_events), false)")
+        cur.execute("DROP TABLE access_events_antiga")
+        parts = len(list_partitions(cur))
+    con.commit()
+    print(f"access_events particionada: {moved} linhas em {parts} partições"
+          f" ({time.perf_counter() - t0:.1f} s).")
+
+def chunked(it, n: int):
+    it = iter(it)
+    while True:
+        chunk = list(itertools.islice(it, n))
+        if not chunk:
+            return
+        yield chunk
 
-    print(f"Linhas válidas no CSV: {len(rows)}")
+def skip_archived(cur):
+    """Tira da staging os eventos de meses já arquivados (os resumos já os contaram)."""
+    cur.execute(DROP_ARCHIVED_SQL)
+    if cur.rowcount > 0:
+        print(f"  {cur.rowcount} linha(s) de meses já arquivados ignoradas.")
+
+def copy_import(con, rows, chunk_rows: int = CHUNK_ROWS, verbose: bool = True):
+    """
+    Envia as linhas com COPY para a staging temporária em blocos de tamanho fixo
+    (memória constante) e depois faz um único merge em access_events.
+    Retorna (linhas enviadas, linhas novas).
+    """
+    sent = 0
+    t0 = time.perf_counter()
+    with con.cursor() as cur:
+        cur.execute(STAGING_DDL)
+        cur.execute("TRUNCATE access_events_staging")
+        for chunk in chunked(rows, chunk_rows):
+            with cur.copy(COPY_SQL) as cp:
+                for r in chunk:
+                    cp.write_row(r)
+            sent += len(chunk)
+            el = time.perf_counter() - t0
+            if verbose:
+                print(f"  COPY: {sent} linhas ({sent / max(el, 1e-9):.0f} linhas/s)")
+        skip_archived(cur)
+        ensure_partitions(cur)
+        cur.execute(MERGE_SQL)
+        inserted = cur.fetchone()[0]
+        cur.execute("TRUNCATE access_events_staging")
+    return sent, inserted
+
+def executemany_import(con, rows):
+    # modo antigo (linha a linha), mas pela mesma staging + merge para manter os resumos
+    rows = list(rows)
+    with con.cursor() as cur:
+        cur.execute(STAGING_DDL)
+        cur.execute("TRUNCATE access_events_staging")
+        cur.executemany(STAGING_INSERT_SQL, rows)
+        skip_archived(cur)
+        ensure_partitions(cur)
+        cur.execute(MERGE_SQL)
+        inserted = cur.fetchone()[0]
+        cur.execute("TRUNCATE access_events_staging")
+    return len(rows), inserted
+
+def rebuild_rollups(con):
+    """Recalcula os resumos a partir de access_events (backfill / correção)."""
+    t0 = time.perf_counter()
+    with con.cursor() as cur:
+        ensure_schema(cur)
+        for sql in REBUILD_ROLLUPS_SQL:
+            cur.execute(sql)
+        cur.execute("SELECT (SELECT count(*) FROM access_rollup_hour), (SELECT count(*) FROM access_rollup_day)")
+        hours, days = cur.fetchone()
+    con.commit()
+    print(f"Resumos recalculados em {time.perf_counter() - t0:.2f} s:"
+          f" {hours} linhas por hora, {days} linhas por dia.")
+
+# ===================== SINCRONIZAÇÃO CONTÍNUA (--sync) =====================
+SYNC_LATENCY_S = float(os.getenv("SYNC_LATENCY_S", "2.0"))   # alvo de atraso arquivo -> banco
+SYNC_BATCH_MAX = int(os.getenv("SYNC_BATCH_MAX", "5000"))
+SYNC_STATS_S = float(os.getenv("SYNC_STATS_S", "30"))
+SYNC_BACKOFF_MAX_S = 60.0
+SPOOL_PATH = os.getenv("SYNC_SPOOL_PATH", ".sync_spool.csv")
+
+def spool_append(rows):
+    """Guarda lotes que não puderam ir ao banco (fica durável antes de avançar o checkpoint local)."""
+    with open(SPOOL_PATH, "a", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        for pessoa, status, primvez, dt, origem, tipo, dur, amostras in rows:
+            w.writerow([pessoa, status, "" if primvez is None else int(primvez), dt.isoformat(),
+                        origem or "", tipo, "" if dur is None else dur,
+                        "" if amostras is None else amostras])
+        f.flush()
+        os.fsync(f.fileno())
+
+def spool_rows():
+    with open(SPOOL_PATH, "r", encoding="utf-8", newline="") as f:
+        for pessoa, status, primvez, dt, *extra in csv.reader(f):  # spool antigo: sem origem/sessão
+            origem, tipo, dur, amostras = (extra + ["", "tick", "", ""][len(extra):])[:4]
+            yield (pessoa, status, None if primvez == "" else primvez == "1",
+                   datetime.datetime.fromisoformat(dt), origem or None, tipo,
+                   float(dur) if dur else None, int(amostras) if amostras else None)
+
+def spool_size() -> int:
+    if not os.path.exists(SPOOL_PATH):
+        return 0
+    with open(SPOOL_PATH, "rb") as f:
+        return sum(1 for _ in f)
+
+class SyncStats:
+    def __init__(self):
+        self.t0 = self.window_t0 = time.monotonic()
+        self.sent = self.window_sent = 0
+        self.batches = 0
+        self.reconnects = 0
+        self.spooled = 0
+        self.lag_s = None          # agora - horário do último evento gravado no banco
+        self.commit_ms = None
+
+    def shipped(self, n: int, last_event_time, commit_s: float):
+        self.sent += n
+        self.window_sent += n
+        self.batches += 1
+        self.commit_ms = commit_s * 1000
+        if last_event_time is not None:
+            self.lag_s = (datetime.datetime.now(TZ) - last_event_time).total_seconds()
+
+    def report(self, pending: int):
+        now = time.monotonic()
+        rate = self.window_sent / max(now - self.window_t0, 1e-9)
+        lag = "-" if self.lag_s is None else f"{self.lag_s:.1f} s"
+        commit = "-" if self.commit_ms is None else f"{self.commit_ms:.0f} ms"
+        print(f"[sync] enviados {self.sent} em {self.batches} lotes | {rate:.1f} linhas/s"
+              f" | atraso do último evento {lag} | commit {commit}"
+              f" | pendentes {pending} | spool {spool_size()} | reconexões {self.reconnects}", flush=True)
+        self.window_t0, self.window_sent = now, 0
+
+def run_sync(path: str, use_bin: bool):
+    """
+    Segue o arquivo enquanto ele cresce e envia micro-lotes (COPY + merge) com uma única
+    conexão. Banco fora do ar: os lotes vão para o spool local e a conexão é refeita com
+    backoff exponencial; o spool é drenado antes do próximo lote.
+    """
+    source = os.path.basename(path)
+    Reader = BinRowReader if use_bin else CsvRowReader
+    flush_after = SYNC_LATENCY_S / 2          # metade do orçamento esperando, metade gravando
+    poll_s = min(0.5, SYNC_LATENCY_S / 4)
+    stats = SyncStats()
+    con = None
+    backoff = 1.0
+    retry_at = 0.0
+    last_report = time.monotonic()
+    pending, pending_since = [], None
+    head = None   # identidade do arquivo seguido (hash do começo), para notar rotação
+
+    def connect():
+        nonlocal con
+        forget_partitions()
+        con = psycopg.connect(PG_DSN, connect_timeout=10)
+        with con.cursor() as cur:
+            ensure_schema(cur)
+            cur.execute(CHECKPOINT_DDL)
+        con.commit()
+
+    def drop_connection():
+        nonlocal con
+        forget_partitions()   # o lote que falhou pode ter criado partições que voltaram atrás
+        try:
+            if con is not None:
+                con.close()
+        except Exception:
+            pass
+        con = None
+
+    try:
+        connect()
+        with con.cursor() as cur:
+            offset = load_checkpoint(cur, source, path)
+    except psycopg.Error as e:
+        print(f"[sync] banco indisponível ({e}); usando checkpoint local e spool.")
+        drop_connection()
+        cp = read_checkpoint_local(source)
+        offset = validate_checkpoint(cp, path) if cp else 0
+    reader = Reader(path, offset)
+    print(f"[sync] seguindo {path} a partir do byte {reader.offset}"
+          f" (alvo de atraso {SYNC_LATENCY_S:.1f} s, lote máx. {SYNC_BATCH_MAX})", flush=True)
+
+    try:
+        while True:
+            # rotação/truncamento enquanto roda: recomeça do início do arquivo novo
+            if os.path.exists(path):
+                if os.path.getsize(path) < reader.offset or (
+                        head is not None and file_head(path, head[0]) != head[1]):
+                    print(f"[sync] {path} truncado/rotacionado; seguindo do início.", flush=True)
+                    reader, head = Reader(path, 0), None
+                if head is None or head[0] < min(HEAD_BYTES, reader.offset):
+                    n = min(HEAD_BYTES, reader.offset)
+                    head = (n, file_head(path, n))
+
+            got = list(itertools.islice(iter(reader), SYNC_BATCH_MAX - len(pending))) \
+                if os.path.exists(path) else []
+            if got and not pending:
+                pending_since = time.monotonic()
+            pending.extend(got)
+
+            now = time.monotonic()
+            due = pending and (len(pending) >= SYNC_BATCH_MAX or now - pending_since >= flush_after)
+            if due and con is None and now >= retry_at:
+                try:
+                    connect()
+                    backoff = 1.0
+                    stats.reconnects += 1
+                    print("[sync] reconectado ao banco.", flush=True)
+                except psycopg.Error as e:
+                    print(f"[sync] banco indisponível ({e.__class__.__name__}); nova tentativa em {backoff:.0f} s")
+                    retry_at = now + backoff
+                    backoff = min(SYNC_BACKOFF_MAX_S, backoff * 2)
+            if due:
+                if con is not None:
+                    try:
+                        t0 = time.perf_counter()
+                        drained = 0
+                        if os.path.exists(SPOOL_PATH):
+                            drained, _ = copy_import(con, spool_rows(), verbose=False)
+                        copy_import(con, pending, verbose=False)
+                        with con.cursor() as cur:
+                            cp = save_checkpoint(cur, source, path, reader)
+                        con.commit()
+                        if os.path.exists(SPOOL_PATH):
+                            os.remove(SPOOL_PATH)
+                        save_checkpoint_local(source, cp)
+                        stats.shipped(drained + len(pending), reader.last_event_time, time.perf_counter() - t0)
+                        pending, pending_since = [], None
+                    except psycopg.Error as e:
+                        print(f"[sync] falha ao gravar lote ({e.__class__.__name__}: {e}); indo para o spool.")
+                        drop_connection()
+                        retry_at = time.monotonic() + backoff
+                        backoff = min(SYNC_BACKOFF_MAX_S, backoff * 2)
+                if con is None and pending:
+                    spool_append(pending)
+                    stats.spooled += len(pending)
+                    save_checkpoint_local(source, make_checkpoint(path, reader))
+                    pending, pending_since = [], None
+
+            if time.monotonic() - last_report >= SYNC_STATS_S:
+                stats.report(len(pending))
+                last_report = time.monotonic()
+            if not got:
+                time.sleep(poll_s)
+    except KeyboardInterrupt:
+        print("[sync] encerrando...")
+        if pending:
+            spool_append(pending)
+            save_checkpoint_local(source, make_checkpoint(path, reader))
+        stats.report(0)
+    finally:
+        drop_connection()
+
+def main(argv=None):
+    global SCHEMA_MODE
+    ap = argparse.ArgumentParser(description="Importa o registro.csv para o Postgres/Supabase.")
+    ap.add_argument("--modo", choices=("copy", "executemany"), default=IMPORT_MODE,
+                    help="copy = streaming via staging temporária (padrão); executemany = linha a linha")
+    ap.add_argument("--completo", action="store_true",
+                    help="ignora o checkpoint e relê o arquivo inteiro (duplicatas continuam ignoradas)")
+    ap.add_argument("--rebuild-rollups", action="store_true",
+                    help="recalcula access_rollup_hour/access_rollup_day a partir de access_events e sai")
+    ap.add_argument("--schema", choices=("plain", "partitioned"), default=SCHEMA_MODE,
+                    help="plain = tabela única (padrão); partitioned = partições mensais em event_time")
+    ap.add_argument("--migrar-particionado", action="store_true",
+                    help="converte a access_events comum existente para a versão particionada e sai")
+    ap.add_argument("--arquivar-antes", metavar="AAAA-MM",
+                    help="desanexa as partições de meses anteriores a AAAA-MM e sai")
+    ap.add_argument("--exportar-dir", metavar="PASTA",
+                    help="com --arquivar-antes: grava cada partição em PASTA/<nome>.csv.gz e a apaga")
+    ap.add_argument("--sync", action="store_true",
+                    help="fica rodando: segue o arquivo e envia micro-lotes (SYNC_LATENCY_S) até Ctrl+C")
+    args = ap.parse_args(argv)
+
+    if psycopg is None:
+        print("Instale as dependências: pip install 'psycopg[binary]'")
+        sys.exit(1)
+    if not PG_DSN:
+        print("Defina a variável de ambiente PG_DSN com sua connection string do Supabase.")
+        sys.exit(1)
+
+    SCHEMA_MODE = args.schema
+    if args.rebuild_rollups or args.migrar_particionado or args.arquivar_antes:
+        with psycopg.connect(PG_DSN) as con:
+            if args.migrar_particionado:
+                migrate_to_partitioned(con)
+            if args.arquivar_antes:
+                archive_partitions(con, args.arquivar_antes, args.exportar_dir)
+            if args.rebuild_rollups:
+                rebuild_rollups(con)
+        return
+    path = EVENTS_BIN_PATH or CSV_PATH
+    if args.sync:
+        run_sync(path, bool(EVENTS_BIN_PATH))
+        return
+    source = os.path.basename(path)
+    t0 = time.perf_counter()
     with psycopg.connect(PG_DSN) as con:
         with con.cursor() as cur:
             # garante DDL
-            for stmt in filter(None, DDL.split(";")):
-                s = stmt.strip()
-                if s:
-                    cur.execute(s + ";")
+            ensure_schema(cur)
+            cur.execute(CHECKPOINT_DDL)
+            offset = 0 if args.completo else load_checkpoint(cur, source, path)
 
+        reader = (BinRowReader if EVENTS_BIN_PATH else CsvRowReader)(path, offset)
+        rows = iter(reader)
+        first = next(rows, None)
+        if first is None:
+            print("Nenhuma linha nova encontrada no CSV." if offset else "Nenhuma linha válida encontrada no CSV.")
+            return
+        rows = itertools.chain([first], rows)
+
+        if args.modo == "copy":
+            sent, inserted = copy_import(con, rows)
+        else:
             # insere em lote
-            cur.executemany(INSERT_SQL, rows)
+            sent, inserted = executemany_import(con, rows)
 
+        with con.cursor() as cur:
+            # mesmo commit dos dados: o checkpoint nunca fica à frente do que foi gravado
+            cp = save_checkpoint(cur, source, path, reader)
         con.commit()
+    save_checkpoint_local(source, cp)
+    el = time.perf_counter() - t0
+    print(f"Linhas válidas no CSV: {sent}")
+    if inserted is not None:
+        print(f"Linhas novas: {inserted} (duplicatas ignoradas: {sent - inserted})")
+    print(f"Modo {args.modo}: {el:.2f} s, {sent / max(el, 1e-9):.0f} linhas/s; checkpoint no byte {cp['byte_offset']}")
     print("Importação concluída sem erros (duplicatas ignoradas).")
 
 if __name__ == "__main__":
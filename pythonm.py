@@ -1,19 +1,32 @@
 # -*- coding: utf-8 -*-
 import cv2
 import face_recognition
+import sys
 import time
 import csv
+import json
 import os
+import argparse
 import numpy as np
 from collections import deque
 import math
+import queue
+import threading
+import datetime
+import heapq
+from registro_bin import EventLogReader, EventLogWriter, csv_to_bin, epoch_to_strings, local_to_epoch
 
 # ===================== CONFIG =====================
 SERIAL_PORT = 'COM3'
 SERIAL_BAUD = 9600
 VIDEO_SOURCE = "video.mp4"
-CHECK_INTERVAL_S = 0.8          
+VIDEO_SOURCES = None            # [(nome, fonte), ...] para varias cameras; None = so VIDEO_SOURCE
+SOURCE_NAME = "cam1"            # origem gravada nos eventos quando ha uma fonte so
+CHECK_INTERVAL_S = 0.8          # cadencia de deteccao com rostos em cena
+MATCH_TOL = 0.5                 # distancia maxima para considerar o mesmo rosto
 CSV_PATH = "registro.csv"
+EVENTS_BIN_PATH = "registro.bin" # log binario paralelo ao CSV (None desliga)
+GALLERY_DIR = "galeria"         # galeria persistente (encodings/numeros/contagens .npy)
 
 # Paleta/cores
 COL_TEXT  = (242, 244, 248)
@@ -43,11 +56,148 @@ MENU_W, MENU_H = 1100, 600
 DASH_W, DASH_H = 760, 560   # mais espaco pro dashboard
 
 # ===================== ESTADO DASHBOARD =====================
-known_faces = []          # encodings conhecidos
-face_ids = []             # rotulos "Rosto 1", "Rosto 2", ...
-face_counts = {}          # contagem de aparicoes por rosto
 events = deque(maxlen=18) # ultimos eventos
-next_face_number = 1
+events_version = 0        # incrementa a cada evento (dashboard so redesenha quando muda)
+state_lock = threading.Lock()  # protege galeria/eventos entre reconhecimento e exibicao
+access_resolver = None    # AccessResolver ativo durante run_program
+source_feeds = []         # SourceFeed de cada camera (vazao por fonte no Dashboard)
+
+# ===================== INSTRUMENTACAO (tempo por etapa) =====================
+METRICS_ENABLED = os.getenv("IOT_METRICS") == "1"   # estado inicial; tecla 'm' no Dashboard alterna
+METRICS_WINDOW = 512            # amostras por etapa (janela deslizante)
+METRICS_PORT = 9108             # Prometheus em 127.0.0.1:<porta>/metrics (None desliga)
+METRICS_JSON_PATH = "metricas.json"   # dump periodico (None desliga)
+METRICS_JSON_S = 10.0
+METRICS_OVERLAY_S = 0.5         # frequencia de redesenho do painel no Dashboard
+METRICS_STAGES = ("captura", "gate", "resize", "deteccao", "encodings",
+                  "galeria", "registro", "imshow", "dashboard", "serial")
+
+class StageTimers:
+    """Cronometros por etapa em buffers circulares. Desligado, cada ponto de medicao custa
+    so uma chamada que devolve 0 (nada de perf_counter nem escrita)."""
+    def __init__(self, stages=METRICS_STAGES, window=METRICS_WINDOW, enabled=METRICS_ENABLED):
+        self.stages = stages
+        self.window = window
+        self.enabled = enabled
+        self.buf = {s: np.zeros(window) for s in stages}
+        self.count = {s: 0 for s in stages}
+        self.total = {s: 0.0 for s in stages}
+        self.drained = {s: (0, 0.0) for s in stages}   # (count, total) ja entregues por drain
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        return self.enabled
+
+    def mark(self):
+        return time.perf_counter() if self.enabled else 0.0
+
+    def lap(self, stage, t0):
+        """Registra o tempo desde t0 (de mark/lap) e devolve o novo instante (encadeavel)."""
+        if not t0:
+            return 0.0
+        t = time.perf_counter()
+        # cada etapa e escrita por uma unica thread (com varias cameras em threads uma amostra
+        # pode se perder; e so estatistica); leitores so copiam
+        n = self.count[stage]
+        self.buf[stage][n % self.window] = t - t0
+        self.count[stage] = n + 1
+        self.total[stage] += t - t0
+        return t
+
+    def drain(self):
+        """Amostras novas desde a ultima chamada, para outro processo somar com merge:
+        {etapa: (amostras novas, soma nova, [ultimas ate `window` duracoes])}."""
+        out = {}
+        for s in self.stages:
+            n, total = self.count[s], self.total[s]
+            n0, total0 = self.drained[s]
+            if n == n0:
+                continue
+            k = min(n - n0, self.window)
+            out[s] = (n - n0, total - total0, self.buf[s][np.arange(n - k, n) % self.window].tolist())
+            self.drained[s] = (n, total)
+        return out
+
+    def merge(self, drained):
+        """Soma o drain de um processo de camera (no principal, pela thread do CameraHub)."""
+        for s, (n, total, samples) in drained.items():
+            if s not in self.buf:
+                continue
+            c = self.count[s]
+            for v in samples:
+                self.buf[s][c % self.window] = v
+                c += 1
+            self.count[s] += n
+            self.total[s] += total
+
+    def snapshot(self):
+        """{etapa: {n, p50_ms, p95_ms, p99_ms, media_ms}} das ultimas `window` amostras."""
+        out = {}
+        for s in self.stages:
+            n = self.count[s]
+            if not n:
+                continue
+            v = self.buf[s][:min(n, self.window)].copy()
+            p50, p95, p99 = np.percentile(v, (50, 95, 99)) * 1000
+            out[s] = {"n": n, "p50_ms": p50, "p95_ms": p95, "p99_ms": p99,
+                      "media_ms": float(v.mean()) * 1000}
+        return out
+
+    def prometheus(self):
+        lines = ["# HELP iot_stage_seconds Duracao de cada etapa do pipeline (janela deslizante).",
+                 "# TYPE iot_stage_seconds summary"]
+        snap = self.snapshot()
+        for s, m in snap.items():
+            for q, key in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+                lines.append(f'iot_stage_seconds{{stage="{s}",quantile="{q}"}} {m[key] / 1000:.6g}')
+            lines.append(f'iot_stage_seconds_sum{{stage="{s}"}} {self.total[s]:.6g}')
+            lines.append(f'iot_stage_seconds_count{{stage="{s}"}} {m["n"]}')
+        lines.append("# HELP iot_metrics_enabled 1 se a instrumentacao esta ligada.")
+        lines.append("# TYPE iot_metrics_enabled gauge")
+        lines.append(f"iot_metrics_enabled {int(self.enabled)}")
+        lines.append("# HELP iot_events_total Eventos de acesso registrados nesta execucao.")
+        lines.append("# TYPE iot_events_total counter")
+        lines.append(f"iot_events_total {events_version}")
+        return "\n".join(lines) + "\n"
+
+    def dump_json(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"ts": time.time(), "ligado": self.enabled, "etapas": self.snapshot()}, f, indent=1)
+        os.replace(tmp, path)
+
+metrics = StageTimers()
+
+def start_metrics_server(port=METRICS_PORT):
+    """Endpoint Prometheus so em localhost, numa thread daemon. Devolve o servidor (ou None)."""
+    if not port:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    except OSError as ex:
+        print(f"Aviso: metricas Prometheus desligadas (porta {port}):", ex)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metricas", daemon=True).start()
+    print(f"Metricas em http://127.0.0.1:{port}/metrics (tecla 'm' liga/desliga)")
+    return server
 
 # ===================== CSV (DATA + HORA) =====================
 def ensure_csv_header():
@@ -55,14 +205,174 @@ def ensure_csv_header():
     if need_header:
         with open(CSV_PATH, "a", newline="", encoding="utf-8") as f:
             w = csv.writer(f)
-            w.writerow(["data", "hora", "id", "status", "primeira_vez", "ocorrencia"])
+            w.writerow(["data", "hora", "id", "status", "primeira_vez", "ocorrencia", "origem",
+                        "tipo", "duracao_s", "amostras"])
+
+def event_row(e):
+    row = [e["data"], e["hora"], e["id"],
+           e["status"], "sim" if e["primeira_vez"] else "nao", e["n"]]
+    # colunas opcionais (linhas antigas tem 6): 7a camera que viu o evento; 8a-10a sessao
+    # de presenca (entrada/mudanca/saida, com duracao e amostras so na saida)
+    if e.get("origem") or e.get("tipo"):
+        row.append(e.get("origem", ""))
+    if e.get("tipo"):
+        dur, amostras = e.get("duracao_s"), e.get("amostras")
+        row += [e["tipo"], "" if dur is None else f"{dur:.1f}", "" if amostras is None else amostras]
+    return row
+
+CSV_BATCH_MAX = 64              # grava quando o lote chega a este tamanho...
+CSV_FLUSH_S = 0.5               # ...ou quando o evento mais antigo do lote tem essa idade
+CSV_DURABILITY = "flush"        # por lote: "none" (buffer do SO), "flush" ou "fsync"
+
+class EventSink:
+    """Fila em memoria + thread escritora: o loop de reconhecimento nunca espera o disco."""
+    _STOP = object()
+
+    def __init__(self, path=CSV_PATH, batch_max=CSV_BATCH_MAX, flush_s=CSV_FLUSH_S,
+                 durability=CSV_DURABILITY, bin_path=EVENTS_BIN_PATH):
+        if durability not in ("none", "flush", "fsync"):
+            raise ValueError(f"durabilidade invalida: {durability}")
+        self.path = path
+        self.bin_path = bin_path
+        self.bin = None
+        self.batch_max = batch_max
+        self.flush_s = flush_s
+        self.durability = durability
+        self.q = queue.Queue()
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self.thread = threading.Thread(target=self._run, name="registro-csv", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def put(self, e):
+        self.q.put_nowait(e)
+
+    def depth(self):
+        return self.q.qsize()
+
+    def close(self, timeout=10.0):
+        """Drena tudo que ja foi enfileirado e fecha o arquivo."""
+        self.q.put(self._STOP)
+        self.thread.join(timeout)
+
+    def _write(self, f, w, batch):
+        # empacota antes de gravar qualquer arquivo: um lote que o .bin nao aceita (mais de
+        # 255 origens, erro no .ids) nao deixa o CSV com eventos que o .bin nao tem
+        blobs = None
+        if self.bin is not None:
+            try:
+                blobs = [self.bin.pack(e.get("ts", time.time()), e["id"], e["status"] == "Aprovado",
+                                       e["primeira_vez"], e["n"], e.get("origem", ""), e.get("tipo", ""),
+                                       e.get("duracao_s"), e.get("amostras")) for e in batch]
+            except Exception as ex:
+                self._bin_failed(ex)
+        try:
+            w.writerows(event_row(e) for e in batch)
+            if self.durability != "none":
+                f.flush()
+            if self.durability == "fsync":
+                os.fsync(f.fileno())
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as ex:
+            self.errors += 1
+            print("Falha ao salvar registro.csv:", ex)
+        if blobs is not None and self.bin is not None:
+            try:
+                self.bin.write_records(blobs)
+                if self.durability != "none":
+                    self.bin.flush(fsync=self.durability == "fsync")
+            except Exception as ex:
+                self._bin_failed(ex)
+
+    def _bin_failed(self, ex):
+        # o log binario e secundario: sem ele o registro.csv continua. O .bin sai do caminho
+        # (visualizador e importador voltam ao CSV) e e refeito do CSV na proxima execucao
+        print(f"Falha no {self.bin_path}, seguindo so com o registro.csv:", ex)
+        if self.bin is not None:
+            try:
+                self.bin.close()
+            except OSError:
+                pass
+            self.bin = None
+        try:
+            os.replace(self.bin_path, self.bin_path + ".incompleto")
+        except OSError:
+            pass
+
+    def _run(self):
+        if self.bin_path:
+            try:
+                self.bin = EventLogWriter(self.bin_path)
+            except (OSError, ValueError) as ex:
+                self._bin_failed(ex)
+        try:
+            self._loop()
+        finally:
+            if self.bin is not None:
+                self.bin.close()
+
+    def _loop(self):
+        with open(self.path, "a", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            batch = []
+            deadline = 0.0
+            stopping = False
+            while not stopping:
+                timeout = max(0.0, deadline - time.monotonic()) if batch else None
+                try:
+                    item = self.q.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+                if item is self._STOP:
+                    stopping = True
+                elif item is not None:
+                    if not batch:
+                        deadline = time.monotonic() + self.flush_s
+                    batch.append(item)
+                if batch and (stopping or len(batch) >= self.batch_max or time.monotonic() >= deadline):
+                    self._write(f, w, batch)
+                    batch = []
+
+
+class OrderedSink:
+    """Frente de um EventSink que entrega os eventos em ordem de ts: segura cada evento ate
+    release(antes) garantir que nenhum mais antigo ainda pode chegar."""
+    def __init__(self, sink):
+        self.sink = sink
+        self.heap = []
+        self.seq = 0                # desempate estavel para o mesmo ts
+
+    def put(self, e):
+        heapq.heappush(self.heap, (e["ts"], self.seq, e))
+        self.seq += 1
+
+    def release(self, before):
+        while self.heap and self.heap[0][0] < before:
+            self.sink.put(heapq.heappop(self.heap)[2])
+
+    def depth(self):
+        return len(self.heap) + self.sink.depth()
+
+    def close(self, timeout=10.0):
+        self.release(float("inf"))
+        self.sink.close(timeout)
+
+
+event_sink = None               # EventSink ativo durante run_program
 
 def save_event_csv(e):
+    if event_sink is not None:
+        event_sink.put(e)
+        return
     try:
         with open(CSV_PATH, "a", newline="", encoding="utf-8") as f:
             w = csv.writer(f)
-            w.writerow([e["data"], e["hora"], e["id"],
-                        e["status"], "sim" if e["primeira_vez"] else "nao", e["n"]])
+            w.writerow(event_row(e))
     except Exception as ex:
         print("Falha ao salvar registro.csv:", ex)
 
@@ -76,7 +386,7 @@ def read_all_events_csv():
             if len(r) <= 1:
                 return []
             for row in r[1:]:
-                if len(row) == 6:
+                if len(row) >= 6:
                     rows.append(row)
                 elif len(row) == 5:
                     # legado (sem data)
@@ -85,20 +395,444 @@ def read_all_events_csv():
         print("Falha ao ler registro.csv:", ex)
     return rows
 
+LOG_TAIL_S = 0.5                # visualizador: intervalo para buscar linhas novas
+
+class CsvLogIndex:
+    """Indice de offsets de linha do registro.csv. E construido uma vez e depois so
+    estendido com o que foi anexado; o visualizador le do disco apenas a pagina visivel."""
+    CHUNK = 1 << 20
+
+    def __init__(self, path=CSV_PATH):
+        self.path = path
+        self._reset(None)
+
+    def _reset(self, ident):
+        self.ident = ident
+        self.starts = np.zeros(1024, np.int64)
+        self.ends = np.zeros(1024, np.int64)
+        self.n = 0
+        self.scanned = 0        # bytes indexados (sempre termina numa quebra de linha)
+
+    def __len__(self):
+        return self.n
+
+    def _append(self, starts, ends):
+        need = self.n + len(starts)
+        if need > len(self.starts):
+            cap = max(need, 2 * len(self.starts))
+            self.starts = np.resize(self.starts, cap)
+            self.ends = np.resize(self.ends, cap)
+        self.starts[self.n:need] = starts
+        self.ends[self.n:need] = ends
+        self.n = need
+
+    def refresh(self):
+        """Indexa linhas completas anexadas desde a ultima chamada. Devolve quantas entraram."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self._reset(None)
+            return 0
+        ident = (st.st_dev, st.st_ino)
+        if ident != self.ident or st.st_size < self.scanned:
+            # arquivo trocado ou truncado: reindexa do zero
+            self._reset(ident)
+        before = self.n
+        with open(self.path, "rb") as f:
+            f.seek(self.scanned)
+            while True:
+                buf = f.read(self.CHUNK)
+                if not buf:
+                    break
+                arr = np.frombuffer(buf, np.uint8)
+                nl = np.flatnonzero(arr == 10)
+                if len(nl) == 0:
+                    if len(buf) < self.CHUNK:
+                        break
+                    # linha maior que o bloco: volta e le um bloco maior
+                    self.CHUNK *= 2
+                    f.seek(self.scanned)
+                    continue
+                starts = np.concatenate(([0], nl[:-1] + 1))
+                ends = nl.copy()
+                # descarta \r final, linhas em branco e linhas com colunas de menos
+                cr = (ends > starts) & (arr[np.maximum(ends - 1, 0)] == 13)
+                ends[cr] -= 1
+                commas = np.add.reduceat((arr == 44).astype(np.int32), starts) if len(starts) else starts
+                commas = np.where(ends > starts, commas, 0)
+                keep = commas >= 4
+                if self.scanned == 0 and len(starts) and buf.lstrip(b"\xef\xbb\xbf").startswith(b"data,"):
+                    keep[0] = False  # cabecalho
+                self._append(starts[keep] + self.scanned, ends[keep] + self.scanned)
+                consumed = int(nl[-1]) + 1
+                self.scanned += consumed
+                if consumed < len(buf):
+                    f.seek(self.scanned)
+        return self.n - before
+
+    def rows(self, lo, hi):
+        """Linhas [lo, hi) na ordem do arquivo, lidas numa unica leitura contigua."""
+        lo, hi = max(0, lo), min(self.n, hi)
+        if lo >= hi:
+            return []
+        base = int(self.starts[lo])
+        with open(self.path, "rb") as f:
+            f.seek(base)
+            buf = f.read(int(self.ends[hi - 1]) - base)
+        lines = [buf[int(s) - base:int(e) - base].decode("utf-8", errors="replace")
+                 for s, e in zip(self.starts[lo:hi], self.ends[lo:hi])]
+        out = []
+        for row in csv.reader(lines):
+            if len(row) == 5:
+                # legado (sem data)
+                row = [""] + row
+            out.append(row)
+        return out
+
+    def recent(self, offset, count):
+        """Pagina na ordem do visualizador (mais recentes primeiro)."""
+        hi = self.n - offset
+        return self.rows(hi - count, hi)[::-1]
+
+_log_index = None
+
+def ensure_event_log():
+    # primeira vez com log binario: importa o historico do CSV para os dois ficarem iguais
+    if EVENTS_BIN_PATH and not os.path.exists(EVENTS_BIN_PATH) and os.path.exists(CSV_PATH):
+        n = csv_to_bin(CSV_PATH, EVENTS_BIN_PATH)
+        print(f"{EVENTS_BIN_PATH} criado a partir de {CSV_PATH}: {n} eventos")
+
+def get_log_index():
+    """Fonte paginada do visualizador: log binario (fatia por mmap) ou indice do CSV."""
+    global _log_index
+    path = EVENTS_BIN_PATH if EVENTS_BIN_PATH and os.path.exists(EVENTS_BIN_PATH) else CSV_PATH
+    if _log_index is None or _log_index.path != path:
+        _log_index = EventLogReader(path) if path == EVENTS_BIN_PATH else CsvLogIndex(path)
+    _log_index.refresh()
+    return _log_index
+
 # ===================== ROSTOS =====================
-def get_or_create_face_id(encoding, tol=0.5):
-    global next_face_number
-    if known_faces:
-        dists = face_recognition.face_distance(known_faces, encoding)
-        idx = int(np.argmin(dists))
-        if dists[idx] < tol:
-            return face_ids[idx], False
-    face_id = f"Rosto {next_face_number}"
-    next_face_number += 1
-    known_faces.append(encoding)
-    face_ids.append(face_id)
-    face_counts[face_id] = 0
-    return face_id, True
+ENC_DIM = 128                   # tamanho do encoding do face_recognition
+GALLERY_INITIAL_CAP = 64
+GALLERY_MATCHER = os.getenv("IOT_MATCHER", "exato")  # "exato" ou "ivf" (aproximado, galerias enormes)
+IVF_MIN_SIZE = 4096             # abaixo disso a busca exata ja e barata: o IVF so treina a partir daqui
+IVF_NPROBE = 8                  # listas visitadas por consulta (mais = recall maior e busca mais lenta)
+IVF_TRAIN_SAMPLE = 16384        # encodings usados no k-means
+IVF_KMEANS_ITERS = 10
+IVF_RETRAIN_GROWTH = 4.0        # refaz o k-means quando a galeria cresce esse fator desde o ultimo treino
+
+class ExactMatcher:
+    """Busca exata: distancia para todos os encodings da galeria num unico produto matricial."""
+    name = "exato"
+
+    def __init__(self, gallery):
+        self.gallery = gallery
+
+    def rebuild(self):
+        pass
+
+    def add(self, i):
+        pass
+
+    def nearest(self, q):
+        """Candidato mais proximo de cada consulta (indice na galeria; -1 = nenhum)."""
+        return self.gallery.distances(q).argmin(axis=1)
+
+class IVFMatcher(ExactMatcher):
+    """Busca aproximada (IVF): k-means divide a galeria em listas e cada consulta so compara
+    com as `nprobe` listas de centroide mais proximo. Cadastros novos entram direto na lista
+    do seu centroide; o k-means e refeito quando a galeria cresce IVF_RETRAIN_GROWTH vezes.
+    O retreino roda numa thread sobre uma copia da matriz (fora do state_lock): ate terminar,
+    o indice antigo (ou a busca exata) continua atendendo, e o novo e trocado no proximo uso.
+    Um rosto conhecido que cair numa lista nao visitada vira cadastro novo (falha de recall)."""
+    name = "ivf"
+
+    def __init__(self, gallery, nprobe=None, min_size=None, seed=0):
+        super().__init__(gallery)
+        # None: le os globais agora, nao no import (--nprobe so e aplicado pelo main)
+        self.nprobe = IVF_NPROBE if nprobe is None else nprobe
+        self.min_size = IVF_MIN_SIZE if min_size is None else min_size
+        self.rng = np.random.default_rng(seed)
+        self.centroids = None       # None = ainda pequena: busca exata
+        self.csq = None
+        self.lists = []             # por centroide: indices na galeria (array com folga)
+        self.lens = None
+        self.trained_at = 0
+        self.train_s = 0.0
+        self.training = None        # thread do retreino em andamento
+        self.pending = None         # indice pronto, esperando a troca
+
+    def _nearest_centroid(self, x, c, csq):
+        out = np.empty(len(x), np.int64)
+        for a in range(0, len(x), 8192):
+            # |x|^2 e o mesmo para todos os centroides: nao muda o argmin
+            out[a:a + 8192] = (csq[None, :] - 2.0 * (x[a:a + 8192] @ c.T)).argmin(axis=1)
+        return out
+
+    def _train(self, x):
+        n = len(x)
+        k = int(np.clip(2 * np.sqrt(n), 16, 4096))
+        pick = np.sort(self.rng.choice(n, min(n, IVF_TRAIN_SAMPLE), replace=False))
+        x = np.asarray(x[pick], np.float32)
+        c = x[self.rng.choice(len(x), k, replace=False)].copy()
+        for _ in range(IVF_KMEANS_ITERS):
+            a = self._nearest_centroid(x, c, (c * c).sum(axis=1))
+            cnt = np.bincount(a, minlength=k)
+            nz = np.flatnonzero(cnt)
+            starts = np.concatenate(([0], np.cumsum(cnt[nz])[:-1]))
+            c[nz] = np.add.reduceat(x[np.argsort(a, kind="stable")], starts, axis=0) / cnt[nz, None]
+            empty = np.flatnonzero(cnt == 0)
+            if len(empty):
+                c[empty] = x[self.rng.choice(len(x), len(empty), replace=False)]  # re-semeia
+        return c, (c * c).sum(axis=1)
+
+    def _build(self, x):
+        """Indice completo para as linhas de x; nao toca no estado do matcher."""
+        t0 = time.perf_counter()
+        c, csq = self._train(x)
+        assign = self._nearest_centroid(np.asarray(x, np.float32), c, csq)
+        order = np.argsort(assign, kind="stable")
+        lens = np.bincount(assign, minlength=len(c)).astype(np.int64)
+        lists = []
+        pos = 0
+        for k in lens:
+            arr = np.empty(max(16, 2 * int(k)), np.int64)
+            arr[:k] = order[pos:pos + k]
+            pos += k
+            lists.append(arr)
+        return c, csq, lists, lens, len(x), time.perf_counter() - t0
+
+    def _install(self, built):
+        self.centroids, self.csq, self.lists, self.lens, self.trained_at, self.train_s = built
+        # cadastros feitos durante o treino ainda nao estao nas listas novas
+        for i in range(self.trained_at, self.gallery.size):
+            self._insert(i)
+
+    def _poll(self):
+        if self.pending is not None:
+            built, self.pending = self.pending, None
+            self.training = None
+            self._install(built)
+            # a galeria pode ter crescido o bastante durante o treino para pedir outro
+            if self.gallery.size >= self.trained_at * IVF_RETRAIN_GROWTH:
+                self._retrain()
+
+    def _retrain(self):
+        if self.training is not None and self.training.is_alive():
+            return
+        n = self.gallery.size
+        # copia: a galeria pode crescer (e trocar de matriz) enquanto o k-means roda
+        x = np.array(self.gallery.enc[:n], np.float32)
+
+        def work():
+            self.pending = self._build(x)
+
+        self.training = threading.Thread(target=work, name="ivf-treino", daemon=True)
+        self.training.start()
+
+    def wait(self):
+        """Espera os retreinos pendentes e ja troca o indice (benchmark)."""
+        while self.training is not None:
+            self.training.join()
+            if self.pending is None:    # o treino falhou: fica o indice atual
+                self.training = None
+            self._poll()
+
+    def rebuild(self):
+        n = self.gallery.size
+        self.centroids = None
+        if n >= self.min_size:
+            self._install(self._build(self.gallery.enc[:n]))
+
+    def _insert(self, i):
+        e = self.gallery.enc[i]
+        c = int((self.csq - 2.0 * (self.centroids @ e)).argmin())
+        lst, k = self.lists[c], int(self.lens[c])
+        if k == len(lst):
+            lst = self.lists[c] = np.resize(lst, 2 * k)
+        lst[k] = i
+        self.lens[c] = k + 1
+
+    def add(self, i):
+        self._poll()
+        n = self.gallery.size
+        if self.centroids is None:
+            if n >= self.min_size:
+                self._retrain()
+            return
+        if n >= self.trained_at * IVF_RETRAIN_GROWTH:
+            self._retrain()
+        self._insert(i)
+
+    def nearest(self, q):
+        self._poll()
+        if self.centroids is None:
+            return super().nearest(q)
+        g = self.gallery
+        dc = self.csq[None, :] - 2.0 * (q @ self.centroids.T)
+        if self.nprobe < len(self.centroids):
+            probe = np.argpartition(dc, self.nprobe - 1, axis=1)[:, :self.nprobe]
+        else:
+            probe = np.broadcast_to(np.arange(len(self.centroids)), dc.shape)
+        out = np.full(len(q), -1, np.int64)
+        for r in range(len(q)):
+            cand = np.concatenate([self.lists[p][:self.lens[p]] for p in probe[r]])
+            if len(cand):
+                out[r] = cand[(g.sqnorm[cand] - 2.0 * (g.enc[cand] @ q[r])).argmin()]
+        return out
+
+MATCHERS = {"exato": ExactMatcher, "ivf": IVFMatcher}
+
+class FaceGallery:
+    """Galeria de rostos: encodings numa matriz float32 contigua pre-alocada (cresce x2),
+    com numero do rosto e contagem de aparicoes em arrays paralelos.
+    Com path, os arrays sao arquivos .npy mapeados em memoria (sobrevive a reinicios).
+    A busca do vizinho mais proximo e do `matcher` (MATCHERS: exato ou ivf)."""
+    FILES = (("encodings", np.float32), ("numeros", np.int32), ("contagens", np.int64))
+
+    def __init__(self, capacity=GALLERY_INITIAL_CAP, path=None, matcher=None):
+        self.path = path
+        self.size = 0
+        self.next_number = 1
+        self.enc = np.zeros((0, ENC_DIM), np.float32)
+        self.sqnorm = np.zeros(0, np.float32)
+        self.numbers = np.zeros(0, np.int32)
+        self.counts = np.zeros(0, np.int64)
+        if path is not None and os.path.exists(self._file("numeros")):
+            self._load()
+        else:
+            self._grow(max(1, capacity))
+        self.matcher = MATCHERS[matcher or GALLERY_MATCHER](self)
+        self.matcher.rebuild()
+
+    def __len__(self):
+        return self.size
+
+    def _file(self, name, suffix=""):
+        return os.path.join(self.path, f"{name}.npy{suffix}")
+
+    def _new_arrays(self, capacity, suffix=""):
+        if self.path is not None:
+            os.makedirs(self.path, exist_ok=True)
+        out = []
+        for name, dtype in self.FILES:
+            shape = (capacity, ENC_DIM) if name == "encodings" else (capacity,)
+            if self.path is None:
+                out.append(np.zeros(shape, dtype))
+            else:
+                # arquivo esparso ja no tamanho final; linhas vazias ficam com numero 0
+                out.append(np.lib.format.open_memmap(self._file(name, suffix), mode="w+",
+                                                     dtype=dtype, shape=shape))
+        return out
+
+    def _load(self):
+        self.enc, self.numbers, self.counts = (
+            np.lib.format.open_memmap(self._file(name), mode="r+") for name, _ in self.FILES)
+        # o numero e gravado por ultimo: a primeira linha com numero 0 marca o fim
+        empty = np.flatnonzero(self.numbers == 0)
+        self.size = int(empty[0]) if len(empty) else len(self.numbers)
+        self.sqnorm = np.zeros(len(self.enc), np.float32)
+        self.sqnorm[:self.size] = np.einsum("ij,ij->i", self.enc[:self.size], self.enc[:self.size])
+        self.next_number = int(self.numbers[:self.size].max()) + 1 if self.size else 1
+
+    def _grow(self, capacity):
+        n = self.size
+        suffix = ".tmp" if self.path is not None else ""
+        enc, numbers, counts = self._new_arrays(capacity, suffix)
+        enc[:n] = self.enc[:n]
+        numbers[:n] = self.numbers[:n]
+        counts[:n] = self.counts[:n]
+        sqnorm = np.zeros(capacity, np.float32)
+        sqnorm[:n] = self.sqnorm[:n]
+        self.sqnorm = sqnorm
+        if self.path is None:
+            self.enc, self.numbers, self.counts = enc, numbers, counts
+            return
+        # troca atomica dos arquivos (mapas antigos liberados antes do replace)
+        for a in (enc, numbers, counts):
+            a.flush()
+        del enc, numbers, counts
+        self.enc = self.numbers = self.counts = None
+        for name, _ in self.FILES:
+            os.replace(self._file(name, suffix), self._file(name))
+        self.enc, self.numbers, self.counts = (
+            np.lib.format.open_memmap(self._file(name), mode="r+") for name, _ in self.FILES)
+
+    def flush(self):
+        if self.path is not None:
+            for a in (self.enc, self.numbers, self.counts):
+                a.flush()
+
+    def label(self, idx):
+        return f"Rosto {int(self.numbers[idx])}"
+
+    def add(self, encoding):
+        if self.size == len(self.enc):
+            self._grow(2 * len(self.enc))
+        i = self.size
+        e = np.asarray(encoding, np.float32)
+        self.enc[i] = e
+        self.sqnorm[i] = float(e @ e)
+        self.counts[i] = 0
+        self.numbers[i] = self.next_number
+        self.next_number += 1
+        self.size += 1
+        self.matcher.add(i)
+        if self.path is not None:
+            # cadastro incremental: so as paginas sujas desta linha vao pro disco
+            self.flush()
+        return i
+
+    def distances(self, encodings, start=0):
+        """Distancias euclidianas (m, n) de todos os encodings contra a galeria, num unico produto matricial."""
+        q = np.asarray(encodings, np.float32).reshape(-1, ENC_DIM)
+        g = self.enc[start:self.size]
+        d2 = (q * q).sum(axis=1)[:, None] + self.sqnorm[start:self.size][None, :] - 2.0 * (q @ g.T)
+        np.maximum(d2, 0.0, out=d2)
+        return np.sqrt(d2)
+
+    def match(self, encodings, tol=0.5, start=0):
+        """Vizinho mais proximo de cada encoding: (idx, dist), com idx = -1 quando dist >= tol."""
+        q = np.asarray(encodings, np.float32).reshape(-1, ENC_DIM)
+        m = len(q)
+        if self.size <= start or m == 0:
+            return np.full(m, -1, np.int64), np.full(m, np.inf)
+        if start == 0:
+            idx = self.matcher.nearest(q)
+        else:
+            # so os cadastrados neste frame: poucos, sempre busca exata
+            idx = self.distances(q, start).argmin(axis=1) + start
+        # distancia exata (float64) so para o candidato, igual ao face_distance
+        found = idx >= 0
+        best = np.full(m, np.inf)
+        best[found] = np.linalg.norm(self.enc[idx[found]].astype(np.float64) - q[found].astype(np.float64), axis=1)
+        idx = np.where(best < tol, idx, -1)
+        return idx, best
+
+    def match_or_enroll(self, encodings, tol=0.5):
+        """Resolve todos os encodings de um frame de uma vez. Devolve [(idx, primeira_vez), ...]."""
+        if len(encodings) == 0:
+            return []
+        idx, _ = self.match(encodings, tol)
+        start = self.size
+        out = []
+        for i, enc in enumerate(encodings):
+            j = int(idx[i])
+            new = False
+            if j < 0 and self.size > start:
+                # pode ser um rosto cadastrado agora ha pouco neste mesmo frame
+                j = int(self.match([enc], tol, start=start)[0][0])
+            if j < 0:
+                j = self.add(enc)
+                new = True
+            out.append((j, new))
+        return out
+
+gallery = FaceGallery()
+
+def get_or_create_face_id(encoding, tol=None):
+    (idx, primeira_vez), = gallery.match_or_enroll([encoding], MATCH_TOL if tol is None else tol)
+    return gallery.label(idx), primeira_vez
 
 # ===================== UTILS GRAFICOS =====================
 def draw_dot(img, center, color, r=6):
@@ -133,76 +867,183 @@ def rounded_box(img, rect, radius, fill, border=None, shadow=False):
         cv2.ellipse(img, (x2-r, y2-r), (r, r), 0, 0, 90, border, 1)
 
 # ===================== DASHBOARD (colunas com espaco maior p/ data+hora) =====================
+# ---- colunas COM MAIS ESPACO ----
+DASH_CARD = (20, 70, DASH_W - 20, 166)      # card "Autorizado"
+DASH_Y0 = 238                               # cabecalho da tabela
+DASH_METRICS = (380, 76, DASH_W - 32, 160)  # painel de tempos por etapa (metade direita do card)
+DASH_SOURCES = (400, 8, DASH_W - 20, 64)    # vazao por camera (direita do cabecalho)
+DASH_SOURCES_S = 1.0
+DASH_ROW_H = 26
+DASH_X_DATA = 20
+DASH_X_HORA = 160    # antes 110 -> agora 160 (mais espaco pra data)
+DASH_X_ROST = 240
+DASH_X_STAT = 360
+DASH_X_OCC  = 500
+DASH_X_PV   = 620
+
+class DashboardRenderer:
+    """Dashboard em camadas: o fundo estatico e renderizado uma vez; o card do autorizado
+    e a tabela so sao redesenhados (na propria regiao) quando mudam."""
+    def __init__(self):
+        self.static = self._render_static()
+        self.frame = self.static.copy()
+        self.events_version = -1
+        self.auth = None
+        self._auth_key = None
+        self._auth_cached = ("nenhum", (120, 120, 120))
+        self._metrics_on = False
+        self._metrics_t = 0.0
+        self._sources_t = 0.0
+
+    def _render_static(self):
+        dash = np.full((DASH_H, DASH_W, 3), (28, 28, 34), dtype=np.uint8)
+        draw_header(dash, "Dashboard de Acesso", "ESC para sair")
+
+        # card: autorizado
+        rounded_box(dash, DASH_CARD, 12, COL_CARD, COL_BORDER, shadow=True)
+        cv2.putText(dash, "Autorizado:", (DASH_CARD[0] + 44, DASH_CARD[1] + 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.65, COL_MUTED, 2)
+
+        cv2.line(dash, (20, 185), (DASH_W - 20, 185), COL_DIV, 1)
+        cv2.putText(dash, "Ultimos eventos", (20, 210),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.75, COL_TEXT, 2)
+
+        y0 = DASH_Y0
+        cv2.putText(dash, "Data", (DASH_X_DATA, y0),  cv2.FONT_HERSHEY_SIMPLEX, 0.55, COL_MUTED, 1)
+        cv2.putText(dash, "Hora", (DASH_X_HORA, y0),  cv2.FONT_HERSHEY_SIMPLEX, 0.55, COL_MUTED, 1)
+        cv2.putText(dash, "Rosto", (DASH_X_ROST, y0), cv2.FONT_HERSHEY_SIMPLEX, 0.55, COL_MUTED, 1)
+        cv2.putText(dash, "Status", (DASH_X_STAT, y0), cv2.FONT_HERSHEY_SIMPLEX, 0.55, COL_MUTED, 1)
+        cv2.putText(dash, "Ocorrencia", (DASH_X_OCC, y0), cv2.FONT_HERSHEY_SIMPLEX, 0.55, COL_MUTED, 1)
+        cv2.putText(dash, "1a vez", (DASH_X_PV, y0), cv2.FONT_HERSHEY_SIMPLEX, 0.55, COL_MUTED, 1)
+        return dash
+
+    def _restore(self, y1, y2, x1=0, x2=DASH_W):
+        self.frame[y1:y2, x1:x2] = self.static[y1:y2, x1:x2]
+
+    def resolve_auth(self, rosto_autorizado):
+        # a busca na galeria so e refeita quando o rosto autorizado ou a galeria mudam
+        key = (id(rosto_autorizado), len(gallery))
+        if key != self._auth_key:
+            self._auth_key = key
+            self._auth_cached = ("nenhum", (120, 120, 120))
+            if rosto_autorizado is not None:
+                with state_lock:
+                    idx = int(gallery.match([rosto_autorizado], tol=MATCH_TOL)[0][0])
+                    if idx >= 0:
+                        self._auth_cached = (gallery.label(idx), COL_OK)
+        return self._auth_cached
+
+    def _draw_auth(self, auth):
+        auth_id, color_dot = auth
+        x1, y1, x2, y2 = DASH_CARD
+        self._restore(y1 + 36, y2 - 6, x1 + 12, DASH_METRICS[0] - 4)
+        draw_dot(self.frame, (x1 + 24, y1 + 50), color_dot, r=9)
+        cv2.putText(self.frame, f"{auth_id}", (x1 + 44, y1 + 68),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.0, COL_TEXT, 2)
+
+    def _draw_rows(self, recent):
+        self._restore(DASH_Y0 + 8, DASH_H)
+        dash = self.frame
+        y = DASH_Y0 + 26
+        for e in recent:
+            cv2.line(dash, (20, y+7), (DASH_W - 20, y+7), (40, 40, 46), 1)
+            cv2.putText(dash, e["data"], (DASH_X_DATA, y),  cv2.FONT_HERSHEY_SIMPLEX, 0.58, COL_TEXT, 1)
+            cv2.putText(dash, e["hora"], (DASH_X_HORA, y),  cv2.FONT_HERSHEY_SIMPLEX, 0.58, COL_TEXT, 1)
+            cv2.putText(dash, e["id"],   (DASH_X_ROST, y),  cv2.FONT_HERSHEY_SIMPLEX, 0.58, COL_TEXT, 1)
+            col = COL_OK if e["status"] == "Aprovado" else COL_BAD
+            draw_dot(dash, (DASH_X_STAT-5, y-6), col, r=5)
+            cv2.putText(dash, e["status"], (DASH_X_STAT+10, y), cv2.FONT_HERSHEY_SIMPLEX, 0.58, COL_TEXT, 1)
+            if e.get("tipo"):
+                # sessao: ocorrencia + tipo (e a duracao na saida), em fonte menor
+                txt = f"#{e['n']} {e['tipo']}"
+                if e.get("duracao_s") is not None:
+                    txt += f" {e['duracao_s']:.0f}s"
+                cv2.putText(dash, txt, (DASH_X_OCC, y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, COL_TEXT, 1)
+            else:
+                cv2.putText(dash, f"#{e['n']}", (DASH_X_OCC, y), cv2.FONT_HERSHEY_SIMPLEX, 0.58, COL_TEXT, 1)
+            cv2.putText(dash, "sim" if e["primeira_vez"] else "nao", (DASH_X_PV, y),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.58, COL_TEXT, 1)
+            y += DASH_ROW_H
+
+    def _draw_metrics(self, snap):
+        x1, y1, x2, y2 = DASH_METRICS
+        self._restore(y1, y2, x1, x2)
+        if snap is None:
+            return
+        cv2.putText(self.frame, "ms p50/p95/p99", (x1, y1 + 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.36, COL_MUTED, 1)
+        col_w = (x2 - x1) // 2
+        for i, stage in enumerate(METRICS_STAGES):
+            m = snap.get(stage)
+            txt = f"{stage} " + (f"{m['p50_ms']:.1f}/{m['p95_ms']:.1f}/{m['p99_ms']:.1f}" if m else "-")
+            x = x1 + (i // 5) * col_w
+            y = y1 + 26 + (i % 5) * 14
+            cv2.putText(self.frame, txt, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.36, COL_TEXT, 1)
+
+    def _draw_sources(self, feeds, now):
+        x1, y1, x2, y2 = DASH_SOURCES
+        self._restore(y1, y2, x1, x2)
+        counts = access_resolver.events if access_resolver is not None else {}
+        for i, feed in enumerate(feeds[:3]):
+            feed.update_rates(now)
+            txt = (f"{feed.name}: {feed.fps:.0f} fps, {feed.det_s:.1f} det/s,"
+                   f" {counts.get(feed.name, 0)} ev" + (" (fim)" if feed.finished() else ""))
+            cv2.putText(self.frame, txt, (x1, y1 + 14 + i * 17),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.42, COL_MUTED, 1)
+        if len(feeds) > 3:
+            cv2.putText(self.frame, f"+{len(feeds) - 3}", (x2 - 24, y2 - 4),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.42, COL_MUTED, 1)
+
+    def render(self, rosto_autorizado):
+        """Atualiza so as regioes sujas. Devolve (imagem, mudou)."""
+        changed = False
+        now = time.monotonic()
+        if source_feeds and now - self._sources_t >= DASH_SOURCES_S:
+            self._draw_sources(source_feeds, time.time())
+            self._sources_t = now
+            changed = True
+        on = metrics.enabled
+        if on != self._metrics_on or (on and time.monotonic() - self._metrics_t >= METRICS_OVERLAY_S):
+            self._draw_metrics(metrics.snapshot() if on else None)
+            self._metrics_on, self._metrics_t = on, time.monotonic()
+            changed = True
+        auth = self.resolve_auth(rosto_autorizado)
+        if auth != self.auth:
+            self._draw_auth(auth)
+            self.auth = auth
+            changed = True
+        if events_version != self.events_version:
+            with state_lock:
+                version, recent = events_version, list(events)[:12]
+            self._draw_rows(recent)
+            self.events_version = version
+            changed = True
+        return self.frame, changed
+
+dashboard = None                # DashboardRenderer da janela aberta
+
 def draw_dashboard(rosto_autorizado):
-    dash = np.full((DASH_H, DASH_W, 3), (28, 28, 34), dtype=np.uint8)
-
-    draw_header(dash, "Dashboard de Acesso", "ESC para sair")
-
-    # card: autorizado
-    card_x, card_y, card_w, card_h = 20, 70, DASH_W - 40, 96
-    rounded_box(dash, (card_x, card_y, card_x+card_w, card_y+card_h),
-                12, COL_CARD, COL_BORDER, shadow=True)
-
-    auth_id = "nenhum"
-    color_dot = (120, 120, 120)
-    if rosto_autorizado is not None and len(known_faces) > 0:
-        dists = face_recognition.face_distance(known_faces, rosto_autorizado)
-        idx = int(np.argmin(dists))
-        if dists[idx] < 0.5:
-            auth_id = face_ids[idx]
-            color_dot = COL_OK
-
-    draw_dot(dash, (card_x + 24, card_y + 50), color_dot, r=9)
-    cv2.putText(dash, "Autorizado:", (card_x + 44, card_y + 30),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.65, COL_MUTED, 2)
-    cv2.putText(dash, f"{auth_id}", (card_x + 44, card_y + 68),
-                cv2.FONT_HERSHEY_SIMPLEX, 1.0, COL_TEXT, 2)
-
-    cv2.line(dash, (20, 185), (DASH_W - 20, 185), COL_DIV, 1)
-    cv2.putText(dash, "Ultimos eventos", (20, 210),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.75, COL_TEXT, 2)
-
-    # ---- colunas COM MAIS ESPACO ----
-    y0 = 238
-    X_DATA = 20
-    X_HORA = 160    # antes 110 -> agora 160 (mais espaco pra data)
-    X_ROST = 240
-    X_STAT = 360
-    X_OCC  = 500
-    X_PV   = 620
-
-    cv2.putText(dash, "Data", (X_DATA, y0),  cv2.FONT_HERSHEY_SIMPLEX, 0.55, COL_MUTED, 1)
-    cv2.putText(dash, "Hora", (X_HORA, y0),  cv2.FONT_HERSHEY_SIMPLEX, 0.55, COL_MUTED, 1)
-    cv2.putText(dash, "Rosto", (X_ROST, y0), cv2.FONT_HERSHEY_SIMPLEX, 0.55, COL_MUTED, 1)
-    cv2.putText(dash, "Status", (X_STAT, y0), cv2.FONT_HERSHEY_SIMPLEX, 0.55, COL_MUTED, 1)
-    cv2.putText(dash, "Ocorrencia", (X_OCC, y0), cv2.FONT_HERSHEY_SIMPLEX, 0.55, COL_MUTED, 1)
-    cv2.putText(dash, "1a vez", (X_PV, y0), cv2.FONT_HERSHEY_SIMPLEX, 0.55, COL_MUTED, 1)
-
-    y = y0 + 26
-    row_h = 26
-    for e in list(events)[:12]:
-        cv2.line(dash, (20, y+7), (DASH_W - 20, y+7), (40, 40, 46), 1)
-        cv2.putText(dash, e["data"], (X_DATA, y),  cv2.FONT_HERSHEY_SIMPLEX, 0.58, COL_TEXT, 1)
-        cv2.putText(dash, e["hora"], (X_HORA, y),  cv2.FONT_HERSHEY_SIMPLEX, 0.58, COL_TEXT, 1)
-        cv2.putText(dash, e["id"],   (X_ROST, y),  cv2.FONT_HERSHEY_SIMPLEX, 0.58, COL_TEXT, 1)
-        col = COL_OK if e["status"] == "Aprovado" else COL_BAD
-        draw_dot(dash, (X_STAT-5, y-6), col, r=5)
-        cv2.putText(dash, e["status"], (X_STAT+10, y), cv2.FONT_HERSHEY_SIMPLEX, 0.58, COL_TEXT, 1)
-        cv2.putText(dash, f"#{e['n']}", (X_OCC, y), cv2.FONT_HERSHEY_SIMPLEX, 0.58, COL_TEXT, 1)
-        cv2.putText(dash, "sim" if e["primeira_vez"] else "nao", (X_PV, y),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.58, COL_TEXT, 1)
-        y += row_h
-
-    cv2.imshow("Dashboard", dash)
+    global dashboard
+    if dashboard is None:
+        dashboard = DashboardRenderer()
+    img, changed = dashboard.render(rosto_autorizado)
+    if changed:
+        # sem mudanca a janela continua mostrando a ultima imagem
+        cv2.imshow("Dashboard", img)
 
 # ===================== MENU =====================
 menu_selection = {"choice": None, "mx": -1, "my": -1}
 hover_anim = {"view": 0.0, "start": 0.0}
 _last_t = time.time()
 
-# botoes (pos calculada em tempo de desenho)
-BTN_VIEW  = (0, 0, 0, 0)
-BTN_START = (0, 0, 0, 0)
+# botoes (posicao fixa, calculada uma vez)
+_BW, _BH, _GAP, _YB = 460, 84, 36, 300
+BTN_VIEW  = (MENU_W // 2 - _BW - _GAP // 2, _YB, MENU_W // 2 - _GAP // 2, _YB + _BH)
+BTN_START = (MENU_W // 2 + _GAP // 2,       _YB, MENU_W // 2 + _BW + _GAP // 2, _YB + _BH)
+CLOCK_RECT = (MENU_W - 24 - 240, 22, MENU_W - 24, 22 + 90)
+
+MENU_ACTIVE_WAIT_MS = 16        # animando (hover/pulso)
+MENU_IDLE_WAIT_MS = 120         # nada mudando: so o relogio, ~8 Hz de checagem
 
 def on_menu_mouse(event, x, y, flags, param):
     menu_selection["mx"], menu_selection["my"] = x, y
@@ -225,24 +1066,51 @@ def soft_background(w, h):
     mix = (bg.astype(np.float32) * (1 - alpha[..., None]) + overlay * alpha[..., None])
     return mix.astype(np.uint8)
 
-def draw_button(img, rect, label, hovered=False, pressed=False, key="view", t=0.0):
-    global hover_anim, _last_t
+def render_menu_static():
+    """Tudo que nao muda entre quadros: vinheta, titulos, rodape, sombras dos botoes e moldura do relogio."""
+    ui = soft_background(MENU_W, MENU_H)
+    title = "Controle de Acesso - Menu"
+    subt  = "Selecione uma opcao para continuar"
+    cv2.putText(ui, title, (80, 120), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0,0,0), 5)
+    cv2.putText(ui, title, (80, 120), cv2.FONT_HERSHEY_SIMPLEX, 1.2, COL_TEXT, 3)
+    cv2.putText(ui, subt,  (80, 156), cv2.FONT_HERSHEY_SIMPLEX, 0.65, (0,0,0), 3)
+    cv2.putText(ui, subt,  (80, 156), cv2.FONT_HERSHEY_SIMPLEX, 0.65, COL_HINT, 1)
+
+    for rect in (BTN_VIEW, BTN_START):
+        rounded_box(ui, rect, 18, COL_BTN_BASE, COL_BTN_BORDER, shadow=True)
+
+    cv2.rectangle(ui, (0, MENU_H-46), (MENU_W, MENU_H), COL_FOOT, -1)
+    msg = "Atalhos: V = ver registro, I = iniciar, ESC = sair"
+    cv2.putText(ui, msg, (80, MENU_H-16), cv2.FONT_HERSHEY_SIMPLEX, 0.58, (210,212,220), 1)
+
+    x1, y1, x2, y2 = CLOCK_RECT
+    rounded_box(ui, CLOCK_RECT, 14, COL_CLOCK_FILL, COL_CLOCK_BORDER, shadow=True)
+    cv2.putText(ui, "Relogio", (x1+16, y1+24), cv2.FONT_HERSHEY_SIMPLEX, 0.55, COL_HINT, 1)
+    return ui
+
+def step_hover(key, hovered, t):
     target = 1.0 if hovered else 0.0
     dt = max(0.0001, t - _last_t)
     hover_anim[key] = np.clip(hover_anim[key] + (target - hover_anim[key]) * min(1.0, 8.0 * dt), 0.0, 1.0)
+    # ainda animando: transicao em curso ou pulso do brilho
+    return abs(target - hover_anim[key]) > 0.01 or hover_anim[key] > 0.02
+
+def draw_button(img, rect, label, pressed=False, key="view", t=0.0):
+    # a sombra ja esta no fundo estatico; aqui so o corpo, o brilho e o texto
     def lerp(c1, c2, a): return tuple(int(c1[i] + (c2[i]-c1[i])*a) for i in range(3))
     fill = lerp(COL_BTN_BASE, COL_BTN_HOVER, hover_anim[key]*0.9)
     if pressed: fill = COL_BTN_PRESS
-    rounded_box(img, rect, 18, fill, COL_BTN_BORDER, shadow=True)
+    rounded_box(img, rect, 18, fill, COL_BTN_BORDER)
     if hover_anim[key] > 0.02 and not pressed:
         pulse = 0.5 + 0.5 * math.sin(2 * math.pi * (t % 1.0))
-        glow = np.zeros_like(img)
         x1, y1, x2, y2 = rect
         pad = 10
-        cv2.rectangle(glow, (x1-pad, y1-pad), (x2+pad, y2+pad),
-                      (120 + int(40*pulse), 130 + int(40*pulse), 160 + int(50*pulse)), -1)
+        # brilho mesclado so na regiao do botao (antes era um addWeighted do quadro inteiro)
+        roi = img[max(0, y1-pad):y2+pad, max(0, x1-pad):x2+pad]
+        glow = np.empty_like(roi)
+        glow[:] = (120 + int(40*pulse), 130 + int(40*pulse), 160 + int(50*pulse))
         alpha = 0.07 * hover_anim[key]
-        cv2.addWeighted(glow, alpha, img, 1 - alpha, 0, img)
+        cv2.addWeighted(glow, alpha, roi, 1 - alpha, 0, roi)
     (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.78, 2)
     x1, y1, x2, y2 = rect
     tx = x1 + (x2 - x1 - tw)//2
@@ -250,71 +1118,67 @@ def draw_button(img, rect, label, hovered=False, pressed=False, key="view", t=0.
     cv2.putText(img, label, (tx+1, ty+1), cv2.FONT_HERSHEY_SIMPLEX, 0.78, (0,0,0), 3)
     cv2.putText(img, label, (tx, ty),     cv2.FONT_HERSHEY_SIMPLEX, 0.78, COL_TEXT, 2)
 
-def draw_clock(img):
-    now  = time.strftime("%H:%M:%S")
-    date = time.strftime("%d/%m/%Y")
-    w, h = 240, 90
-    x2, y1 = MENU_W - 24, 22
-    x1, y2 = x2 - w, y1 + h
-    rounded_box(img, (x1, y1, x2, y2), 14, COL_CLOCK_FILL, COL_CLOCK_BORDER, shadow=True)
-    cv2.putText(img, "Relogio", (x1+16, y1+24), cv2.FONT_HERSHEY_SIMPLEX, 0.55, COL_HINT, 1)
+def draw_clock(img, now, date):
+    x1, y1, _, _ = CLOCK_RECT
     cv2.putText(img, now,       (x1+16, y1+54), cv2.FONT_HERSHEY_SIMPLEX, 0.95, COL_TEXT, 2)
     cv2.putText(img, date,      (x1+16, y1+80), cv2.FONT_HERSHEY_SIMPLEX, 0.6,  COL_HINT, 1)
 
+def render_menu_frame(static, t, hv_view, hv_start, now, date):
+    ui = static.copy()
+    draw_button(ui, BTN_VIEW,  "Ver registro anterior", False, "view",  t)
+    draw_button(ui, BTN_START, "Iniciar programa", False, "start", t)
+    draw_clock(ui, now, date)
+    return ui
+
 def show_menu():
-    global _last_t, BTN_VIEW, BTN_START
+    global _last_t
     cv2.namedWindow("Menu", cv2.WINDOW_NORMAL)
     cv2.resizeWindow("Menu", MENU_W, MENU_H)
     cv2.setMouseCallback("Menu", on_menu_mouse)
+    static = render_menu_static()
     _last_t = time.time()
-    while True:
+    last_key = None
+    frames = 0
+    t_start, cpu_start = time.time(), time.process_time()
+    choice = None
+    while choice is None:
         t = time.time()
-        ui = soft_background(MENU_W, MENU_H)
-        title = "Controle de Acesso - Menu"
-        subt  = "Selecione uma opcao para continuar"
-        cv2.putText(ui, title, (80, 120), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0,0,0), 5)
-        cv2.putText(ui, title, (80, 120), cv2.FONT_HERSHEY_SIMPLEX, 1.2, COL_TEXT, 3)
-        cv2.putText(ui, subt,  (80, 156), cv2.FONT_HERSHEY_SIMPLEX, 0.65, (0,0,0), 3)
-        cv2.putText(ui, subt,  (80, 156), cv2.FONT_HERSHEY_SIMPLEX, 0.65, COL_HINT, 1)
-
-        bw, bh, gap = 460, 84, 36
-        cx = MENU_W // 2
-        yb = 300
-        BTN_VIEW  = (cx - bw - gap//2, yb, cx - gap//2, yb + bh)
-        BTN_START = (cx + gap//2,       yb, cx + bw + gap//2, yb + bh)
-
         mx, my = menu_selection["mx"], menu_selection["my"]
         hv_view  = BTN_VIEW[0]  <= mx <= BTN_VIEW[2]  and BTN_VIEW[1]  <= my <= BTN_VIEW[3]
         hv_start = BTN_START[0] <= mx <= BTN_START[2] and BTN_START[1] <= my <= BTN_START[3]
-
-        draw_button(ui, BTN_VIEW,  "Ver registro anterior", hv_view,  False, "view",  t)
-        draw_button(ui, BTN_START, "Iniciar programa", hv_start, False, "start", t)
-
-        cv2.rectangle(ui, (0, MENU_H-46), (MENU_W, MENU_H), COL_FOOT, -1)
-        msg = "Atalhos: V = ver registro, I = iniciar, ESC = sair"
-        cv2.putText(ui, msg, (80, MENU_H-16), cv2.FONT_HERSHEY_SIMPLEX, 0.58, (210,212,220), 1)
-
-        draw_clock(ui)
-
-        cv2.imshow("Menu", ui)
-        k = cv2.waitKey(16) & 0xFF
+        animating = step_hover("view", hv_view, t)
+        animating = step_hover("start", hv_start, t) or animating
+        now, date = time.strftime("%H:%M:%S"), time.strftime("%d/%m/%Y")
+
+        # so redesenha quando algo visivel mudou
+        key = (hv_view, hv_start, now)
+        if animating or key != last_key:
+            cv2.imshow("Menu", render_menu_frame(static, t, hv_view, hv_start, now, date))
+            last_key = key
+            frames += 1
+
+        k = cv2.waitKey(MENU_ACTIVE_WAIT_MS if animating else MENU_IDLE_WAIT_MS) & 0xFF
         if menu_selection["choice"] in ("view", "start"):
-            c = menu_selection["choice"]
+            choice = menu_selection["choice"]
             menu_selection["choice"] = None
-            return c
-        if k == 27: return "quit"
-        if k in (ord('v'), ord('V')): return "view"
-        if k in (ord('i'), ord('I')): return "start"
+        elif k == 27: choice = "quit"
+        elif k in (ord('v'), ord('V')): choice = "view"
+        elif k in (ord('i'), ord('I')): choice = "start"
         _last_t = t
 
+    if metrics.enabled:         # custo do menu parado: so com a instrumentacao ligada
+        elapsed = max(1e-6, time.time() - t_start)
+        print(f"[menu] {frames} quadros em {elapsed:.1f} s,"
+              f" CPU media {100.0 * (time.process_time() - cpu_start) / elapsed:.1f}% de um nucleo")
+    return choice
+
 # ===================== REGISTRO ANTERIOR (scrollbar direita + colunas largas) =====================
 def show_previous_log():
     W, H = 1100, 700
     cv2.namedWindow("Registro Anterior", cv2.WINDOW_NORMAL)
     cv2.resizeWindow("Registro Anterior", W, H)
 
-    rows = read_all_events_csv()
-    rows_rev = rows[::-1]  # mais recentes primeiro
+    index = get_log_index()   # so offsets; as linhas sao lidas por pagina
 
     # layout da tabela (MAIS ESPACO PARA DATA E HORA)
     MARGIN_L = 20
@@ -343,13 +1207,13 @@ def show_previous_log():
     track_bottom = bottom
     track_h = track_bottom - track_top
 
-    max_off = max(0, len(rows_rev) - visible)
-    state = {"offset": 0, "drag": False}
+    state = {"offset": 0, "drag": False, "max_off": max(0, len(index) - visible)}
 
     def offset_from_y(mouse_y):
+        max_off = state["max_off"]
         if max_off == 0:
             return 0
-        thumb_h = max(28, int(track_h * (visible / max(1, len(rows_rev)))))
+        thumb_h = max(28, int(track_h * (visible / max(1, len(index)))))
         thumb_h = min(thumb_h, track_h)
         span = track_h - thumb_h
         if span <= 0:
@@ -369,8 +1233,23 @@ def show_previous_log():
 
     cv2.setMouseCallback("Registro Anterior", on_mouse)
 
+    page_key, page = None, []
+    last_tail = time.time()
     while True:
+        # acompanha linhas anexadas enquanto o visualizador esta aberto
+        if time.time() - last_tail >= LOG_TAIL_S:
+            last_tail = time.time()
+            added = index.refresh()
+            if added and state["offset"] > 0:
+                # mantem na tela as mesmas linhas (novas entram no topo)
+                state["offset"] += added
+            state["max_off"] = max(0, len(index) - visible)
+        max_off = state["max_off"]
         offset = int(np.clip(state["offset"], 0, max_off))
+        total = len(index)
+        if (offset, total) != page_key:
+            page_key = (offset, total)
+            page = index.recent(offset, visible)
 
         panel = np.full((H, W, 3), (28, 28, 34), dtype=np.uint8)
         draw_header(panel, "Registro Anterior", "ESC para voltar | setas/pgup/pgdn/home/end ou arraste a barra")
@@ -386,8 +1265,8 @@ def show_previous_log():
 
         # linhas visiveis
         y = top
-        end = min(len(rows_rev), offset + visible)
-        for row in rows_rev[offset:end]:
+        end = min(total, offset + visible)
+        for row in page:
             if len(row) >= 6:
                 data, hora, rid, status, pvez, occ = row[:6]
             else:
@@ -411,14 +1290,14 @@ def show_previous_log():
             y += ROW_H
 
         # paginacao
-        info = f"{offset+1}-{end} / {len(rows_rev)}"
+        info = f"{offset+1}-{end} / {total}"
         cv2.putText(panel, info, (W - 160 - SCROLL_W, H - 12), cv2.FONT_HERSHEY_SIMPLEX, 0.5, COL_MUTED, 1)
 
         # scrollbar direita
         cv2.rectangle(panel, (track_left, track_top), (track_right, track_bottom), (40,40,46), -1)
         cv2.rectangle(panel, (track_left, track_top), (track_right, track_bottom), (80,80,90), 1)
-        if len(rows_rev) > 0:
-            thumb_h = max(28, int(track_h * (visible / max(1, len(rows_rev)))))
+        if total > 0:
+            thumb_h = max(28, int(track_h * (visible / max(1, total))))
             thumb_h = min(thumb_h, track_h)
             span = track_h - thumb_h
             thumb_y = track_top if max_off == 0 else int(track_top + (offset / max_off) * span)
@@ -447,111 +1326,1398 @@ def show_previous_log():
 
     cv2.destroyWindow("Registro Anterior")
 
-# ===================== CORE DO PROGRAMA =====================
-def run_program():
-    import serial
-    ensure_csv_header()
-
-    rosto_autorizado = None
-    ultimo_envio = None
-    texto = ""
-    cor = (255, 255, 255)
-    last_check_time = 0.0
-
-    cv2.namedWindow("Reconhecimento Facial", cv2.WINDOW_AUTOSIZE)  # nao achata
-    cv2.namedWindow("Dashboard", cv2.WINDOW_NORMAL)
-    cv2.resizeWindow("Dashboard", DASH_W, DASH_H)
-
-    try:
-        arduino = serial.Serial(SERIAL_PORT, SERIAL_BAUD, timeout=1)
-        time.sleep(2)
-    except Exception as ex:
-        print("Aviso: nao foi possivel abrir a porta serial. Rodando sem Arduino. Erro:", ex)
-        arduino = None
-
-    cap = cv2.VideoCapture(VIDEO_SOURCE)
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Fim do video")
-            break
-
-        now = time.time()
-        if (now - last_check_time) >= CHECK_INTERVAL_S:
-            last_check_time = now
-
-            # processamento (nao afeta exibicao)
-            small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-            rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+# ===================== RASTREAMENTO (evita encodings repetidos) =====================
+DETECT_SCALE = 0.25             # reducao do frame antes da deteccao
+DETECT_UPSAMPLE = 1             # upsample inicial do face_locations
+TRACK_IOU_MIN = 0.3             # IoU minimo para considerar a mesma pessoa
+TRACK_MAX_MISSES = 2            # ticks sem deteccao antes de encerrar a trilha
+TRACK_REVERIFY_S = 5.0          # re-calcula o encoding da trilha de tempos em tempos
+
+def box_iou(a, b):
+    # caixas no formato do face_recognition: (top, right, bottom, left)
+    t, r = max(a[0], b[0]), min(a[1], b[1])
+    bt, l = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, r - l) * max(0, bt - t)
+    if inter == 0:
+        return 0.0
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    return inter / float(area_a + area_b - inter)
+
+class Track:
+    __slots__ = ("id", "box", "face_idx", "acesso", "verified_at", "misses")
+
+    def __init__(self, tid, box):
+        self.id = tid
+        self.box = box
+        self.face_idx = None      # indice na galeria (None = ainda sem identidade)
+        self.acesso = False
+        self.verified_at = 0.0
+        self.misses = 0
+
+class FaceTracker:
+    """Rastreamento por IoU entre ticks: a identidade segue a caixa e o encoding
+    so e calculado para trilhas novas ou que venceram o prazo de re-verificacao."""
+    def __init__(self, iou_min=TRACK_IOU_MIN, max_misses=TRACK_MAX_MISSES, reverify_s=TRACK_REVERIFY_S):
+        self.iou_min = iou_min
+        self.max_misses = max_misses
+        self.reverify_s = reverify_s
+        self.tracks = []
+        self.next_id = 1
+        self.encodings_done = 0
+        self.encodings_avoided = 0
+
+    def update(self, boxes, now):
+        """Associa as caixas do tick as trilhas. Devolve [(trilha, precisa_encoding), ...] na ordem das caixas."""
+        pairs = sorted(((box_iou(t.box, b), ti, bi)
+                        for ti, t in enumerate(self.tracks) for bi, b in enumerate(boxes)),
+                       reverse=True)
+        assigned = [None] * len(boxes)
+        used = set()
+        for iou, ti, bi in pairs:
+            if iou < self.iou_min:
+                break
+            if ti in used or assigned[bi] is not None:
+                continue
+            used.add(ti)
+            assigned[bi] = self.tracks[ti]
+
+        alive = []
+        for ti, t in enumerate(self.tracks):
+            if ti not in used:
+                t.misses += 1
+                if t.misses > self.max_misses:
+                    continue
+            alive.append(t)
+        self.tracks = alive
+
+        out = []
+        for bi, box in enumerate(boxes):
+            t = assigned[bi]
+            if t is None:
+                t = Track(self.next_id, box)
+                self.next_id += 1
+                self.tracks.append(t)
+            t.box = box
+            t.misses = 0
+            need = t.face_idx is None or (now - t.verified_at) >= self.reverify_s
+            out.append((t, need))
+        return out
+
+# ===================== GATE DE MOVIMENTO =====================
+GATE_INTERVAL_S = 0.1           # frequencia de checagem de movimento (barata)
+MOTION_SCALE = 0.125            # o gate olha um frame bem reduzido
+MOTION_PIXEL_DIFF = 18          # diferenca de cinza p/ pixel contar como movimento
+MOTION_MIN_FRAC = 0.004         # fracao minima de pixels em movimento
+MOTION_BG_ALPHA = 0.05          # velocidade de adaptacao do fundo
+MIN_CHECK_INTERVAL_S = 0.2      # deteccao mais rapida possivel quando ha movimento
+MAX_IDLE_S = 5.0                # deteccao forcada mesmo sem movimento (rede de seguranca)
+
+class MotionGate:
+    """Subtracao de fundo (media movel) sobre o frame reduzido: diz se vale rodar o detector."""
+    def __init__(self, scale=MOTION_SCALE, pixel_diff=MOTION_PIXEL_DIFF,
+                 min_frac=MOTION_MIN_FRAC, alpha=MOTION_BG_ALPHA):
+        self.scale = scale
+        self.pixel_diff = pixel_diff
+        self.min_frac = min_frac
+        self.alpha = alpha
+        self.bg = None
+        self.last_frac = 0.0
+
+    def update(self, frame):
+        small = cv2.resize(frame, (0, 0), fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        if self.bg is None or self.bg.shape != gray.shape:
+            self.bg = gray.astype(np.float32)
+            self.last_frac = 1.0
+            return True
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.bg))
+        _, mask = cv2.threshold(diff, self.pixel_diff, 255, cv2.THRESH_BINARY)
+        self.last_frac = cv2.countNonZero(mask) / float(mask.size)
+        cv2.accumulateWeighted(gray, self.bg, self.alpha)
+        return self.last_frac >= self.min_frac
+
+# ===================== AGENDADOR ADAPTATIVO =====================
+ADAPTIVE_SCHED = True           # False = escala/upsample/intervalo fixos (DETECT_SCALE, DETECT_UPSAMPLE, CHECK_INTERVAL_S)
+TARGET_LATENCY_S = 0.25         # custo alvo de um tick (deteccao + encodings)
+TARGET_CPU_SHARE = 0.5          # fracao de um nucleo que o reconhecimento pode usar
+SCHED_MAX_INTERVAL_S = 2.0
+SCHED_COOLDOWN_TICKS = 5        # ticks minimos num nivel antes de trocar de novo
+# (escala, upsample) do mais caro para o mais barato
+SCHED_LEVELS = [(0.5, 1), (0.35, 1), (0.25, 1), (0.35, 0), (0.25, 0), (0.2, 0)]
+
+class AdaptiveScheduler:
+    """Mede o custo real de face_locations/face_encodings e escolhe escala, upsample e
+    intervalo de deteccao para caber em TARGET_LATENCY_S e TARGET_CPU_SHARE."""
+    def __init__(self, adaptive=None, target_latency=TARGET_LATENCY_S, cpu_share=TARGET_CPU_SHARE):
+        self.adaptive = ADAPTIVE_SCHED if adaptive is None else adaptive
+        self.target_latency = target_latency
+        self.cpu_share = cpu_share
+        start = (DETECT_SCALE, DETECT_UPSAMPLE)
+        self.levels = SCHED_LEVELS if start in SCHED_LEVELS else SCHED_LEVELS + [start]
+        self.level = self.levels.index(start)
+        self.interval = CHECK_INTERVAL_S
+        self.detect_cost = None     # EWMA em segundos
+        self.encode_cost = None
+        self.ticks_at_level = 0
+        self.reason = "inicial"
+
+    @property
+    def scale(self):
+        return self.levels[self.level][0]
+
+    @property
+    def upsample(self):
+        return self.levels[self.level][1]
+
+    def _pixels(self, level):
+        s, up = self.levels[level]
+        return (s * (2 ** up)) ** 2
+
+    def record(self, detect_s, encode_s):
+        """Registra o custo de um tick; devolve True se a escolha mudou."""
+        a = 0.3
+        self.detect_cost = detect_s if self.detect_cost is None else (1 - a) * self.detect_cost + a * detect_s
+        self.encode_cost = encode_s if self.encode_cost is None else (1 - a) * self.encode_cost + a * encode_s
+        self.ticks_at_level += 1
+        if not self.adaptive:
+            return False
+
+        cost = self.detect_cost + self.encode_cost
+        level_before, interval_before = self.level, self.interval
+        if self.ticks_at_level >= SCHED_COOLDOWN_TICKS:
+            if cost > self.target_latency and self.level < len(self.levels) - 1:
+                self.reason = f"lento: {cost * 1000:.0f} ms > alvo {self.target_latency * 1000:.0f} ms"
+                self._set_level(self.level + 1)
+            elif self.level > 0:
+                # custo previsto do nivel acima (deteccao escala com a area em pixels)
+                ratio = self._pixels(self.level - 1) / self._pixels(self.level)
+                predicted = self.detect_cost * ratio + self.encode_cost
+                if predicted < 0.8 * self.target_latency:
+                    self.reason = f"folga: previsto {predicted * 1000:.0f} ms no nivel acima"
+                    self._set_level(self.level - 1)
+
+        # intervalo para o custo medio ocupar no maximo cpu_share de um nucleo
+        self.interval = min(SCHED_MAX_INTERVAL_S, max(MIN_CHECK_INTERVAL_S, cost / self.cpu_share))
+        # so reporta mudancas relevantes (>10% no intervalo ou troca de nivel)
+        moved = abs(self.interval - interval_before) > 0.1 * interval_before
+        if moved and level_before == self.level:
+            self.reason = f"cpu: {cost * 1000:.0f} ms / {self.cpu_share:.0%} de um nucleo"
+        return moved or level_before != self.level
+
+    def _set_level(self, level):
+        # a media de deteccao parte da previsao para o nivel novo e converge com as medidas
+        self.detect_cost *= self._pixels(level) / self._pixels(self.level)
+        self.level = level
+        self.ticks_at_level = 0
+
+    def snapshot(self):
+        return {
+            "escala": self.scale,
+            "upsample": self.upsample,
+            "intervalo_s": round(self.interval, 3),
+            "deteccao_ms": round((self.detect_cost or 0.0) * 1000, 1),
+            "encodings_ms": round((self.encode_cost or 0.0) * 1000, 1),
+            "alvo_ms": round(self.target_latency * 1000, 1),
+            "cpu_alvo": self.cpu_share,
+            "motivo": self.reason,
+        }
+
+    def describe(self):
+        s = self.snapshot()
+        return (f"escala {s['escala']} upsample {s['upsample']}, intervalo {s['intervalo_s']:.2f} s"
+                f" (deteccao {s['deteccao_ms']:.0f} ms, encodings {s['encodings_ms']:.0f} ms; {s['motivo']})")
+
+# ===================== ARDUINO (porta serial) =====================
+SERIAL_BOOT_S = 2.0             # o Arduino reinicia ao abrir a porta: espera antes do 1o comando
+SERIAL_WRITE_TIMEOUT_S = 1.0
+SERIAL_RETRY_S = 0.5            # reconexao: primeira espera, dobra a cada falha...
+SERIAL_RETRY_MAX_S = 30.0       # ...ate este teto
+
+class SerialActor:
+    """Thread dona da porta do Arduino. Abre a porta em paralelo com o start-up das cameras,
+    recebe comandos por uma LatestQueue (vale so o estado mais novo; send nunca bloqueia),
+    reconecta com backoff quando a porta cai e reenvia o estado atual depois de reconectar."""
+    def __init__(self, port, baud=SERIAL_BAUD, boot_s=SERIAL_BOOT_S, opener=None):
+        self.port = port
+        self.baud = baud
+        self.boot_s = boot_s
+        self.opener = opener        # default serial.Serial; outro (ex.: fake) nos testes
+        self.commands = LatestQueue("arduino", maxsize=1)
+        self.stop = threading.Event()
+        self.conn = None
+        self.wanted = None          # ultimo estado pedido
+        self.sent = None            # ultimo estado que chegou na porta atual
+        self.connects = 0
+        self.writes = 0
+        self.errors = 0
+        self.last_error = None
+        self.latency = deque(maxlen=METRICS_WINDOW)   # write + flush, em segundos
+        self.thread = threading.Thread(target=self._run, name="arduino", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def send(self, msg):
+        self.commands.put(msg)
+
+    def connected(self):
+        return self.conn is not None
+
+    def close(self, timeout=3.0):
+        """Entrega o ultimo estado pendente (se conectado) e fecha a porta."""
+        self.stop.set()
+        self.thread.join(timeout)
+
+    def describe(self):
+        lat = sorted(self.latency)
+        tempos = (f" (escrita p50 {lat[len(lat) // 2] * 1000:.2f} ms, max {lat[-1] * 1000:.2f} ms)"
+                  if lat else "")
+        estado = "conectado" if self.connected() else "encerrado" if self.stop.is_set() else "desconectado"
+        return (f"arduino {self.port}: {estado},"
+                f" {self.writes} envios{tempos}, {max(0, self.connects - 1)} reconexoes,"
+                f" {self.errors} falhas, {self.commands.dropped} comandos substituidos na fila")
+
+    def _open(self):
+        opener = self.opener
+        if opener is None:
+            import serial
+            opener = serial.Serial
+        return opener(self.port, self.baud, timeout=1, write_timeout=SERIAL_WRITE_TIMEOUT_S)
+
+    def _connect(self):
+        try:
+            conn = self._open()
+        except ImportError:
+            raise                   # sem pyserial nao adianta tentar de novo
+        except Exception as ex:
+            self._fail(ex)
+            return False
+        # reset da placa ao abrir: os comandos esperam na fila, ninguem mais trava. Nao
+        # interrompe no close: o ultimo estado ainda deve chegar (close espera ate 3 s)
+        time.sleep(self.boot_s)
+        self.conn = conn
+        self.sent = None            # placa reiniciada: o estado atual precisa ir de novo
+        self.connects += 1
+        self.last_error = None
+        print(f"Arduino conectado em {self.port}" + (" (reconexao)" if self.connects > 1 else ""))
+        return True
+
+    def _fail(self, ex):
+        self.errors += 1
+        if str(ex) != self.last_error:  # avisa uma vez por falha, nao a cada tentativa
+            print(f"Aviso: Arduino em {self.port} indisponivel ({ex}); tentando reconectar")
+        self.last_error = str(ex)
+
+    def _drop(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+        self.conn = None
 
-            face_locations = face_recognition.face_locations(rgb_small_frame)
-            face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+    def _write(self, msg):
+        t = time.perf_counter()
+        try:
+            self.conn.write(msg)
+            self.conn.flush()
+        except Exception as ex:
+            self._fail(ex)
+            self._drop()
+            return
+        self.latency.append(time.perf_counter() - t)
+        if metrics.enabled:
+            metrics.lap("serial", t)
+        self.sent = msg
+        self.writes += 1
+
+    def _run(self):
+        try:
+            self._loop()
+        except ImportError as ex:
+            print("Aviso: pyserial nao instalado. Rodando sem Arduino. Erro:", ex)
+        finally:
+            if self.conn is not None:
+                self._drop()
+
+    def _loop(self):
+        delay = SERIAL_RETRY_S
+        while not self.stop.is_set():
+            if self.conn is None:
+                if not self._connect():
+                    self.stop.wait(delay)
+                    delay = min(delay * 2, SERIAL_RETRY_MAX_S)
+                    continue
+                delay = SERIAL_RETRY_S
+            msg = self.commands.get(timeout=0.2)
+            if msg is not None:
+                self.wanted = msg
+            if self.wanted is not None and self.wanted != self.sent:
+                self._write(self.wanted)
+        # encerrando: o ultimo comando enfileirado ainda vai para a placa
+        msg = self.commands.get(timeout=0)
+        if msg is not None:
+            self.wanted = msg
+        if self.conn is not None and self.wanted is not None and self.wanted != self.sent:
+            self._write(self.wanted)
+
+# ===================== SESSOES DE PRESENCA =====================
+EVENT_MODE = os.getenv("IOT_EVENT_MODE", "sessao")  # "sessao" (entrada/mudanca/saida) ou "tick" (um por tick)
+SESSION_TIMEOUT_S = 5.0         # sem aparecer por tanto tempo = saiu
+
+class Session:
+    __slots__ = ("origem", "face_idx", "start", "last", "samples", "acesso", "primeira_vez", "n")
+
+    def __init__(self, origem, face_idx, now, acesso, primeira_vez):
+        self.origem = origem
+        self.face_idx = face_idx
+        self.start = self.last = now
+        self.samples = 1
+        self.acesso = acesso
+        self.primeira_vez = primeira_vez
+        self.n = 0                # ocorrencia (visita) do rosto, definida na entrada
+
+class SessionAggregator:
+    """Presenca por (origem, rosto) em memoria: um registro quando o rosto entra, um quando o
+    acesso muda e um ao sair (SESSION_TIMEOUT_S sem aparecer), com duracao e amostras.
+    Os ticks no meio da sessao so atualizam contadores."""
+    def __init__(self, timeout=SESSION_TIMEOUT_S):
+        self.timeout = timeout
+        self.open = {}            # (origem, idx na galeria) -> Session
+        self.opened = 0
+        self.changed = 0
+        self.closed = 0
+        self.samples = 0
+
+    def observe(self, now, origem, face_idx, acesso, primeira_vez):
+        """Uma amostra de um tick. Devolve [(tipo, sessao)] a registrar (quase sempre vazio)."""
+        self.samples += 1
+        key = (origem, face_idx)
+        s = self.open.get(key)
+        if s is None:
+            s = self.open[key] = Session(origem, face_idx, now, acesso, primeira_vez)
+            self.opened += 1
+            return [("entrada", s)]
+        s.last = max(s.last, now)
+        s.samples += 1
+        if acesso != s.acesso:
+            s.acesso = acesso
+            self.changed += 1
+            return [("mudanca", s)]
+        return []
 
-            acesso = False
+    def expire(self, now=None):
+        """Fecha as sessoes vencidas (todas, com now=None). Devolve [("saida", sessao)]."""
+        out = []
+        for key, s in list(self.open.items()):
+            if now is None or now - s.last > self.timeout:
+                del self.open[key]
+                self.closed += 1
+                out.append(("saida", s))
+        return out
+
+def session_summary(sessions):
+    records = sessions.opened + sessions.changed + sessions.closed
+    ratio = f" ({sessions.samples / records:.0f}x menos registros)" if records else ""
+    return (f"sessoes: {sessions.opened} entradas, {sessions.changed} mudancas, {sessions.closed} saidas,"
+            f" {sessions.samples} amostras de tick{ratio}")
+
+# ===================== PIPELINE (captura / reconhecimento / exibicao) =====================
+STATS_INTERVAL_S = 5.0          # intervalo do resumo do pipeline no console
+
+class LatestQueue:
+    """Fila limitada: quando cheia descarta o item mais antigo, entao quem consome sempre pega o mais novo."""
+    def __init__(self, name, maxsize=1):
+        self.name = name
+        self.q = queue.Queue(maxsize=maxsize)
+        self.puts = 0
+        self.dropped = 0
+
+    def put(self, item):
+        while True:
+            try:
+                self.q.put_nowait(item)
+                self.puts += 1
+                return
+            except queue.Full:
+                try:
+                    self.q.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
 
-            for face_encoding in face_encodings:
+    def get(self, timeout=None):
+        try:
+            return self.q.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def depth(self):
+        return self.q.qsize()
+
+def is_file_source(src):
+    return isinstance(src, str) and os.path.isfile(src)
+
+class CaptureThread:
+    """Le frames da fonte e publica (seq, t, frame) em todas as filas de saida."""
+    def __init__(self, cap, outputs, stop, pace_fps=None):
+        self.cap = cap
+        self.outputs = outputs
+        self.stop = stop
+        self.eof = threading.Event()
+        self.frames = 0
+        # arquivo de video: respeita o fps original (senao le na velocidade do decoder)
+        self.period = 1.0 / pace_fps if pace_fps else 0.0
+        self.thread = threading.Thread(target=self._run, name="captura", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def _run(self):
+        next_t = time.perf_counter()
+        while not self.stop.is_set():
+            t = metrics.mark()
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            metrics.lap("captura", t)
+            self.frames += 1
+            pkt = (self.frames, time.time(), frame)
+            for q in self.outputs:
+                q.put(pkt)
+            if self.period:
+                next_t += self.period
+                delay = next_t - time.perf_counter()
+                if delay > 0:
+                    self.stop.wait(delay)
+                else:
+                    next_t = time.perf_counter()
+        self.eof.set()
+
+DOOR_STALE_S = 2 * MAX_IDLE_S   # camera sem decidir ha tanto tempo (fim/queda) nao segura a porta
+
+class AccessResolver:
+    """Parte do reconhecimento que depende de estado compartilhado: galeria, rosto autorizado,
+    eventos e Arduino (SerialActor ou None). Com varias fontes ha um so resolvedor."""
+    def __init__(self, arduino):
+        self.arduino = arduino
+        self.lock = threading.Lock()
+        self.rosto_autorizado = None
+        self.ultimo_envio = None
+        self.status = {}            # origem -> (texto, cor) da ultima decisao
+        self.door = {}              # origem -> (acesso, instante) da ultima decisao
+        self.events = {}            # origem -> eventos registrados nesta execucao
+        self.sessions = SessionAggregator() if EVENT_MODE == "sessao" else None
+
+    def snapshot(self, origem):
+        with self.lock:
+            texto, cor = self.status.get(origem, ("", (255, 255, 255)))
+            return texto, cor, self.rosto_autorizado
+
+    def resolve(self, observed, now, origem):
+        """observed: [(trilha, encoding ou None), ...] de um tick; o encoding so vem nas
+        trilhas que precisaram (novas ou com re-verificacao vencida)."""
+        face_encodings = [enc for _, enc in observed if enc is not None]
+        tm = metrics.mark()
+        with state_lock:
+            resolved = iter(gallery.match_or_enroll(face_encodings, tol=MATCH_TOL))
+        if face_encodings:
+            metrics.lap("galeria", tm)
+
+        enrolled = set()
+        with self.lock:
+            # o primeiro rosto visto por qualquer camera vira o autorizado
+            rosto_autorizado = self.rosto_autorizado
+            for track, face_encoding in observed:
+                if face_encoding is None:
+                    continue
+                idx, primeira_vez = next(resolved)
                 if rosto_autorizado is None:
                     rosto_autorizado = face_encoding
-                    acesso = True
+                    track.acesso = True
                 else:
-                    match = face_recognition.compare_faces([rosto_autorizado], face_encoding, tolerance=0.5)
-                    acesso = match[0]
-
-                face_id, primeira_vez = get_or_create_face_id(face_encoding, tol=0.5)
-                face_counts[face_id] += 1
-                evento = {
-                    "data": time.strftime("%d/%m/%Y"),
-                    "hora": time.strftime("%H:%M:%S"),
-                    "id": face_id,
-                    "status": "Aprovado" if acesso else "Negado",
-                    "primeira_vez": primeira_vez,
-                    "n": face_counts[face_id],
-                }
-                events.appendleft(evento)
-                save_event_csv(evento)
-
-            if acesso:
-                texto = "Acesso Liberado"
-                cor = (0, 255, 0)
-                msg = b'1'
-            else:
-                texto = "Acesso Negado"
-                cor = (0, 0, 255)
-                msg = b'0'
+                    match = face_recognition.compare_faces([rosto_autorizado], face_encoding, tolerance=MATCH_TOL)
+                    track.acesso = bool(match[0])
+                track.face_idx = idx
+                track.verified_at = now
+                if primeira_vez:
+                    enrolled.add(track.id)
+            self.rosto_autorizado = rosto_autorizado
+
+        acesso = False
+        for track, _ in observed:
+            acesso = track.acesso
+            primeira_vez = track.id in enrolled
+            if self.sessions is None:
+                self._emit(now, track.face_idx, acesso, primeira_vez, origem)
+                continue
+            with self.lock:
+                records = self.sessions.observe(now, origem, track.face_idx, acesso, primeira_vez)
+            for tipo, s in records:
+                self._emit_session(tipo, s)
+        self.close(now)
+
+        if acesso:
+            texto, cor = "Acesso Liberado", (0, 255, 0)
+        else:
+            texto, cor = "Acesso Negado", (0, 0, 255)
+
+        with self.lock:
+            self.status[origem] = (texto, cor)
+            self.door[origem] = (acesso, now)
+            # uma fechadura para todas as cameras: abre se alguma autoriza agora e so fecha
+            # quando nenhuma autoriza (um tick vazio numa camera nao tranca a porta da outra)
+            aberta = any(a for a, t in self.door.values() if now - t <= DOOR_STALE_S)
+            msg = b'1' if aberta else b'0'
+            if self.arduino is not None and msg != self.ultimo_envio:
+                self.arduino.send(msg)      # so enfileira: a porta e da thread do SerialActor
+                self.ultimo_envio = msg
+
+    def close(self, now=None):
+        """Registra a saida das sessoes vencidas em `now` (todas, sem now). Devolve quantas."""
+        if self.sessions is None:
+            return 0
+        with self.lock:
+            records = self.sessions.expire(now)
+        for tipo, s in records:
+            self._emit_session(tipo, s)
+        return len(records)
+
+    def _emit_session(self, tipo, s):
+        if tipo == "entrada":
+            # a ocorrencia conta visitas, nao ticks
+            s.n = self._emit(s.start, s.face_idx, s.acesso, s.primeira_vez, s.origem, tipo="entrada")
+        elif tipo == "mudanca":
+            self._emit(s.last, s.face_idx, s.acesso, False, s.origem, tipo="mudanca", n=s.n)
+        else:
+            self._emit(s.last, s.face_idx, s.acesso, False, s.origem, tipo="saida", n=s.n,
+                       duracao_s=round(s.last - s.start, 1), amostras=s.samples)
+
+    def _emit(self, ts, idx, acesso, primeira_vez, origem, tipo=None, n=None, duracao_s=None, amostras=None):
+        """Monta o evento, poe no Dashboard e no registro. Devolve a ocorrencia."""
+        global events_version
+        # data/hora no fuso do log binario e do importador (Sao Paulo), nao no do host
+        data, hora = epoch_to_strings(int(ts))
+        with state_lock:
+            if n is None:
+                gallery.counts[idx] += 1
+                n = int(gallery.counts[idx])
+            evento = {
+                "ts": int(ts),
+                "data": data,
+                "hora": hora,
+                "id": gallery.label(idx),
+                "status": "Aprovado" if acesso else "Negado",
+                "primeira_vez": primeira_vez,
+                "n": n,
+                "origem": origem,
+            }
+            if tipo is not None:
+                evento.update(tipo=tipo, duracao_s=duracao_s, amostras=amostras)
+            events.appendleft(evento)
+            events_version += 1
+            self.events[origem] = self.events.get(origem, 0) + 1
+        tm = metrics.mark()
+        save_event_csv(evento)
+        metrics.lap("registro", tm)
+        return n
+
+class RecognitionWorker:
+    """Consome sempre o frame mais novo e roda deteccao/encodings (observe). As trilhas vao
+    para o resolvedor (galeria/eventos) ou, no processo de uma camera, para `publish`."""
+    def __init__(self, frames, arduino, stop, origem=SOURCE_NAME, resolver=None, publish=None):
+        self.frames = frames
+        self.stop = stop
+        self.origem = origem
+        self.resolver = resolver if resolver is not None else AccessResolver(arduino)
+        self.publish = publish
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.last_seq = 0
+        self.last_latency = 0.0
+        self.tracker = FaceTracker()
+        self.gate = MotionGate()
+        self.sched = AdaptiveScheduler()
+        self.last_check_time = 0.0
+        self.gated = 0              # frames em que o detector nao precisou rodar
+        self.thread = threading.Thread(target=self._run, name=f"reconhecimento-{origem}", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def snapshot(self):
+        return self.resolver.snapshot(self.origem)
+
+    def detection_due(self, now, motion):
+        since = now - self.last_check_time
+        if self.tracker.tracks:
+            # alguem em cena: mantem a cadencia normal para acompanhar entrada/saida
+            return since >= self.sched.interval
+        return (motion and since >= self.sched.interval) or since >= MAX_IDLE_S
+
+    def _run(self):
+        last_gate = 0.0
+        while not self.stop.is_set():
+            # o gate roda em baixa frequencia; a fila guarda so o frame mais novo
+            wait = GATE_INTERVAL_S - (time.time() - last_gate)
+            if wait > 0 and self.stop.wait(wait):
+                break
+            pkt = self.frames.get(timeout=0.1)
+            if pkt is None:
+                continue
+            seq, _, frame = pkt
+            last_gate = now = time.time()
+            t = metrics.mark()
+            motion = self.gate.update(frame)
+            metrics.lap("gate", t)
+            if not self.detection_due(now, motion):
+                self.gated += 1
+                continue
+            self.last_check_time = now
+            self.process_frame(frame, now)
+            self.last_seq = seq
+            self.last_latency = time.time() - now
+
+    def step(self, frame, now, gate=True):
+        """Um frame no relogio de quem chama (headless/analise): gate, cadencia e tick se devido."""
+        t = metrics.mark()
+        motion = self.gate.update(frame) if gate else True
+        metrics.lap("gate", t)
+        if not self.detection_due(now, motion):
+            self.gated += 1
+            return False
+        self.last_check_time = now
+        self.process_frame(frame, now)
+        return True
+
+    def process_frame(self, frame, now=None):
+        now = time.time() if now is None else now
+        observed = self.observe(frame, now)
+        if self.publish is not None:
+            self.publish(observed, now)
+        else:
+            self.resolver.resolve(observed, now, self.origem)
+
+    def observe(self, frame, now):
+        """Deteccao, trilhas e encodings das trilhas que precisam; nao toca na galeria.
+        Devolve [(trilha, encoding ou None), ...] na ordem das caixas."""
+        scale, upsample = self.sched.scale, self.sched.upsample
+        t0 = time.perf_counter()
+        tm = metrics.mark()
+        small_frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+        tm = metrics.lap("resize", tm)
+
+        face_locations = face_recognition.face_locations(rgb_small_frame, upsample)
+        metrics.lap("deteccao", tm)
+        t1 = time.perf_counter()
+        # trilhas em coordenadas do frame original (independe da escala de deteccao)
+        boxes = [tuple(int(round(v / scale)) for v in loc) for loc in face_locations]
+        assigned = self.tracker.update(boxes, now)
+
+        pending = [i for i, (_, need) in enumerate(assigned) if need]
+        tm = metrics.mark()
+        face_encodings = face_recognition.face_encodings(
+            rgb_small_frame, [face_locations[i] for i in pending]) if pending else []
+        if pending:
+            metrics.lap("encodings", tm)
+        if self.sched.record(t1 - t0, time.perf_counter() - t1):
+            print(f"[agendador {self.origem}]", self.sched.describe())
+        self.tracker.encodings_done += len(pending)
+        self.tracker.encodings_avoided += len(assigned) - len(pending)
+
+        encs = dict(zip(pending, face_encodings))
+        observed = []
+        for i, (track, _) in enumerate(assigned):
+            enc = encs.get(i)
+            if enc is not None:
+                # no processo da camera a identidade fica no principal; aqui so marca a
+                # trilha como verificada para nao recalcular o encoding a cada tick
+                track.verified_at = now
+                if track.face_idx is None:
+                    track.face_idx = -1
+            observed.append((track, enc))
+        with self.lock:
+            self.processed += 1
+        return observed
+
+# ----- varias fontes -----
+MULTI_PROCESS = True            # 2+ fontes: um processo por camera (HOG em paralelo); False = threads
+PREVIEW_W = 480                 # largura da previa que o processo da camera manda para a exibicao
+PREVIEW_FPS = 15.0
+TRACK_STALE_S = 60.0            # processo principal esquece trilhas de camera sem observacao ha tanto tempo
+
+def video_sources():
+    """[(nome, fonte), ...]; sem VIDEO_SOURCES e so VIDEO_SOURCE, com o nome SOURCE_NAME."""
+    return list(VIDEO_SOURCES) if VIDEO_SOURCES else [(SOURCE_NAME, VIDEO_SOURCE)]
+
+class SourceFeed:
+    """Uma fonte vista pelo processo principal: previa para exibir e contadores do Dashboard."""
+    def __init__(self, name, preview, window):
+        self.name = name
+        self.preview = preview      # .get(timeout) -> (seq, t, frame) ou None
+        self.window = window
+        self.cap = None             # modo threads: captura e reconhecimento locais
+        self.capture = None
+        self.worker = None
+        self.recog_q = None
+        self.process = None         # modo processos: contadores chegam por mensagem
+        self.frames = 0
+        self.ticks = 0
+        self.gated = 0
+        self.latency = 0.0
+        self.eof = False
+        self.shown = 0
+        self.fps = 0.0
+        self.det_s = 0.0
+        self._rate = (time.time(), 0, 0)
+
+    def counters(self):
+        if self.capture is not None:
+            return self.capture.frames, self.worker.processed
+        return self.frames, self.ticks
+
+    def finished(self):
+        return self.capture.eof.is_set() if self.capture is not None else self.eof
+
+    def update_rates(self, now):
+        t, f0, k0 = self._rate
+        if now - t >= 1.0:
+            f, k = self.counters()
+            self.fps, self.det_s = (f - f0) / (now - t), (k - k0) / (now - t)
+            self._rate = (now, f, k)
+
+def start_camera_threads(sources, resolver, stop, windows):
+    feeds = []
+    for (name, src), window in zip(sources, windows):
+        src = parse_source(src)
+        cap = cv2.VideoCapture(src)
+        if not cap.isOpened():
+            print(f"Aviso: nao foi possivel abrir a fonte {name} ({src!r})")
+        pace = cap.get(cv2.CAP_PROP_FPS) if is_file_source(src) else None
+        feed = SourceFeed(name, LatestQueue("exibicao", maxsize=2), window)
+        feed.cap = cap
+        feed.recog_q = LatestQueue("reconhecimento", maxsize=1)
+        feed.capture = CaptureThread(cap, [feed.recog_q, feed.preview], stop, pace_fps=pace or None)
+        feed.worker = RecognitionWorker(feed.recog_q, None, stop, origem=name, resolver=resolver)
+        feed.capture.start()
+        feed.worker.start()
+        feeds.append(feed)
+    return feeds
+
+class PreviewTap:
+    """Saida da CaptureThread no processo da camera: previa reduzida, no maximo PREVIEW_FPS,
+    descartada se a exibicao estiver atrasada."""
+    def __init__(self, q):
+        self.q = q
+        self.period = 1.0 / PREVIEW_FPS
+        self.next_t = 0.0
+
+    def put(self, pkt):
+        now = time.monotonic()
+        if now < self.next_t:
+            return
+        self.next_t = now + self.period
+        seq, t, frame = pkt
+        h, w = frame.shape[:2]
+        if w > PREVIEW_W:
+            frame = cv2.resize(frame, (PREVIEW_W, int(h * PREVIEW_W / w)), interpolation=cv2.INTER_AREA)
+        try:
+            self.q.put_nowait((seq, t, frame))
+        except queue.Full:
+            pass
 
-            if arduino is not None:
-                try:
-                    if msg != (ultimo_envio or b''):
-                        arduino.write(msg)
-                        ultimo_envio = msg
-                except Exception as ex:
-                    print("Falha ao enviar para Arduino:", ex)
+class ProcessPreview:
+    """Lado do processo principal da fila de previa (mesmo get da LatestQueue)."""
+    def __init__(self, q):
+        self.q = q
 
+    def get(self, timeout=None):
         try:
-            cv2.putText(frame, texto, (20, 40),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, cor, 2)
-        except:
+            return self.q.get_nowait() if not timeout else self.q.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+CAMERA_SETTINGS = ("DETECT_SCALE", "DETECT_UPSAMPLE", "CHECK_INTERVAL_S", "MATCH_TOL", "ADAPTIVE_SCHED",
+                   "GATE_INTERVAL_S", "MAX_IDLE_S", "PREVIEW_W", "PREVIEW_FPS")
+
+def camera_settings():
+    return {k: globals()[k] for k in CAMERA_SETTINGS}
+
+def apply_settings(settings):
+    # spawn reimporta o modulo com os valores padrao: aplica os do processo principal
+    globals().update(settings)
+
+def camera_process(name, src, obs_q, preview_q, stop, settings, metrics_on):
+    """Processo de uma camera: captura + gate + deteccao/encodings. Manda ao principal
+    ("obs", nome, t, [(id_trilha, encoding ou None)]), ("stats", ...), ("metricas", nome,
+    drain dos cronometros) e ("fim", nome, erro). `metrics_on` segue a tecla 'm' do principal."""
+    apply_settings(settings)
+    metrics.enabled = metrics_on.is_set()
+    src = parse_source(src)
+    cap = cv2.VideoCapture(src)
+    if not cap.isOpened():
+        obs_q.put(("fim", name, f"nao foi possivel abrir {src!r}"))
+        return
+    pace = cap.get(cv2.CAP_PROP_FPS) if is_file_source(src) else None
+    local_stop = threading.Event()
+    frames = LatestQueue("reconhecimento", maxsize=1)
+    capture = CaptureThread(cap, [frames, PreviewTap(preview_q)], local_stop, pace_fps=pace or None)
+
+    def publish(observed, now):
+        obs_q.put(("obs", name, now, [(t.id, enc) for t, enc in observed]))
+
+    worker = RecognitionWorker(frames, None, local_stop, origem=name, publish=publish)
+
+    def stats():
+        obs_q.put(("stats", name, capture.frames, worker.processed, worker.gated, worker.last_latency))
+        drained = metrics.drain()
+        if drained:
+            obs_q.put(("metricas", name, drained))
+        metrics.enabled = metrics_on.is_set()
+
+    capture.start()
+    worker.start()
+    try:
+        while not stop.wait(1.0) and not capture.eof.is_set():
+            stats()
+    except KeyboardInterrupt:
+        pass                    # Ctrl+C chega a todos os processos; quem encerra e o principal
+    local_stop.set()
+    capture.thread.join(timeout=2)
+    worker.thread.join(timeout=5)
+    cap.release()
+    stats()
+    obs_q.put(("fim", name, None))
+
+class RemoteTracks:
+    """Identidades das trilhas de quem nao ve a galeria (processo de camera, pedaco de video):
+    (chave, id da trilha la) -> Track, resolvida aqui no processo principal."""
+    def __init__(self):
+        self.tracks = {}
+        self.seen = {}
+
+    def observed(self, key, now, items):
+        """[(id_trilha, encoding ou None)] -> [(Track, encoding ou None)] para o AccessResolver."""
+        observed = []
+        for tid, enc in items:
+            k = (key, tid)
+            track = self.tracks.get(k)
+            if track is None:
+                track = self.tracks[k] = Track(tid, None)
+            self.seen[k] = now
+            if enc is None and track.face_idx is None:
+                continue            # so acontece se a trilha foi esquecida aqui
+            observed.append((track, enc))
+        return observed
+
+    def prune(self, now, max_age=TRACK_STALE_S):
+        for k in [k for k, t in self.seen.items() if now - t > max_age]:
+            del self.seen[k], self.tracks[k]
+
+class CameraHub:
+    """Processo principal no modo multi-processo: recebe as observacoes das cameras e
+    resolve identidade/eventos com a galeria e o registro compartilhados."""
+    def __init__(self, obs_q, feeds, resolver, metrics_on=None):
+        self.obs_q = obs_q
+        self.feeds = {f.name: f for f in feeds}
+        self.resolver = resolver
+        self.metrics_on = metrics_on    # Event compartilhado: liga/desliga os cronometros das cameras
+        self.stop = threading.Event()
+        self.tracks = RemoteTracks()
+        self.messages = 0
+        self.thread = threading.Thread(target=self._run, name="cameras", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _sync_metrics(self):
+        if self.metrics_on is not None and self.metrics_on.is_set() != metrics.enabled:
+            if metrics.enabled:
+                self.metrics_on.set()
+            else:
+                self.metrics_on.clear()
+
+    def _run(self):
+        while True:
+            self._sync_metrics()
+            try:
+                msg = self.obs_q.get(timeout=0.2)
+            except queue.Empty:
+                if self.stop.is_set():
+                    break
+                continue
+            self.messages += 1
+            kind, name = msg[0], msg[1]
+            feed = self.feeds.get(name)
+            if feed is None:
+                continue
+            if kind == "obs":
+                now = msg[2]
+                self.resolver.resolve(self.tracks.observed(name, now, msg[3]), now, name)
+                if self.messages % 256 == 0:
+                    self.tracks.prune(now)
+            elif kind == "stats":
+                feed.frames, feed.ticks, feed.gated, feed.latency = msg[2:]
+            elif kind == "metricas":
+                # captura/gate/deteccao/encodings rodam nas cameras: entram no overlay,
+                # no /metrics e no metricas.json do principal
+                metrics.merge(msg[2])
+            elif kind == "fim":
+                feed.eof = True
+                if msg[2]:
+                    print(f"Aviso: camera {name}: {msg[2]}")
+
+def start_camera_processes(sources, resolver, windows):
+    import multiprocessing as mp
+    # spawn em todas as plataformas: cada camera e um interpretador limpo (sem threads/janelas herdadas)
+    ctx = mp.get_context("spawn")
+    obs_q = ctx.Queue()
+    stop = ctx.Event()
+    metrics_on = ctx.Event()
+    if metrics.enabled:
+        metrics_on.set()
+    settings = camera_settings()
+    feeds = []
+    for (name, src), window in zip(sources, windows):
+        preview_q = ctx.Queue(maxsize=2)
+        feed = SourceFeed(name, ProcessPreview(preview_q), window)
+        feed.process = ctx.Process(target=camera_process, name=f"camera-{name}", daemon=True,
+                                   args=(name, src, obs_q, preview_q, stop, settings, metrics_on))
+        feeds.append(feed)
+    hub = CameraHub(obs_q, feeds, resolver, metrics_on).start()
+    for feed in feeds:
+        feed.process.start()
+    return feeds, hub, stop
+
+def stop_camera_processes(feeds, hub, stop, timeout=10.0):
+    stop.set()
+    deadline = time.time() + timeout
+    # o hub continua drenando ate cada camera mandar "fim": nenhuma observacao se perde
+    while not all(f.eof for f in feeds) and time.time() < deadline:
+        time.sleep(0.05)
+    hub.stop.set()
+    hub.thread.join(timeout=2)
+    for feed in feeds:
+        # a previa pode ter itens na fila; sem drenar, o join do processo pode travar
+        while feed.preview.get() is not None:
             pass
+        feed.process.join(timeout=2)
+        if feed.process.is_alive():
+            feed.process.terminate()
+
+def print_pipeline_stats(feeds, elapsed):
+    el = max(1e-6, elapsed)
+    for feed in feeds:
+        tag = f"[pipeline {feed.name}]" if len(feeds) > 1 else "[pipeline]"
+        if feed.capture is None:
+            print(f"{tag} captura: {feed.frames / el:.1f} fps"
+                  f" | reconhecimento (processo): {feed.ticks / el:.2f} ticks/s,"
+                  f" ultimo {feed.latency * 1000:.0f} ms, sem movimento {feed.gated}"
+                  f" | exibicao: {feed.shown / el:.1f} fps")
+            continue
+        worker, recog_q, display_q = feed.worker, feed.recog_q, feed.preview
+        print(f"{tag} captura: {feed.capture.frames / el:.1f} fps"
+              f" | reconhecimento: fila {recog_q.depth()}, descartes {recog_q.dropped},"
+              f" {worker.processed / el:.2f} ticks/s, ultimo {worker.last_latency * 1000:.0f} ms,"
+              f" encodings {worker.tracker.encodings_done} (evitados {worker.tracker.encodings_avoided}),"
+              f" sem movimento {worker.gated}, movimento {worker.gate.last_frac * 100:.1f}%"
+              f" | agendador: {worker.sched.describe()}"
+              f" | exibicao: fila {display_q.depth()}, descartes {display_q.dropped}, {feed.shown / el:.1f} fps")
+    if event_sink is not None:
+        print(f"[pipeline] registro.csv: fila {event_sink.depth()}, {event_sink.written} eventos"
+              f" em {event_sink.batches} lotes, falhas {event_sink.errors}")
 
-        cv2.imshow("Reconhecimento Facial", frame)
-        draw_dashboard(rosto_autorizado)
+# ===================== CORE DO PROGRAMA =====================
+def metrics_key(k):
+    if k in (ord("m"), ord("M")):
+        print("[metricas]", "ligadas" if metrics.toggle() else "desligadas")
 
-        k = cv2.waitKey(1) & 0xFF
-        if k == 27:
+def run_program():
+    global event_sink, dashboard, access_resolver, source_feeds
+    # a porta abre (e a placa reinicia) enquanto janelas e cameras sobem
+    arduino = SerialActor(SERIAL_PORT).start()
+    ensure_csv_header()
+    ensure_event_log()
+    event_sink = EventSink(path=CSV_PATH, bin_path=EVENTS_BIN_PATH).start()
+
+    sources = video_sources()
+    multi = len(sources) > 1
+    # uma fonte: a janela de sempre; varias: uma janela por camera
+    windows = [f"Camera {name}" for name, _ in sources] if multi else ["Reconhecimento Facial"]
+    for window in windows:
+        cv2.namedWindow(window, cv2.WINDOW_AUTOSIZE)  # nao achata
+    cv2.namedWindow("Dashboard", cv2.WINDOW_NORMAL)
+    cv2.resizeWindow("Dashboard", DASH_W, DASH_H)
+    dashboard = DashboardRenderer()
+    metrics_server = start_metrics_server()
+
+    access_resolver = AccessResolver(arduino)
+    stop = threading.Event()
+    hub = proc_stop = None
+    if multi and MULTI_PROCESS:
+        feeds, hub, proc_stop = start_camera_processes(sources, access_resolver, windows)
+    else:
+        feeds = start_camera_threads(sources, access_resolver, stop, windows)
+    source_feeds = feeds
+
+    t_start = last_stats = last_dump = time.time()
+    while True:
+        shown = False
+        for feed in feeds:
+            pkt = feed.preview.get(timeout=0)
+            if pkt is None:
+                continue
+            # copia: no modo threads o mesmo frame pode estar sendo lido pelo reconhecimento
+            frame = pkt[2].copy() if feed.capture is not None else pkt[2]
+            texto, cor, _ = access_resolver.snapshot(feed.name)
+            try:
+                cv2.putText(frame, texto, (20, 40),
+                            cv2.FONT_HERSHEY_SIMPLEX, 1, cor, 2)
+            except:
+                pass
+            t = metrics.mark()
+            cv2.imshow(feed.window, frame)
+            metrics.lap("imshow", t)
+            feed.shown += 1
+            shown = True
+
+        if shown:
+            t = metrics.mark()
+            draw_dashboard(access_resolver.rosto_autorizado)
+            metrics.lap("dashboard", t)
+        elif all(feed.finished() for feed in feeds):
+            print("Fim do video")
             break
 
-    cap.release()
-    cv2.destroyWindow("Reconhecimento Facial")
+        now = time.time()
+        if now - last_stats >= STATS_INTERVAL_S:
+            print_pipeline_stats(feeds, now - t_start)
+            last_stats = now
+        if METRICS_JSON_PATH and metrics.enabled and now - last_dump >= METRICS_JSON_S:
+            metrics.dump_json(METRICS_JSON_PATH)
+            last_dump = now
+
+        k = cv2.waitKey(1 if shown else 5) & 0xFF
+        if k == 27:
+            break
+        metrics_key(k)
+
+    stop.set()
+    if hub is not None:
+        stop_camera_processes(feeds, hub, proc_stop)
+    for feed in feeds:
+        if feed.capture is not None:
+            feed.capture.thread.join(timeout=2)
+            feed.worker.thread.join(timeout=5)
+    access_resolver.close()     # saida de quem ainda estava em cena
+    print_pipeline_stats(feeds, time.time() - t_start)
+    if access_resolver.sessions is not None:
+        print("[pipeline]", session_summary(access_resolver.sessions))
+    arduino.close()
+    print("[pipeline]", arduino.describe())
+    sink, event_sink = event_sink, None
+    sink.close()
+    if METRICS_JSON_PATH and metrics.enabled:
+        metrics.dump_json(METRICS_JSON_PATH)
+    if metrics_server is not None:
+        metrics_server.shutdown()
+        metrics_server.server_close()
+
+    for feed in feeds:
+        if feed.cap is not None:
+            feed.cap.release()
+        cv2.destroyWindow(feed.window)
     cv2.destroyWindow("Dashboard")
+    source_feeds = []
+
+# ===================== MODO HEADLESS (sem janelas) =====================
+def parse_source(src):
+    # "0", "1"...: indice de camera; o resto e caminho/URL
+    return int(src) if isinstance(src, str) and src.isdigit() else src
+
+def parse_source_spec(spec, i):
+    """"nome=fonte" (ou so a fonte, que vira cam<i>) de --fonte."""
+    name, sep, src = spec.partition("=")
+    if not sep or not name or any(c in name for c in ":/\\"):
+        return f"cam{i}", spec
+    return name, src
+
+def run_headless(source=VIDEO_SOURCE, max_frames=None, start_time=None, gate=True, serial_port=None,
+                 origem=SOURCE_NAME):
+    """
+    Processa a fonte em sequencia, o mais rapido que a CPU permitir: sem imshow/waitKey,
+    sem threads de captura/exibicao. Arquivo de video usa o relogio do proprio video
+    (inicio + POS_MSEC), entao gate, agendador e horario dos eventos ficam iguais aos do
+    modo com janelas; camera usa o relogio real. Eventos vao para o registro normalmente.
+    """
+    global event_sink
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        print(f"Nao foi possivel abrir a fonte {source!r}")
+        return 1
+    video_clock = is_file_source(source)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    t0_video = time.time() if start_time is None else start_time
+
+    ensure_csv_header()
+    ensure_event_log()
+    event_sink = EventSink(path=CSV_PATH, bin_path=EVENTS_BIN_PATH).start()
+    arduino = SerialActor(serial_port).start() if serial_port else None
+
+    worker = RecognitionWorker(None, arduino, threading.Event(), origem=origem)
+    frames = 0
+    video_s = 0.0
+    t_start = last_stats = time.perf_counter()
     try:
+        while max_frames is None or frames < max_frames:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frames += 1
+            if video_clock:
+                video_s = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                now = t0_video + video_s
+            else:
+                now = time.time()
+            if not worker.step(frame, now, gate):
+                continue
+
+            el = time.perf_counter() - last_stats
+            if el >= STATS_INTERVAL_S:
+                total = time.perf_counter() - t_start
+                print(f"[headless] {frames} frames, {frames / total:.1f} fps, video em {video_s:.1f} s,"
+                      f" {events_version} eventos")
+                last_stats = time.perf_counter()
+    except KeyboardInterrupt:
+        print("[headless] interrompido")
+    finally:
+        elapsed = time.perf_counter() - t_start
+        cap.release()
+        worker.resolver.close()
+        sink, event_sink = event_sink, None
+        sink.close()
         if arduino is not None:
             arduino.close()
-    except:
-        pass
+
+    speed = f", {video_s / elapsed:.1f}x tempo real" if video_clock and elapsed > 0 else ""
+    print(f"[headless] {frames} frames em {elapsed:.2f} s: {frames / max(elapsed, 1e-9):.1f} fps"
+          f" (fonte a {fps:.0f} fps, {video_s:.1f} s de video{speed})")
+    print(f"[headless] deteccoes {worker.processed}, frames sem deteccao {worker.gated},"
+          f" encodings {worker.tracker.encodings_done} (evitados {worker.tracker.encodings_avoided}),"
+          f" eventos {events_version} -> {CSV_PATH}, {len(gallery)} rostos na galeria"
+          f" | agendador: {worker.sched.describe()}")
+    if worker.resolver.sessions is not None:
+        print("[headless]", session_summary(worker.resolver.sessions))
+    if arduino is not None:
+        print("[headless]", arduino.describe())
+    if metrics.enabled:
+        for stage, m in metrics.snapshot().items():
+            print(f"[headless] {stage:<10} p50 {m['p50_ms']:7.2f} ms  p95 {m['p95_ms']:7.2f} ms"
+                  f"  p99 {m['p99_ms']:7.2f} ms  ({m['n']} amostras)")
+        if METRICS_JSON_PATH:
+            metrics.dump_json(METRICS_JSON_PATH)
+    return 0
+
+# ===================== ANALISE OFFLINE (video gravado em paralelo) =====================
+ANALYSIS_CHUNKS_PER_WORKER = 4  # pedacos por processo (equilibra trechos com e sem movimento)
+ANALYSIS_MIN_CHUNK_S = 10.0     # pedaco minimo, em segundos de video
+ANALYSIS_WARMUP_S = 1.0         # frames antes do pedaco que so alimentam o fundo do gate
+
+def split_frames(n, chunks):
+    """[(inicio, fim), ...] cobrindo [0, n) em `chunks` faixas contiguas de tamanho parecido."""
+    chunks = max(1, min(chunks, n))
+    bounds = [n * i // chunks for i in range(chunks + 1)]
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+def analyze_chunk(job):
+    """Processo do pool: frames [inicio, fim) com gate/agendador no relogio do video.
+    Devolve (indice, [(t, [(id_trilha, encoding ou None)])], frames, deteccoes, encodings)."""
+    idx, path, lo, hi, t0_video, gate = job
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    # alguns frames antes do inicio so para o gate aprender o fundo (nao geram ticks)
+    i = max(0, lo - int(fps * ANALYSIS_WARMUP_S)) if gate else lo
+    if i:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, i)
+    ticks = []
+
+    def publish(observed, now):
+        ticks.append((now, [(t.id, enc) for t, enc in observed]))
+
+    worker = RecognitionWorker(None, None, threading.Event(), publish=publish)
+    try:
+        while i < hi:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            # relogio pelo indice do frame: igual em qualquer processo, independe do seek
+            now = t0_video + i / fps
+            i += 1
+            if i <= lo:
+                worker.gate.update(frame)
+                continue
+            worker.step(frame, now, gate)
+    finally:
+        cap.release()
+    frames = i - lo if i > lo else 0
+    return idx, ticks, frames, worker.processed, worker.tracker.encodings_done
+
+def run_analysis(path, workers=None, chunks=None, max_frames=None, start_time=None, gate=True,
+                 origem=SOURCE_NAME):
+    """
+    Analise offline de um video gravado: o arquivo e dividido em faixas de frames que rodam
+    deteccao/encodings num pool de processos. Os resultados voltam em ordem de tempo e passam
+    pela galeria no processo principal (o primeiro encoding de cada pessoa vira o "Rosto N" e
+    os seguintes casam com ele, como no modo sequencial), e os eventos vao para um unico
+    registro.csv em ordem de tempo.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing as mp
+    global event_sink
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened() or not is_file_source(path):
+        print(f"Nao foi possivel abrir o arquivo de video {path!r}")
+        return 1
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    if max_frames is not None:
+        n = min(n, max_frames)
+    workers = workers or os.cpu_count() or 1
+    if chunks is None:
+        chunks = min(workers * ANALYSIS_CHUNKS_PER_WORKER, max(1, int(n / (fps * ANALYSIS_MIN_CHUNK_S))))
+    ranges = split_frames(n, chunks)
+    t0_video = time.time() if start_time is None else start_time
+    jobs = [(i, path, lo, hi, t0_video, gate) for i, (lo, hi) in enumerate(ranges)]
+    print(f"[analise] {n} frames ({n / fps:.1f} s de video) em {len(ranges)} pedacos, {workers} processos")
+
+    ensure_csv_header()
+    ensure_event_log()
+    # a saida de uma sessao e registrada quando ela vence, depois de eventos mais novos:
+    # o OrderedSink reordena para o registro.csv sair em ordem de tempo
+    event_sink = OrderedSink(EventSink(path=CSV_PATH, bin_path=EVENTS_BIN_PATH).start())
+    resolver = AccessResolver(None)
+    frames = detections = encodings = 0
+    t_start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                                 initializer=apply_settings, initargs=(camera_settings(),)) as pool:
+            # map devolve na ordem dos pedacos: cada um e resolvido assim que ele e os anteriores
+            # terminam, entao a galeria ve os encodings em ordem de tempo
+            for idx, ticks, n_frames, n_det, n_enc in pool.map(analyze_chunk, jobs):
+                tracks = RemoteTracks()     # trilhas nao atravessam pedacos
+                for now, items in ticks:
+                    resolver.resolve(tracks.observed(idx, now, items), now, origem)
+                    # cada resolve fecha as sessoes vencidas, entao nada mais antigo que
+                    # now - SESSION_TIMEOUT_S ainda pode ser registrado (ts e truncado: -1)
+                    event_sink.release(int(now - SESSION_TIMEOUT_S) - 1)
+                frames += n_frames
+                detections += n_det
+                encodings += n_enc
+                el = time.perf_counter() - t_start
+                print(f"[analise] pedaco {idx + 1}/{len(ranges)}: {frames} frames, {frames / el:.1f} fps,"
+                      f" {events_version} eventos, {len(gallery)} rostos")
+    except KeyboardInterrupt:
+        print("[analise] interrompida")
+    finally:
+        elapsed = time.perf_counter() - t_start
+        resolver.close()
+        sink, event_sink = event_sink, None
+        sink.close()
+
+    video_s = frames / fps
+    print(f"[analise] {frames} frames em {elapsed:.2f} s: {frames / max(elapsed, 1e-9):.1f} fps,"
+          f" {video_s / max(elapsed, 1e-9):.1f}x tempo real ({workers} processos)")
+    print(f"[analise] deteccoes {detections}, encodings {encodings}, eventos {events_version}"
+          f" -> {CSV_PATH}, {len(gallery)} rostos na galeria")
+    if resolver.sessions is not None:
+        print("[analise]", session_summary(resolver.sessions))
+    return 0
+
+def parse_args(argv):
+    ap = argparse.ArgumentParser(description="Reconhecimento facial com controle de acesso. "
+                                             "Sem argumentos abre o menu.")
+    ap.add_argument("--headless", action="store_true",
+                    help="processa a fonte sem janelas, o mais rapido possivel, e sai")
+    ap.add_argument("--analisar", action="store_true",
+                    help="como --headless, mas divide o arquivo de video entre varios processos")
+    ap.add_argument("--processos", type=int, help="processos da analise (padrao: nucleos da CPU)")
+    ap.add_argument("--pedacos", type=int, help="faixas de frames da analise (padrao: automatico)")
+    ap.add_argument("--source", default=VIDEO_SOURCE, help="arquivo/URL de video ou indice da camera")
+    ap.add_argument("--fonte", action="append", metavar="NOME=FONTE",
+                    help="camera (repita para varias; cada uma num processo). Substitui --source")
+    ap.add_argument("--threads", action="store_true",
+                    help="varias fontes em threads do mesmo processo em vez de processos")
+    ap.add_argument("--origem", default=SOURCE_NAME, help="nome da fonte gravado nos eventos (headless)")
+    ap.add_argument("--csv", default=CSV_PATH, help="registro de eventos (CSV)")
+    ap.add_argument("--bin", default=EVENTS_BIN_PATH,
+                    help="log binario paralelo ao CSV ('' desliga)")
+    ap.add_argument("--galeria", default=GALLERY_DIR,
+                    help="pasta da galeria persistente ('' = so em memoria)")
+    ap.add_argument("--inicio", help="horario do inicio do video (AAAA-MM-DD HH:MM:SS, fuso de Sao Paulo); padrao: agora")
+    ap.add_argument("--max-frames", type=int)
+    ap.add_argument("--escala", type=float, default=DETECT_SCALE, help="reducao do frame na deteccao")
+    ap.add_argument("--upsample", type=int, default=DETECT_UPSAMPLE)
+    ap.add_argument("--intervalo", type=float, default=CHECK_INTERVAL_S,
+                    help="intervalo entre deteccoes (s, no relogio do video)")
+    ap.add_argument("--fixo", action="store_true",
+                    help="desliga o agendador adaptativo (usa escala/upsample/intervalo como dados)")
+    ap.add_argument("--tolerancia", type=float, default=MATCH_TOL)
+    ap.add_argument("--busca", choices=sorted(MATCHERS), default=GALLERY_MATCHER,
+                    help="busca na galeria: exata ou aproximada (ivf, galerias muito grandes)")
+    ap.add_argument("--nprobe", type=int, default=IVF_NPROBE, help="listas visitadas pela busca ivf")
+    ap.add_argument("--sem-gate", action="store_true", help="ignora o gate de movimento")
+    ap.add_argument("--eventos", choices=("sessao", "tick"), default=EVENT_MODE,
+                    help="sessao: entrada/mudanca/saida por rosto; tick: um evento por rosto a cada deteccao")
+    ap.add_argument("--serial", help="porta do Arduino (padrao: sem Arduino)")
+    ap.add_argument("--metricas", action="store_true", help="tempos por etapa no resumo final")
+    return ap.parse_args(argv)
 
 # ===================== LOOP PRINCIPAL =====================
-def main():
+def main(argv=None):
+    global gallery, events, CSV_PATH, EVENTS_BIN_PATH, DETECT_SCALE, DETECT_UPSAMPLE
+    global CHECK_INTERVAL_S, MATCH_TOL, ADAPTIVE_SCHED, VIDEO_SOURCES, MULTI_PROCESS
+    global GALLERY_MATCHER, IVF_NPROBE, EVENT_MODE
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    GALLERY_MATCHER, IVF_NPROBE = args.busca, args.nprobe
+    EVENT_MODE = args.eventos
+    if args.fonte:
+        VIDEO_SOURCES = [parse_source_spec(s, i + 1) for i, s in enumerate(args.fonte)]
+        if len({name for name, _ in VIDEO_SOURCES}) != len(VIDEO_SOURCES):
+            print("Nomes de fonte repetidos em --fonte")
+            return 2
+    MULTI_PROCESS = MULTI_PROCESS and not args.threads
+    if args.headless or args.analisar:
+        origem, source = args.origem, args.source
+        if VIDEO_SOURCES:
+            if len(VIDEO_SOURCES) > 1:
+                print("--headless/--analisar processam uma fonte so")
+                return 2
+            origem, source = VIDEO_SOURCES[0]
+        CSV_PATH, EVENTS_BIN_PATH = args.csv, args.bin or None
+        DETECT_SCALE, DETECT_UPSAMPLE = args.escala, args.upsample
+        CHECK_INTERVAL_S, MATCH_TOL = args.intervalo, args.tolerancia
+        ADAPTIVE_SCHED = not args.fixo
+        metrics.enabled = metrics.enabled or args.metricas
+        start = None
+        if args.inicio:
+            start = local_to_epoch(datetime.datetime.strptime(args.inicio, "%Y-%m-%d %H:%M:%S"))
+        t0 = time.perf_counter()
+        gallery = FaceGallery(path=args.galeria or None)
+        print(f"Galeria carregada: {len(gallery)} rostos em {(time.perf_counter() - t0) * 1000:.1f} ms")
+        events = deque(maxlen=18)
+        try:
+            if args.analisar:
+                return run_analysis(source, args.processos, args.pedacos, args.max_frames, start,
+                                    gate=not args.sem_gate, origem=origem)
+            return run_headless(parse_source(source), args.max_frames, start,
+                                gate=not args.sem_gate, serial_port=args.serial, origem=origem)
+        finally:
+            gallery.flush()
+
     while True:
         choice = show_menu()
         if choice == "quit" or choice is None:
@@ -559,19 +2725,19 @@ def main():
         elif choice == "view":
             show_previous_log()
         elif choice == "start":
-            global known_faces, face_ids, face_counts, events, next_face_number
-            known_faces = []
-            face_ids = []
-            face_counts = {}
+            t0 = time.perf_counter()
+            gallery = FaceGallery(path=GALLERY_DIR)
+            print(f"Galeria carregada: {len(gallery)} rostos em {(time.perf_counter() - t0) * 1000:.1f} ms")
             events = deque(maxlen=18)
-            next_face_number = 1
             run_program()
+            gallery.flush()
 
     try:
         cv2.destroyWindow("Menu")
     except:
         pass
     cv2.destroyAllWindows()
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
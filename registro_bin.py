@@ -0,0 +1,305 @@
+# registro_bin.py
+"""
+Log binário de eventos (append-only), gravado ao lado do registro.csv.
+
+Formato:
+  cabeçalho (16 bytes): MAGIC(8) + versão(u16) + tamanho do registro(u16) + reservado(u32)
+  registro  (32 bytes): ts(i64, epoch em segundos) + rosto(u32, índice no .ids)
+                        + ocorrencia(u32) + flags(u8: bit0=Aprovado, bit1=primeira_vez)
+                        + origem(u8: 0 = sem origem, i = linha i-1 do .src)
+                        + tipo(u8: 0 = tick, 1 = entrada, 2 = mudanca, 3 = saida) + reservado(u8)
+                        + duracao(u32, ms; só saida) + amostras(u32; só saida)
+                        + reservado(4 bytes, zerado)
+  sidecar <arquivo>.ids: um id de rosto por linha ("Rosto 1", ...); o índice é a linha.
+  sidecar <arquivo>.src: um nome de câmera por linha (logs antigos não têm; origem 0).
+
+Leitura por mmap: o registro i está em HEADER_SIZE + i * RECORD_SIZE, então ler uma
+página ou importar a partir de um ponto é só fatiar, sem reinterpretar texto.
+
+Uso:
+  python registro_bin.py csv2bin registro.csv registro.bin
+  python registro_bin.py bin2csv registro.bin registro_exportado.csv
+"""
+import os, csv, sys, mmap, struct, datetime
+from zoneinfo import ZoneInfo
+
+MAGIC = b"IOTEVT01"
+VERSION = 1
+HEADER = struct.Struct("<8sHHI")
+RECORD = struct.Struct("<qIIBBBxII4x")   # origem/tipo/duração saíram do reservado: mesmo tamanho e versão
+HEADER_SIZE = HEADER.size
+RECORD_SIZE = RECORD.size
+
+FLAG_APROVADO = 0x01
+FLAG_PRIMEIRA_VEZ = 0x02
+
+TIPOS = ("", "entrada", "mudanca", "saida")   # "" = um registro por tick (modo antigo)
+TIPO_INDEX = {t: i for i, t in enumerate(TIPOS)}
+
+TZ = ZoneInfo("America/Sao_Paulo")  # mesmo fuso do importador; data/hora de todo evento
+                                    # (registro.csv, visualizador, csv2bin) usam este fuso
+
+
+def ids_path(path: str) -> str:
+    return path + ".ids"
+
+
+def src_path(path: str) -> str:
+    return path + ".src"
+
+
+def load_ids(path: str) -> list[str]:
+    return _load_lines(ids_path(path))
+
+
+def load_sources(path: str) -> list[str]:
+    """Nomes por índice de origem; o índice 0 é "sem origem"."""
+    return [""] + _load_lines(src_path(path))
+
+
+def _load_lines(p: str) -> list[str]:
+    if not os.path.exists(p):
+        return []
+    with open(p, "r", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f]
+
+
+def epoch_to_strings(ts: int) -> tuple[str, str]:
+    dt = datetime.datetime.fromtimestamp(ts, TZ)
+    return dt.strftime("%d/%m/%Y"), dt.strftime("%H:%M:%S")
+
+
+def local_to_epoch(dt: datetime.datetime) -> int:
+    """Data/hora sem fuso, no horário de São Paulo -> epoch (inverso do epoch_to_strings)."""
+    return int(dt.replace(tzinfo=TZ).timestamp())
+
+
+class EventLogWriter:
+    """Anexa registros de tamanho fixo; ids de rosto são internados no sidecar .ids."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ids = load_ids(path)
+        self.id_index = {s: i for i, s in enumerate(self.ids)}
+        self.sources = load_sources(path)
+        self.source_index = {s: i for i, s in enumerate(self.sources)}
+        header = HEADER.pack(MAGIC, VERSION, RECORD_SIZE, 0)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size:
+            with open(path, "rb") as f:
+                head = f.read(HEADER_SIZE)
+            if size >= HEADER_SIZE:
+                ok = HEADER.unpack(head)[:3] == (MAGIC, VERSION, RECORD_SIZE)
+            else:
+                # cabeçalho incompleto (queda na primeira escrita) ainda não tem registros: é refeito
+                ok = header.startswith(head)
+            if not ok:
+                raise ValueError(f"{path}: não é um log de eventos v{VERSION}")
+        self.f = open(path, "ab")
+        self.ids_f = open(ids_path(path), "a", encoding="utf-8", newline="\n")
+        self.src_f = None
+        if size < HEADER_SIZE:
+            self.f.truncate(0)
+            self.f.write(header)
+        else:
+            # registro parcial no fim (queda no meio da escrita): descarta
+            extra = (size - HEADER_SIZE) % RECORD_SIZE
+            if extra:
+                self.f.truncate(size - extra)
+
+    def intern(self, face_id: str) -> int:
+        i = self.id_index.get(face_id)
+        if i is None:
+            i = len(self.ids)
+            self.ids.append(face_id)
+            self.id_index[face_id] = i
+            # o id precisa estar no disco antes de qualquer registro que o use
+            self.ids_f.write(face_id + "\n")
+            self.ids_f.flush()
+        return i
+
+    def intern_source(self, origem: str) -> int:
+        if not origem:
+            return 0
+        i = self.source_index.get(origem)
+        if i is None:
+            if len(self.sources) > 255:
+                raise ValueError("mais de 255 origens no mesmo log")
+            i = len(self.sources)
+            self.sources.append(origem)
+            self.source_index[origem] = i
+            if self.src_f is None:
+                self.src_f = open(src_path(self.path), "a", encoding="utf-8", newline="\n")
+            self.src_f.write(origem + "\n")
+            self.src_f.flush()
+        return i
+
+    def pack(self, ts: int, face_id: str, aprovado: bool, primeira_vez: bool, n: int,
+             origem: str = "", tipo: str = "", duracao_s: float = None, amostras: int = None) -> bytes:
+        flags = (FLAG_APROVADO if aprovado else 0) | (FLAG_PRIMEIRA_VEZ if primeira_vez else 0)
+        return RECORD.pack(int(ts), self.intern(face_id), int(n), flags, self.intern_source(origem),
+                           TIPO_INDEX[tipo or ""], round((duracao_s or 0.0) * 1000), amostras or 0)
+
+    def append(self, ts: int, face_id: str, aprovado: bool, primeira_vez: bool, n: int,
+               origem: str = "", tipo: str = "", duracao_s: float = None, amostras: int = None):
+        self.f.write(self.pack(ts, face_id, aprovado, primeira_vez, n, origem, tipo, duracao_s, amostras))
+
+    def write_records(self, blobs):
+        self.f.write(b"".join(blobs))
+
+    def flush(self, fsync: bool = False):
+        self.f.flush()
+        if fsync:
+            os.fsync(self.ids_f.fileno())
+            if self.src_f is not None:
+                os.fsync(self.src_f.fileno())
+            os.fsync(self.f.fileno())
+
+    def close(self):
+        self.f.close()
+        self.ids_f.close()
+        if self.src_f is not None:
+            self.src_f.close()
+
+
+class EventLogReader:
+    """Leitura por mmap. Mesma interface do índice de CSV do visualizador
+    (len, refresh, rows, recent), com linhas no formato do registro.csv."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.mm = None
+        self.size = 0
+        self.ids = []
+        self.sources = [""]
+        self.refresh()
+
+    def __len__(self):
+        return max(0, self.size - HEADER_SIZE) // RECORD_SIZE
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+    def refresh(self) -> int:
+        """Remapeia se o arquivo cresceu. Devolve quantos registros novos apareceram."""
+        before = len(self)
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size < self.size:
+            before = 0
+        if size != self.size:
+            self.close()
+            self.size = size
+            if size > HEADER_SIZE:
+                with open(self.path, "rb") as f:
+                    self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, version, rec_size, _ = HEADER.unpack_from(self.mm, 0)
+                if magic != MAGIC or rec_size != RECORD_SIZE:
+                    self.close()
+                    raise ValueError(f"{self.path}: não é um log de eventos v{VERSION}")
+            self.ids = load_ids(self.path)
+            self.sources = load_sources(self.path)
+        return len(self) - before
+
+    def raw(self, lo: int, hi: int):
+        """Tuplas (ts, rosto_idx, ocorrencia, flags, origem_idx, tipo_idx, duracao_ms, amostras)
+        dos registros [lo, hi)."""
+        lo, hi = max(0, lo), min(len(self), hi)
+        if lo >= hi:
+            return []
+        a = HEADER_SIZE + lo * RECORD_SIZE
+        return list(RECORD.iter_unpack(memoryview(self.mm)[a:HEADER_SIZE + hi * RECORD_SIZE]))
+
+    def records(self, lo: int, hi: int):
+        """Tuplas (ts, pessoa, aprovado, primeira_vez, ocorrencia, origem, tipo, duracao_s, amostras);
+        tipo "" (tick) não tem duração nem amostras (None)."""
+        ids, sources = self.ids, self.sources
+        out = []
+        for ts, face, n, fl, src, tipo, dur_ms, amostras in self.raw(lo, hi):
+            rec = (ts, ids[face], bool(fl & FLAG_APROVADO), bool(fl & FLAG_PRIMEIRA_VEZ), n, sources[src])
+            if tipo == 3:
+                out.append(rec + ("saida", dur_ms / 1000, amostras))
+            else:
+                out.append(rec + (TIPOS[tipo], None, None))
+        return out
+
+    def rows(self, lo: int, hi: int):
+        """Linhas como no registro.csv: colunas 7 (origem) e 8-10 (tipo, duracao_s, amostras)
+        só quando existem."""
+        out = []
+        for ts, pessoa, aprovado, primeira, n, origem, tipo, dur, amostras in self.records(lo, hi):
+            data, hora = epoch_to_strings(ts)
+            row = [data, hora, pessoa, "Aprovado" if aprovado else "Negado",
+                   "sim" if primeira else "nao", str(n)]
+            if origem or tipo:
+                row.append(origem)
+            if tipo:
+                row += [tipo, "" if dur is None else f"{dur:.1f}", "" if amostras is None else str(amostras)]
+            out.append(row)
+        return out
+
+    def recent(self, offset: int, count: int):
+        hi = len(self) - offset
+        return self.rows(hi - count, hi)[::-1]
+
+
+def csv_to_bin(csv_path: str, bin_path: str) -> int:
+    """Converte um registro.csv (6 a 10 colunas; linhas legadas sem data são puladas)."""
+    w = EventLogWriter(bin_path)
+    count = 0
+    try:
+        with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+            for row in csv.reader(f):
+                if len(row) < 6:
+                    continue
+                try:
+                    dt = datetime.datetime.strptime(f"{row[0].strip()} {row[1].strip()}", "%d/%m/%Y %H:%M:%S")
+                    n = int(row[5])
+                    tipo = row[7].strip() if len(row) > 7 else ""
+                    dur = float(row[8]) if len(row) > 8 and row[8].strip() else None
+                    amostras = int(row[9]) if len(row) > 9 and row[9].strip() else None
+                    if tipo not in TIPO_INDEX:
+                        raise ValueError(tipo)
+                except ValueError:
+                    continue  # cabeçalho ou linha inválida
+                ts = local_to_epoch(dt)
+                w.append(ts, row[2].strip(), row[3].strip().lower().startswith("aprov"),
+                         row[4].strip().lower() in ("sim", "s", "1", "true", "verdadeiro"), n,
+                         row[6].strip() if len(row) > 6 else "", tipo, dur, amostras)
+                count += 1
+    finally:
+        w.close()
+    return count
+
+
+def bin_to_csv(bin_path: str, csv_path: str) -> int:
+    r = EventLogReader(bin_path)
+    count = 0
+    try:
+        with open(csv_path, "a", encoding="utf-8", newline="") as f:
+            wr = csv.writer(f)
+            step = 65536
+            for lo in range(0, len(r), step):
+                rows = r.rows(lo, lo + step)
+                wr.writerows(rows)
+                count += len(rows)
+    finally:
+        r.close()
+    return count
+
+
+def main(argv):
+    if len(argv) != 4 or argv[1] not in ("csv2bin", "bin2csv"):
+        print(__doc__)
+        return 2
+    fn = csv_to_bin if argv[1] == "csv2bin" else bin_to_csv
+    print(f"{fn(argv[2], argv[3])} registros convertidos.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))